@@ -0,0 +1,292 @@
+"""
+Command-line batch mode for the barcode collision calculator.
+
+Reads sequences from files or stdin, finds all pairs within a Hamming
+distance threshold and writes them as TSV or JSON. With --generate it
+instead writes new barcodes at a minimum distance from the inputs.
+
+Example:
+    python barcode_cli.py barcodes.fa.gz --threshold 2 --format json -o collisions.json
+    python barcode_cli.py barcodes.txt --generate 96 --min-distance 3 --gc 0.4 0.6
+"""
+import argparse
+import json
+import sys
+from typing import List, TextIO
+
+from barcode_core import (
+    MAX_EDIT_LENGTH,
+    RISK_LEVELS,
+    find_collisions,
+    find_dual_index_collisions,
+    find_edit_collisions,
+    find_nearest_neighbors,
+    generate_distant_barcodes,
+    parse_file,
+    parse_index_pairs_file,
+    parse_index_pairs_text,
+    parse_text,
+    risk_level_codes,
+    split_index_pairs,
+)
+
+def read_sequences(paths: List[str], dual_index: bool = False) -> List[str]:
+    """
+    Read and validate sequences from every input, reporting invalid lines on stderr.
+
+    Args:
+        paths: Input file paths; '-' reads plain text from stdin
+        dual_index: Read i7 + i5 index pairs (returned joined as 'I7+I5')
+
+    Returns:
+        List of DNA sequences in input order
+    """
+    sequences = []
+    parse_stdin, parse_path = (parse_index_pairs_text, parse_index_pairs_file) if dual_index else (parse_text, parse_file)
+
+    for path in paths:
+        if path == '-':
+            parsed, invalid = parse_stdin(sys.stdin.read())
+        else:
+            with open(path, 'rb') as file:
+                parsed, invalid = parse_path(file)
+
+        for line_number, content in invalid:
+            print(f"{path}:{line_number}: invalid DNA sequence: {content[:50]}", file=sys.stderr)
+        sequences.extend(parsed)
+
+    return sequences
+
+def write_collisions(out: TextIO, output_format: str, sequences: List[str], threshold: int,
+                     metric: str = 'hamming', dual_index: bool = False) -> int:
+    """
+    Find collisions and write one record per pair.
+
+    Args:
+        out: Text stream to write to
+        output_format: 'tsv' or 'json'
+        sequences: List of DNA sequences (of equal length for Hamming distance)
+        threshold: Maximum distance of a reported pair
+        metric: 'hamming' or 'edit'
+        dual_index: Sequences are 'I7+I5' pairs; the combined distance is
+            thresholded and the per-index distances are written too
+
+    Returns:
+        Number of collision pairs written
+    """
+    components = {}
+    if dual_index:
+        rows, cols, distances, i7_distances, i5_distances = find_dual_index_collisions(*split_index_pairs(sequences), threshold)
+        components = {'i7_distance': i7_distances.tolist(), 'i5_distance': i5_distances.tolist()}
+    elif metric == 'edit':
+        rows, cols, distances = find_edit_collisions(sequences, threshold)
+    else:
+        rows, cols, distances = find_collisions(sequences, threshold)
+
+    if output_format == 'json':
+        json.dump({
+            'sequences': len(sequences),
+            'length': len(sequences[0]) if sequences else 0,
+            'metric': metric,
+            'threshold': threshold,
+            'collisions': [
+                {
+                    'sequence_1': f'Seq_{i+1}',
+                    'sequence_1_dna': sequences[i],
+                    'sequence_2': f'Seq_{j+1}',
+                    'sequence_2_dna': sequences[j],
+                    **{name: values[k] for name, values in components.items()},
+                    'distance': distance
+                }
+                for k, (i, j, distance) in enumerate(zip(rows.tolist(), cols.tolist(), distances.tolist()))
+            ]
+        }, out, indent=2)
+        out.write('\n')
+    else:
+        out.write('\t'.join(['sequence_1', 'sequence_1_dna', 'sequence_2', 'sequence_2_dna', *components, 'distance']) + '\n')
+        for k, (i, j, distance) in enumerate(zip(rows.tolist(), cols.tolist(), distances.tolist())):
+            extra = ''.join(f'\t{values[k]}' for values in components.values())
+            out.write(f'Seq_{i+1}\t{sequences[i]}\tSeq_{j+1}\t{sequences[j]}{extra}\t{distance}\n')
+
+    return len(distances)
+
+def write_neighbors(out: TextIO, output_format: str, sequences: List[str], k: int, threshold: int) -> int:
+    """
+    Write the k closest neighbours of every sequence, one record per sequence.
+    
+    Every record also holds the sequence's risk level (red, orange or blue)
+    from its closest neighbour, with the same cut-offs as the app.
+    
+    Args:
+        out: Text stream to write to
+        output_format: 'tsv' or 'json'
+        sequences: List of DNA sequences of equal length
+        k: Number of neighbours per sequence
+        threshold: Collision threshold for the risk levels
+        
+    Returns:
+        Number of sequences whose closest neighbour is within the threshold,
+        i.e. that are part of a collision pair
+    """
+    distances, indices = find_nearest_neighbors(sequences, k)
+    found = min(k, len(sequences) - 1)
+    risks = RISK_LEVELS[risk_level_codes(distances[:, 0], threshold)].tolist()
+
+    if output_format == 'json':
+        json.dump({
+            'sequences': len(sequences),
+            'length': len(sequences[0]) if sequences else 0,
+            'neighbors': k,
+            'threshold': threshold,
+            'nearest': [
+                {
+                    'sequence': f'Seq_{i+1}',
+                    'sequence_dna': sequences[i],
+                    'risk': risks[i],
+                    'neighbors': [
+                        {'sequence': f'Seq_{j+1}', 'sequence_dna': sequences[j], 'distance': d}
+                        for j, d in zip(row_indices[:found], row_distances[:found])
+                    ]
+                }
+                for i, (row_indices, row_distances) in enumerate(zip(indices.tolist(), distances.tolist()))
+            ]
+        }, out, indent=2)
+        out.write('\n')
+    else:
+        header = ['sequence', 'sequence_dna', 'risk']
+        for rank in range(1, found + 1):
+            header += [f'neighbor_{rank}', f'neighbor_{rank}_dna', f'distance_{rank}']
+        out.write('\t'.join(header) + '\n')
+        for i, (row_indices, row_distances) in enumerate(zip(indices.tolist(), distances.tolist())):
+            fields = [f'Seq_{i+1}', sequences[i], risks[i]]
+            for j, d in zip(row_indices[:found], row_distances[:found]):
+                fields += [f'Seq_{j+1}', sequences[j], str(d)]
+            out.write('\t'.join(fields) + '\n')
+
+    # The same comparison as the collision report
+    return int((distances[:, 0] <= threshold).sum()) if found else 0
+
+def write_generated(out: TextIO, existing: List[str], args: argparse.Namespace) -> int:
+    """
+    Write newly generated barcodes one per line as they are found.
+
+    Args:
+        out: Text stream to write to
+        existing: Barcodes the new ones must stay away from
+        args: Parsed command-line options
+
+    Returns:
+        Number of barcodes written
+    """
+    count = 0
+    for barcode in generate_distant_barcodes(args.length, args.generate, args.min_distance, existing,
+                                             gc_range=args.gc, max_homopolymer=args.max_homopolymer,
+                                             seed=args.seed):
+        count += 1
+        out.write(f'New_{count}: {barcode}\n')
+        out.flush()
+    return count
+
+def main(argv: List[str] = None) -> int:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(
+        description="Find DNA barcode pairs within a Hamming distance threshold."
+    )
+    parser.add_argument('inputs', nargs='*',
+                        help="Input files (.txt, .fasta, .fa, .fastq, .fq, optionally .gz); '-' or none reads stdin "
+                             "(with --generate, none means no existing barcodes)")
+    parser.add_argument('-t', '--threshold', type=int, default=2,
+                        help="Report pairs with distance <= THRESHOLD (default: 2)")
+    parser.add_argument('-m', '--metric', choices=['hamming', 'edit'], default='hamming',
+                        help="Hamming distance or Levenshtein edit distance, which allows mixed lengths (default: hamming)")
+    parser.add_argument('--dual-index', action='store_true',
+                        help="Inputs hold i7 + i5 index pairs ('i7+i5' or two columns); "
+                             "collisions use the combined Hamming distance")
+    parser.add_argument('-k', '--nearest', type=int, metavar='K',
+                        help="Write every sequence's K closest neighbours (Hamming) and its risk level at "
+                             "--threshold instead of collision pairs")
+    parser.add_argument('-f', '--format', choices=['tsv', 'json'], default='tsv',
+                        help="Output format (default: tsv)")
+    parser.add_argument('-o', '--output', default='-',
+                        help="Output file (default: stdout)")
+    generator = parser.add_argument_group("barcode generation")
+    generator.add_argument('-g', '--generate', type=int, metavar='COUNT',
+                           help="Generate COUNT new barcodes instead of reporting collisions")
+    generator.add_argument('-l', '--length', type=int,
+                           help="Length of generated barcodes (default: length of the inputs)")
+    generator.add_argument('-d', '--min-distance', type=int, default=3,
+                           help="Minimum distance of generated barcodes to all others (default: 3)")
+    generator.add_argument('--gc', type=float, nargs=2, metavar=('MIN', 'MAX'),
+                           help="Allowed GC fraction of generated barcodes, e.g. 0.4 0.6")
+    generator.add_argument('--max-homopolymer', type=int,
+                           help="Longest allowed run of one base in generated barcodes")
+    generator.add_argument('--seed', type=int, help="Random seed for generation")
+    args = parser.parse_args(argv)
+
+    if args.generate is not None:
+        existing = read_sequences(args.inputs)
+        if len({len(seq) for seq in existing}) > 1:
+            print("All existing DNA sequences must have the same length.", file=sys.stderr)
+            return 1
+        if args.length is None:
+            if not existing:
+                print("--length is required when there are no input sequences.", file=sys.stderr)
+                return 1
+            args.length = len(existing[0])
+        if existing and len(existing[0]) != args.length:
+            print(f"Input sequences have length {len(existing[0])}, not {args.length}.", file=sys.stderr)
+            return 1
+
+        if args.output == '-':
+            count = write_generated(sys.stdout, existing, args)
+        else:
+            with open(args.output, 'w') as out:
+                count = write_generated(out, existing, args)
+
+        print(f"Generated {count} of {args.generate} barcodes at distance >= {args.min_distance}", file=sys.stderr)
+        return 0 if count == args.generate else 1
+
+    sequences = read_sequences(args.inputs or ['-'], args.dual_index)
+    if not sequences:
+        print("No valid DNA sequences found.", file=sys.stderr)
+        return 1
+
+    lengths = {len(seq) for seq in sequences}
+    if args.dual_index:
+        if args.metric == 'edit':
+            print("Dual-index pairs are compared by Hamming distance.", file=sys.stderr)
+            return 1
+        if any(len({len(index) for index in indexes}) > 1 for indexes in split_index_pairs(sequences)):
+            print("All i7 indexes must have the same length, and so must all i5 indexes.", file=sys.stderr)
+            return 1
+    elif args.metric == 'hamming' and len(lengths) > 1:
+        print(f"All DNA sequences must have the same length. Got lengths {sorted(lengths)}", file=sys.stderr)
+        return 1
+    if args.metric == 'edit' and max(lengths) > MAX_EDIT_LENGTH:
+        print(f"Edit distance supports sequences of up to {MAX_EDIT_LENGTH} bases. Got {max(lengths)}", file=sys.stderr)
+        return 1
+
+    if args.nearest is not None:
+        if args.metric == 'edit':
+            print("Closest neighbours are computed by Hamming distance.", file=sys.stderr)
+            return 1
+        if args.output == '-':
+            at_risk = write_neighbors(sys.stdout, args.format, sequences, args.nearest, args.threshold)
+        else:
+            with open(args.output, 'w') as out:
+                at_risk = write_neighbors(out, args.format, sequences, args.nearest, args.threshold)
+        print(f"{at_risk} of {len(sequences)} sequences have a neighbour at distance <= {args.threshold} "
+              f"(threshold {args.threshold})", file=sys.stderr)
+        return 0
+
+    if args.output == '-':
+        count = write_collisions(sys.stdout, args.format, sequences, args.threshold, args.metric, args.dual_index)
+    else:
+        with open(args.output, 'w') as out:
+            count = write_collisions(out, args.format, sequences, args.threshold, args.metric, args.dual_index)
+
+    print(f"{count} collision pairs among {len(sequences)} sequences (threshold {args.threshold})", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
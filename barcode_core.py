@@ -0,0 +1,2930 @@
+"""
+Headless barcode distance engine: parsing, validation, Hamming kernels and
+collision search. Imports only NumPy and the standard library, so it can be
+used from pipelines and the command line without starting Streamlit.
+"""
+import gzip
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from multiprocessing import shared_memory
+from typing import Callable, List, Tuple, Iterable, Iterator, NamedTuple, Optional
+
+import numpy as np
+
+def calculate_hamming_distance(seq1: str, seq2: str) -> int:
+    """
+    Calculate the Hamming distance between two DNA sequences.
+    
+    Args:
+        seq1: First DNA sequence
+        seq2: Second DNA sequence
+        
+    Returns:
+        Hamming distance (number of positions where sequences differ)
+    """
+    if len(seq1) != len(seq2):
+        raise ValueError(f"Sequences must be of equal length. Got {len(seq1)} and {len(seq2)}")
+    
+    return sum(c1 != c2 for c1, c2 in zip(seq1.upper(), seq2.upper()))
+
+# Upper bound on the temporary (rows x n x L) comparison array built per block
+MAX_BLOCK_BYTES = 64 * 1024 * 1024
+
+def encode_sequences(sequences: List[str]) -> np.ndarray:
+    """
+    Encode DNA sequences into an (n x L) uint8 array of ASCII base codes.
+    
+    Args:
+        sequences: List of DNA sequences of equal length
+        
+    Returns:
+        Array with one row per sequence and one column per position
+    """
+    if not sequences:
+        return np.zeros((0, 0), dtype=np.uint8)
+    
+    length = len(sequences[0])
+    if any(len(seq) != length for seq in sequences):
+        raise ValueError("Sequences must be of equal length to be encoded together")
+    
+    buffer = ''.join(sequences).upper().encode('ascii')
+    return np.frombuffer(buffer, dtype=np.uint8).reshape(len(sequences), length)
+
+# 2-bit packing: A=00, C=01, G=10, T=11, so up to 32 bases fit in one uint64
+MAX_PACKED_LENGTH = 32
+BASE_CODES = np.zeros(256, dtype=np.uint64)
+BASE_CODES[np.frombuffer(b'ACGTacgt', dtype=np.uint8)] = [0, 1, 2, 3, 0, 1, 2, 3]
+LOW_BIT_MASK = np.uint64(0x5555555555555555)
+
+def pack_sequences(sequences: List[str]) -> np.ndarray:
+    """
+    Pack DNA sequences into one uint64 per sequence at 2 bits per base.
+    
+    Args:
+        sequences: List of DNA sequences of equal length (at most 32 bases)
+        
+    Returns:
+        Array of packed sequences
+    """
+    encoded = encode_sequences(sequences)
+    length = encoded.shape[1]
+    if length > MAX_PACKED_LENGTH:
+        raise ValueError(f"Packed encoding supports at most {MAX_PACKED_LENGTH} bases. Got {length}")
+    
+    if length == 0:
+        return np.zeros(len(sequences), dtype=np.uint64)
+    
+    shifts = np.arange(length, dtype=np.uint64) * np.uint64(2)
+    return np.bitwise_or.reduce(BASE_CODES[encoded] << shifts, axis=1)
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    """
+    Count the set bits of every element of a uint64 array.
+    
+    Args:
+        values: Array of uint64 values
+        
+    Returns:
+        Array of bit counts with the same shape as the input
+    """
+    if hasattr(np, 'bitwise_count'):  # NumPy >= 2.0
+        return np.bitwise_count(values)
+    
+    # SWAR popcount for older NumPy releases
+    values = values - ((values >> np.uint64(1)) & LOW_BIT_MASK)
+    values = (values & np.uint64(0x3333333333333333)) + ((values >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    values = (values + (values >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((values * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.uint8)
+
+def packed_hamming_distance(packed1: np.ndarray, packed2: np.ndarray) -> np.ndarray:
+    """
+    Calculate Hamming distances between packed sequences (broadcasting).
+    
+    Differing bases leave a non-zero 2-bit group after XOR; folding each
+    group onto its low bit and counting set bits gives the distance.
+    
+    Args:
+        packed1: Packed sequences from pack_sequences
+        packed2: Packed sequences from pack_sequences
+        
+    Returns:
+        Array of Hamming distances
+    """
+    diff = np.bitwise_xor(packed1, packed2)
+    diff = (diff | (diff >> np.uint64(1))) & LOW_BIT_MASK
+    return popcount64(diff)
+
+def prepare_kernel_input(sequences: List[str]) -> np.ndarray:
+    """
+    Encode sequences for the fastest available distance kernel.
+    
+    Args:
+        sequences: List of DNA sequences of equal length
+        
+    Returns:
+        1-D packed uint64 array for barcodes of up to 32 bases,
+        otherwise the 2-D uint8 array from encode_sequences
+    """
+    encoded = encode_sequences(sequences)
+    if 0 < encoded.shape[1] <= MAX_PACKED_LENGTH:
+        return pack_sequences(sequences)
+    return encoded
+
+def block_distances(data1: np.ndarray, data2: np.ndarray) -> np.ndarray:
+    """
+    Calculate all Hamming distances between two blocks of kernel input.
+    
+    Args:
+        data1: Rows from prepare_kernel_input
+        data2: Rows from prepare_kernel_input (same encoding as data1)
+        
+    Returns:
+        (len(data1) x len(data2)) array of Hamming distances
+    """
+    if data1.ndim == 1:
+        return packed_hamming_distance(data1[:, np.newaxis], data2[np.newaxis, :])
+    return (data1[:, np.newaxis, :] != data2[np.newaxis, :, :]).sum(axis=2, dtype=np.uint16)
+
+def bytes_per_pair(data: np.ndarray) -> int:
+    """Size of the temporary created per compared pair by block_distances."""
+    return 8 if data.ndim == 1 else max(1, data.shape[1])
+
+def kernel_dtype(data: np.ndarray) -> np.dtype:
+    """Dtype of the blocks block_distances returns for this kernel input."""
+    return np.dtype(np.uint8) if data.ndim == 1 else np.dtype(np.uint16)
+
+def distance_dtype(length: int) -> np.dtype:
+    """Smallest unsigned dtype that can hold distances for sequences of this length."""
+    return np.dtype(np.uint8) if length <= np.iinfo(np.uint8).max else np.dtype(np.uint16)
+
+@dataclass
+class DistanceMatrix:
+    """
+    Pairwise Hamming distances stored as a condensed upper triangle.
+    
+    Entry k of `condensed` holds the distance of pair (i, j), i < j, in
+    row-major order, the same layout as scipy.spatial.distance.pdist.
+    The array may be an np.memmap (see store_distance_matrix); the row
+    views below read it piece by piece.
+    """
+    n: int
+    length: int
+    condensed: np.ndarray
+    
+    @property
+    def num_pairs(self) -> int:
+        return self.n * (self.n - 1) // 2
+    
+    def row_offsets(self) -> np.ndarray:
+        """Condensed index of pair (i, i + 1) for every row i."""
+        rows = np.arange(self.n, dtype=np.int64)
+        return rows * self.n - rows * (rows + 1) // 2
+    
+    def pair_indices(self, condensed_indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Convert condensed indices back to (i, j) sequence indices.
+        
+        Args:
+            condensed_indices: Positions in the condensed array
+            
+        Returns:
+            Tuple of row and column index arrays
+        """
+        condensed_indices = np.asarray(condensed_indices, dtype=np.int64)
+        offsets = self.row_offsets()
+        rows = np.searchsorted(offsets, condensed_indices, side='right') - 1
+        cols = condensed_indices - offsets[rows] + rows + 1
+        return rows, cols
+    
+    def distance(self, i: int, j: int) -> int:
+        """Hamming distance between sequences i and j."""
+        if i == j:
+            return 0
+        if i > j:
+            i, j = j, i
+        return int(self.condensed[i * self.n - i * (i + 1) // 2 + (j - i - 1)])
+    
+    def pairs_within(self, threshold: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find all pairs with distance <= threshold.
+        
+        The condensed array is scanned in chunks of MAX_BLOCK_BYTES, so a
+        memory-mapped store is never loaded as a whole.
+        
+        Args:
+            threshold: Maximum distance of a reported pair
+            
+        Returns:
+            Tuple of (rows, cols, distances) arrays, ordered by (i, j)
+        """
+        step = max(1, MAX_BLOCK_BYTES // self.condensed.itemsize)
+        hits = [
+            start + np.flatnonzero(np.asarray(self.condensed[start:start + step]) <= threshold)
+            for start in range(0, len(self.condensed), step)
+        ]
+        hits = np.concatenate(hits) if hits else np.zeros(0, dtype=np.int64)
+        rows, cols = self.pair_indices(hits)
+        return rows, cols, np.asarray(self.condensed[hits])
+    
+    def iter_rows(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Yield the upper-triangle part of every row, one row at a time.
+        
+        Yields:
+            Tuple of row index i and the distances to sequences i+1 .. n-1
+        """
+        offset = 0
+        for i in range(self.n - 1):
+            width = self.n - i - 1
+            yield i, np.asarray(self.condensed[offset:offset + width])
+            offset += width
+    
+    def nearest_neighbors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the closest other sequence of every sequence in one pass over the rows.
+        
+        Returns:
+            Tuple of (distances, indices); ties resolve to the lowest index and
+            a set of one sequence gets the dtype maximum and index -1
+        """
+        best = np.full(self.n, np.iinfo(self.condensed.dtype).max, dtype=self.condensed.dtype)
+        nearest = np.full(self.n, -1, dtype=np.int64)
+        for i, row in self.iter_rows():
+            j = int(row.argmin())
+            if row[j] < best[i]:
+                best[i], nearest[i] = row[j], i + 1 + j
+            # Row i is also column i of every later row
+            later_best, later_nearest = best[i + 1:], nearest[i + 1:]
+            closer = row < later_best
+            later_best[closer] = row[closer]
+            later_nearest[closer] = i
+        return best, nearest
+    
+    def summary(self, tile_size: int = None) -> 'DistanceSummary':
+        """Distance histogram, nearest neighbours and optional tile minima, read from the stored distances."""
+        histogram = np.zeros(self.length + 1, dtype=np.int64)
+        step = max(1, MAX_BLOCK_BYTES // self.condensed.itemsize)
+        for start in range(0, len(self.condensed), step):
+            histogram += distance_histogram(np.asarray(self.condensed[start:start + step]), self.length + 1)
+        tile_minima = self.tile_minima(tile_size) if tile_size else None
+        return DistanceSummary(histogram, *self.nearest_neighbors(), tile_minima)
+    
+    def tile_minima(self, tile_size: int) -> np.ndarray:
+        """
+        Calculate the minimum off-diagonal distance inside every tile of the matrix.
+        
+        Args:
+            tile_size: Number of sequences per tile along each axis
+            
+        Returns:
+            Symmetric (tiles x tiles) array of minimum distances, like compute_tile_minima
+        """
+        num_tiles = -(-self.n // tile_size)
+        minima = np.full((num_tiles, num_tiles), np.iinfo(self.condensed.dtype).max, dtype=self.condensed.dtype)
+        tile_starts = np.arange(0, self.n, tile_size)
+        for i, row in self.iter_rows():
+            # Split the row (columns i+1 onward) at the remaining column tile boundaries
+            first_tile = (i + 1) // tile_size
+            bounds = np.concatenate(([0], tile_starts[first_tile + 1:] - (i + 1)))
+            target = minima[i // tile_size, first_tile:]
+            np.minimum(target, np.minimum.reduceat(row, bounds), out=target)
+        return np.minimum(minima, minima.T)
+    
+    def block(self, row_range: Tuple[int, int], col_range: Tuple[int, int]) -> np.ndarray:
+        """
+        Gather one rectangular sub-block of the symmetric matrix.
+        
+        Args:
+            row_range: (start, stop) sequence indices of the rows
+            col_range: (start, stop) sequence indices of the columns
+            
+        Returns:
+            (rows x cols) array of distances, zero where i == j
+        """
+        rows, cols = np.meshgrid(np.arange(*row_range, dtype=np.int64), np.arange(*col_range, dtype=np.int64),
+                                 indexing='ij')
+        low, high = np.minimum(rows, cols), np.maximum(rows, cols)
+        diagonal = low == high
+        if not len(self.condensed):
+            return np.zeros(rows.shape, dtype=self.condensed.dtype)
+        index = np.where(diagonal, 0, low * self.n - low * (low + 1) // 2 + (high - low - 1))
+        values = np.asarray(self.condensed[index.ravel()]).reshape(rows.shape)
+        values[diagonal] = 0
+        return values
+    
+    def to_square(self) -> np.ndarray:
+        """Expand to a symmetric (n x n) matrix with zeros on the diagonal."""
+        square = np.zeros((self.n, self.n), dtype=self.condensed.dtype)
+        rows, cols = np.triu_indices(self.n, k=1)
+        square[rows, cols] = self.condensed
+        square[cols, rows] = self.condensed
+        return square
+
+def fill_condensed_rows(data: np.ndarray, condensed: np.ndarray, row_start: int, row_stop: int,
+                        block_size: int = None) -> None:
+    """
+    Compute the upper-triangle distances of rows [row_start, row_stop) in place.
+    
+    Args:
+        data: Output of prepare_kernel_input for all n sequences
+        condensed: Condensed distance array of length n * (n - 1) / 2
+        row_start: First row to compute
+        row_stop: Row after the last row to compute
+        block_size: Number of rows compared per block (derived from
+            MAX_BLOCK_BYTES when omitted)
+    """
+    n = len(data)
+    if block_size is None:
+        block_size = max(1, MAX_BLOCK_BYTES // (n * bytes_per_pair(data)))
+    
+    offset = row_start * n - row_start * (row_start + 1) // 2
+    for start in range(row_start, row_stop, block_size):
+        stop = min(start + block_size, row_stop)
+        block = block_distances(data[start:stop], data[start:])
+        # Keep entries right of the diagonal; row-major order matches the condensed layout
+        upper = block[np.triu(np.ones(block.shape, dtype=bool), k=1)]
+        condensed[offset:offset + len(upper)] = upper
+        offset += len(upper)
+
+def env_int(name: str, default: int, minimum: int = 1) -> int:
+    """
+    Read an integer setting from the environment without failing at import time.
+    
+    Args:
+        name: Environment variable
+        default: Value used when the variable is unset or not an integer
+        minimum: Smallest value returned; lower settings are raised to it
+        
+    Returns:
+        The setting, at least minimum
+    """
+    try:
+        value = int(os.environ.get(name, default))
+    except ValueError:
+        value = default
+    return max(minimum, value)
+
+# Parallel tiling of the full distance matrix (the on-disk store and the matrix
+# export); inputs with fewer pairs than this are computed serially
+PARALLEL_MIN_PAIRS = 2_000_000
+TILES_PER_WORKER = 4
+DEFAULT_WORKERS = env_int("BC_CALC_WORKERS", 1)
+
+def distance_tile_worker(data_spec: Tuple[str, tuple, str], condensed_spec: Tuple[str, tuple, str],
+                         row_start: int, row_stop: int) -> int:
+    """
+    Process pool entry point: fill one tile of rows through shared memory.
+    
+    Args:
+        data_spec: (shared memory name, shape, dtype) of the kernel input
+        condensed_spec: (shared memory name, shape, dtype) of the output
+        row_start: First row of the tile
+        row_stop: Row after the last row of the tile
+        
+    Returns:
+        Number of rows computed
+    """
+    data_shm = shared_memory.SharedMemory(name=data_spec[0])
+    condensed_shm = shared_memory.SharedMemory(name=condensed_spec[0])
+    try:
+        data = np.ndarray(data_spec[1], dtype=data_spec[2], buffer=data_shm.buf)
+        condensed = np.ndarray(condensed_spec[1], dtype=condensed_spec[2], buffer=condensed_shm.buf)
+        fill_condensed_rows(data, condensed, row_start, row_stop)
+        del data, condensed
+    finally:
+        data_shm.close()
+        condensed_shm.close()
+    return row_stop - row_start
+
+def distance_store_tile_worker(data_spec: Tuple[str, tuple, str], path: str, row_start: int, row_stop: int) -> int:
+    """
+    Process pool entry point: fill one tile of rows of a memory-mapped .npy store.
+    
+    Args:
+        data_spec: (shared memory name, shape, dtype) of the kernel input
+        path: Path of the condensed .npy file, opened read-write
+        row_start: First row of the tile
+        row_stop: Row after the last row of the tile
+        
+    Returns:
+        Number of rows computed
+    """
+    data_shm = shared_memory.SharedMemory(name=data_spec[0])
+    try:
+        data = np.ndarray(data_spec[1], dtype=data_spec[2], buffer=data_shm.buf)
+        condensed = np.load(path, mmap_mode='r+')
+        fill_condensed_rows(data, condensed, row_start, row_stop)
+        condensed.flush()
+        del data, condensed
+    finally:
+        data_shm.close()
+    return row_stop - row_start
+
+def tile_row_bounds(n: int, num_tiles: int) -> List[int]:
+    """
+    Split the rows of the upper triangle into tiles holding similar pair counts.
+    
+    Args:
+        n: Number of sequences
+        num_tiles: Desired number of tiles
+        
+    Returns:
+        Sorted row boundaries, starting at 0 and ending at n
+    """
+    rows = np.arange(n + 1, dtype=np.int64)
+    pairs_before_row = rows * n - rows * (rows + 1) // 2
+    targets = np.linspace(0, pairs_before_row[-1], num_tiles + 1)
+    bounds = np.searchsorted(pairs_before_row, targets)
+    bounds[0], bounds[-1] = 0, n
+    return np.unique(bounds).tolist()
+
+def compute_distance_matrix_parallel(data: np.ndarray, condensed: np.ndarray, workers: int) -> None:
+    """
+    Fill the condensed distance array with a process pool over row tiles.
+    
+    The kernel input and the output are placed in shared memory, so
+    workers neither receive pickled sequences nor return distance blocks.
+    A memory-mapped .npy output is written by the workers through the file
+    instead of being staged in shared memory.
+    
+    Args:
+        data: Output of prepare_kernel_input for all n sequences
+        condensed: Condensed distance array to fill, in memory or an np.memmap
+            opened with np.lib.format.open_memmap
+        workers: Number of worker processes
+    """
+    to_store = isinstance(condensed, np.memmap)
+    data_shm = shared_memory.SharedMemory(create=True, size=max(1, data.nbytes))
+    condensed_shm = None if to_store else shared_memory.SharedMemory(create=True, size=max(1, condensed.nbytes))
+    try:
+        shared_data = np.ndarray(data.shape, dtype=data.dtype, buffer=data_shm.buf)
+        shared_data[...] = data
+        data_spec = (data_shm.name, data.shape, data.dtype.str)
+        if to_store:
+            condensed.flush()
+            worker, target = distance_store_tile_worker, condensed.filename
+        else:
+            shared_condensed = np.ndarray(condensed.shape, dtype=condensed.dtype, buffer=condensed_shm.buf)
+            worker, target = distance_tile_worker, (condensed_shm.name, condensed.shape, condensed.dtype.str)
+        
+        bounds = tile_row_bounds(len(data), workers * TILES_PER_WORKER)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(worker, data_spec, target, start, stop)
+                for start, stop in zip(bounds[:-1], bounds[1:])
+            ]
+            for future in futures:
+                future.result()
+        
+        if not to_store:
+            condensed[...] = shared_condensed
+            del shared_condensed
+        del shared_data
+    finally:
+        data_shm.close()
+        data_shm.unlink()
+        if condensed_shm is not None:
+            condensed_shm.close()
+            condensed_shm.unlink()
+
+def compute_distance_matrix(sequences: List[str], block_size: int = None, workers: int = 1) -> DistanceMatrix:
+    """
+    Calculate all pairwise Hamming distances once, in vectorized row blocks.
+    
+    Only the upper triangle is computed: each block of rows is compared
+    against itself and every later sequence.
+    
+    Args:
+        sequences: List of DNA sequences of equal length
+        block_size: Number of rows compared per block (derived from
+            MAX_BLOCK_BYTES when omitted)
+        workers: Number of worker processes; inputs with fewer than
+            PARALLEL_MIN_PAIRS pairs are always computed serially
+        
+    Returns:
+        DistanceMatrix with condensed upper-triangle storage
+    """
+    n = len(sequences)
+    length = len(sequences[0]) if sequences else 0
+    condensed = np.zeros(n * (n - 1) // 2, dtype=distance_dtype(length))
+    
+    if n < 2 or length == 0:
+        return DistanceMatrix(n, length, condensed)
+    
+    data = prepare_kernel_input(sequences)
+    if workers > 1 and len(condensed) >= PARALLEL_MIN_PAIRS:
+        compute_distance_matrix_parallel(data, condensed, workers)
+    else:
+        fill_condensed_rows(data, condensed, 0, n, block_size)
+    
+    return DistanceMatrix(n, length, condensed)
+
+# On-disk distance stores: one condensed .npy file per sequence set, reused across sessions
+DISTANCE_STORE_DIR = os.environ.get("BC_CALC_STORE_DIR", os.path.join(tempfile.gettempdir(), "bc_calc_store"))
+
+def distance_store_path(directory: str, key: str) -> str:
+    """Path of the stored condensed matrix for a sequence set key (see sequence_set_key)."""
+    return os.path.join(directory, f"distances-{content_key(key)[:32]}.npy")
+
+def store_distance_matrix(sequences: List[str], directory: str = DISTANCE_STORE_DIR, key: str = None,
+                          workers: int = 1) -> DistanceMatrix:
+    """
+    Calculate all pairwise Hamming distances into a memory-mapped .npy file.
+    
+    Rows are computed block by block straight into the file, so memory use
+    stays bounded by MAX_BLOCK_BYTES however large n gets. When a complete
+    file for the same sequence set already exists it is opened instead;
+    files are only renamed into place once fully written.
+    
+    Args:
+        sequences: List of DNA sequences of equal length
+        directory: Directory holding the stored matrices
+        key: Sequence set key naming the file (sequence_set_key when omitted)
+        workers: Number of worker processes; inputs with fewer than
+            PARALLEL_MIN_PAIRS pairs are always computed serially
+        
+    Returns:
+        DistanceMatrix whose condensed array is a read-only np.memmap
+    """
+    n = len(sequences)
+    length = len(sequences[0]) if sequences else 0
+    shape, dtype = (n * (n - 1) // 2,), distance_dtype(length)
+    if n < 2:
+        # Empty files cannot be memory-mapped
+        return DistanceMatrix(n, length, np.zeros(shape, dtype=dtype))
+    
+    path = distance_store_path(directory, key or sequence_set_key(sequences))
+    if os.path.exists(path):
+        condensed = np.load(path, mmap_mode='r')
+        if condensed.shape == shape and condensed.dtype == dtype:
+            return DistanceMatrix(n, length, condensed)
+        del condensed
+    
+    os.makedirs(directory, exist_ok=True)
+    partial = f"{path}.{os.getpid()}.partial"
+    condensed = np.lib.format.open_memmap(partial, mode='w+', dtype=dtype, shape=shape)
+    try:
+        data = prepare_kernel_input(sequences)
+        if workers > 1 and shape[0] >= PARALLEL_MIN_PAIRS:
+            compute_distance_matrix_parallel(data, condensed, workers)
+        else:
+            fill_condensed_rows(data, condensed, 0, n)
+        condensed.flush()
+        del condensed
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    
+    return DistanceMatrix(n, length, np.load(path, mmap_mode='r'))
+
+# Number of candidate pairs verified per batch by find_collisions
+CANDIDATE_BATCH_SIZE = 1_000_000
+
+def pair_distances(data: np.ndarray, rows: np.ndarray, cols: np.ndarray,
+                   other: np.ndarray = None) -> np.ndarray:
+    """
+    Calculate Hamming distances for explicit (row, col) pairs of kernel input.
+    
+    Args:
+        data: Output of prepare_kernel_input
+        rows: First sequence index of each pair (into data)
+        cols: Second sequence index of each pair (into other, or data)
+        other: Kernel input of a second set with the same encoding
+        
+    Returns:
+        Array with one distance per pair
+    """
+    if other is None:
+        other = data
+    if data.ndim == 1:
+        return packed_hamming_distance(data[rows], other[cols])
+    return (data[rows] != other[cols]).sum(axis=1, dtype=np.uint16)
+
+def segment_bounds(length: int, threshold: int) -> List[int]:
+    """Boundaries of the threshold + 1 disjoint pigeonhole segments of a sequence."""
+    num_segments = threshold + 1
+    return [(s * length) // num_segments for s in range(num_segments + 1)]
+
+def segment_keys(encoded: np.ndarray, seg_start: int, seg_stop: int) -> np.ndarray:
+    """
+    Exact-match keys of one segment of every encoded sequence.
+    
+    Args:
+        encoded: Output of encode_sequences
+        seg_start: First position of the segment
+        seg_stop: Position after the last one of the segment
+        
+    Returns:
+        uint64 keys for segments of up to 32 bases, raw byte keys otherwise
+    """
+    segment = encoded[:, seg_start:seg_stop]
+    if seg_stop - seg_start <= MAX_PACKED_LENGTH:
+        shifts = np.arange(seg_stop - seg_start, dtype=np.uint64) * np.uint64(2)
+        return np.bitwise_or.reduce(BASE_CODES[segment] << shifts, axis=1)
+    segment = np.ascontiguousarray(segment)
+    return segment.view(np.dtype((np.void, seg_stop - seg_start))).ravel()
+
+def find_collisions(sequences: List[str], threshold: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find all pairs within a Hamming distance threshold using a pigeonhole index.
+    
+    Two sequences within distance k of each other must agree exactly on at
+    least one of k + 1 disjoint segments, so only pairs that share a segment
+    bucket are verified with the distance kernel.
+    
+    Args:
+        sequences: List of DNA sequences of equal length
+        threshold: Maximum distance of a reported pair
+        
+    Returns:
+        Tuple of (rows, cols, distances) arrays, ordered by (i, j) exactly
+        like a brute-force scan of the upper triangle
+    """
+    n = len(sequences)
+    length = len(sequences[0]) if sequences else 0
+    empty = np.zeros(0, dtype=np.int64)
+    
+    if n < 2 or threshold < 0:
+        return empty, empty, np.zeros(0, dtype=distance_dtype(length))
+    
+    # Segments would be empty, so every pair is a candidate anyway
+    if threshold >= length:
+        return compute_distance_matrix(sequences).pairs_within(threshold)
+    
+    encoded = encode_sequences(sequences)
+    data = prepare_kernel_input(sequences)
+    bounds = segment_bounds(length, threshold)
+    
+    hit_rows, hit_cols, hit_distances = [], [], []
+    pending_rows, pending_cols = [], []
+    pending_count = 0
+    
+    def verify_pending():
+        rows = np.concatenate(pending_rows)
+        cols = np.concatenate(pending_cols)
+        distances = pair_distances(data, rows, cols)
+        keep = distances <= threshold
+        hit_rows.append(rows[keep])
+        hit_cols.append(cols[keep])
+        hit_distances.append(distances[keep])
+        pending_rows.clear()
+        pending_cols.clear()
+    
+    for seg_start, seg_stop in zip(bounds[:-1], bounds[1:]):
+        keys = segment_keys(encoded, seg_start, seg_stop)
+        _, groups, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        groups = groups.ravel()
+        
+        # Members of each bucket are contiguous and ascending after a stable sort
+        order = np.argsort(groups, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        
+        for size in np.unique(counts[counts > 1]).tolist():
+            bucket_starts = starts[counts == size]
+            left, right = np.triu_indices(size, k=1)
+            pairs_per_bucket = len(left)
+            chunk = max(1, CANDIDATE_BATCH_SIZE // pairs_per_bucket)
+            
+            for offset in range(0, len(bucket_starts), chunk):
+                members = order[bucket_starts[offset:offset + chunk, np.newaxis] + np.arange(size)]
+                pending_rows.append(members[:, left].ravel())
+                pending_cols.append(members[:, right].ravel())
+                pending_count += members.shape[0] * pairs_per_bucket
+                
+                if pending_count >= CANDIDATE_BATCH_SIZE:
+                    verify_pending()
+                    pending_count = 0
+    
+    if pending_rows:
+        verify_pending()
+    
+    if not hit_rows:
+        return empty, empty, np.zeros(0, dtype=distance_dtype(length))
+    
+    rows = np.concatenate(hit_rows).astype(np.int64)
+    cols = np.concatenate(hit_cols).astype(np.int64)
+    distances = np.concatenate(hit_distances).astype(distance_dtype(length))
+    
+    # Pairs sharing several segments are found more than once
+    pair_keys, first = np.unique(rows * n + cols, return_index=True)
+    return pair_keys // n, pair_keys % n, distances[first]
+
+def iter_key_matches(keys1: np.ndarray, keys2: np.ndarray) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Enumerate all (i, j) with keys1[i] == keys2[j], in chunks of about CANDIDATE_BATCH_SIZE pairs.
+    
+    Args:
+        keys1: Segment keys of the first set
+        keys2: Segment keys of the second set (same dtype)
+        
+    Yields:
+        Tuples of (indices into keys1, indices into keys2)
+    """
+    n1 = len(keys1)
+    _, groups = np.unique(np.concatenate((keys1, keys2)), return_inverse=True)
+    groups = groups.ravel()
+    groups1, groups2 = groups[:n1], groups[n1:]
+    
+    # For every key of the second set, the run of first-set members in its bucket
+    order1 = np.argsort(groups1, kind='stable')
+    sorted_groups1 = groups1[order1]
+    lo = np.searchsorted(sorted_groups1, groups2, side='left')
+    counts = np.searchsorted(sorted_groups1, groups2, side='right') - lo
+    
+    matched = np.flatnonzero(counts)
+    cumulative = np.cumsum(counts[matched])
+    chunk_bounds = np.searchsorted(cumulative, np.arange(0, cumulative[-1] if len(cumulative) else 0, CANDIDATE_BATCH_SIZE), side='right')
+    chunk_bounds = np.unique(np.concatenate(([0], chunk_bounds, [len(matched)])))
+    
+    for chunk_start, chunk_stop in zip(chunk_bounds[:-1], chunk_bounds[1:]):
+        cols_matched = matched[chunk_start:chunk_stop]
+        chunk_counts = counts[cols_matched]
+        total = int(chunk_counts.sum())
+        if total == 0:
+            continue
+        run_starts = np.repeat(lo[cols_matched] - (np.cumsum(chunk_counts) - chunk_counts), chunk_counts)
+        yield order1[np.arange(total) + run_starts], np.repeat(cols_matched, chunk_counts)
+
+def find_cross_collisions(sequences1: List[str], sequences2: List[str],
+                          threshold: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find all (i, j) pairs between two sets within a Hamming distance threshold.
+    
+    Uses the same pigeonhole segments as find_collisions, matching the
+    segment buckets of the first set against the second; pairs inside
+    either set are never compared.
+    
+    Args:
+        sequences1: First list of DNA sequences
+        sequences2: Second list of DNA sequences (same length as the first)
+        threshold: Maximum distance of a reported pair
+        
+    Returns:
+        Tuple of (indices into sequences1, indices into sequences2,
+        distances), ordered by (i, j)
+    """
+    n1, n2 = len(sequences1), len(sequences2)
+    length = len(sequences1[0]) if sequences1 else (len(sequences2[0]) if sequences2 else 0)
+    empty = np.zeros(0, dtype=np.int64)
+    no_hits = (empty, empty, np.zeros(0, dtype=distance_dtype(length)))
+    
+    if n1 == 0 or n2 == 0 or threshold < 0:
+        return no_hits
+    if len(sequences2[0]) != length:
+        raise ValueError(f"Sequences must be of equal length. Got {length} and {len(sequences2[0])}")
+    
+    data1, data2 = prepare_kernel_input(sequences1), prepare_kernel_input(sequences2)
+    hit_rows, hit_cols, hit_distances = [], [], []
+    
+    def verify(rows, cols):
+        distances = pair_distances(data1, rows, cols, other=data2)
+        keep = distances <= threshold
+        hit_rows.append(rows[keep])
+        hit_cols.append(cols[keep])
+        hit_distances.append(distances[keep])
+    
+    if threshold >= length:
+        # Segments would be empty, so every pair is a candidate anyway
+        block_size = max(1, MAX_BLOCK_BYTES // (n2 * bytes_per_pair(data1)))
+        for start in range(0, n1, block_size):
+            rows, cols = np.nonzero(block_distances(data1[start:start + block_size], data2) <= threshold)
+            verify(rows + start, cols)
+    else:
+        encoded1, encoded2 = encode_sequences(sequences1), encode_sequences(sequences2)
+        bounds = segment_bounds(length, threshold)
+        
+        for seg_start, seg_stop in zip(bounds[:-1], bounds[1:]):
+            for rows, cols in iter_key_matches(segment_keys(encoded1, seg_start, seg_stop),
+                                               segment_keys(encoded2, seg_start, seg_stop)):
+                verify(rows, cols)
+    
+    if not hit_rows:
+        return no_hits
+    
+    rows = np.concatenate(hit_rows).astype(np.int64)
+    cols = np.concatenate(hit_cols).astype(np.int64)
+    distances = np.concatenate(hit_distances).astype(distance_dtype(length))
+    
+    # Pairs sharing several segments are found more than once
+    pair_keys, first = np.unique(rows * n2 + cols, return_index=True)
+    return pair_keys // n2, pair_keys % n2, distances[first]
+
+# Incremental libraries keep their tile minima at no more than this many tiles per axis
+LIBRARY_MAX_TILES = 512
+
+def coarsen_tile_minima(minima: np.ndarray, factor: int) -> np.ndarray:
+    """
+    Merge every factor x factor group of tiles into one tile holding their minimum.
+    
+    Args:
+        minima: Symmetric (tiles x tiles) array of minimum distances
+        factor: Number of tiles merged along each axis
+        
+    Returns:
+        Symmetric array of minimum distances for tiles factor times larger
+    """
+    if factor == 1 or not len(minima):
+        return minima
+    starts = np.arange(0, len(minima), factor)
+    return np.minimum.reduceat(np.minimum.reduceat(minima, starts, axis=0), starts, axis=1)
+
+def tile_bounds(start: int, stop: int, tile_size: int) -> np.ndarray:
+    """Offsets, relative to start, where the tiles overlapping [start, stop) begin (the first clipped to 0)."""
+    first = (start // tile_size + 1) * tile_size
+    return np.concatenate(([0], np.arange(first, stop, tile_size) - start))
+
+@dataclass
+class CollisionIndex:
+    """
+    A validated barcode library with its collisions at a fixed threshold.
+    
+    New barcodes are appended by comparing them only against the library
+    and against each other, so the index never rescans existing pairs. The
+    same new-vs-library blocks keep the distance histogram, every barcode's
+    closest neighbour and the heatmap tile minima of the whole library up
+    to date; summary() hands them to the views as a DistanceSummary.
+    """
+    sequences: List[str]
+    threshold: int
+    rows: np.ndarray
+    cols: np.ndarray
+    distances: np.ndarray
+    histogram: np.ndarray = None
+    nearest_distances: np.ndarray = None
+    nearest_indices: np.ndarray = None
+    tile_size: int = 1
+    tile_minima: np.ndarray = None
+    
+    @classmethod
+    def build(cls, sequences: List[str], threshold: int) -> 'CollisionIndex':
+        """Index a library from scratch."""
+        rows, cols, distances = find_collisions(sequences, threshold)
+        index = cls(list(sequences), threshold, rows, cols, distances)
+        index.add_distances(0)
+        return index
+    
+    @property
+    def length(self) -> int:
+        return len(self.sequences[0]) if self.sequences else 0
+    
+    def append(self, new_sequences: List[str]) -> int:
+        """
+        Add sequences to the library in place, updating the collisions.
+        
+        Args:
+            new_sequences: Validated DNA sequences of the library's length
+            
+        Returns:
+            Number of new collision pairs
+        """
+        if not new_sequences:
+            return 0
+        if self.sequences and len(new_sequences[0]) != self.length:
+            raise ValueError(f"Sequences must be of equal length. Got {self.length} and {len(new_sequences[0])}")
+        
+        offset = len(self.sequences)
+        cross_rows, cross_cols, cross_distances = find_cross_collisions(self.sequences, new_sequences, self.threshold)
+        new_rows, new_cols, new_distances = find_collisions(new_sequences, self.threshold)
+        
+        # Existing-vs-new pairs sort between the existing rows' pairs, so merge by (i, j)
+        rows = np.concatenate((self.rows, cross_rows, new_rows + offset))
+        cols = np.concatenate((self.cols, cross_cols + offset, new_cols + offset))
+        distances = np.concatenate((self.distances, cross_distances, new_distances)).astype(distance_dtype(len(new_sequences[0])))
+        order = np.lexsort((cols, rows))
+        self.rows, self.cols, self.distances = rows[order], cols[order], distances[order]
+        self.sequences.extend(new_sequences)
+        self.add_distances(offset)
+        return len(cross_distances) + len(new_distances)
+    
+    def add_distances(self, offset: int) -> None:
+        """
+        Fold the distances of sequences offset .. n-1 into the histogram, nearest neighbours and tile minima.
+        
+        Only the blocks of those sequences against the ones before them and
+        against each other are computed, one block of rows at a time.
+        
+        Args:
+            offset: Number of sequences already accounted for
+        """
+        n = len(self.sequences)
+        dtype = distance_dtype(self.length)
+        no_pair = np.iinfo(dtype).max
+        if offset == 0:
+            self.histogram = np.zeros(self.length + 1, dtype=np.int64)
+            self.nearest_distances = np.zeros(0, dtype=dtype)
+            self.nearest_indices = np.zeros(0, dtype=np.int64)
+            self.tile_size, self.tile_minima = 1, np.zeros((0, 0), dtype=dtype)
+        self.nearest_distances = np.concatenate((self.nearest_distances, np.full(n - offset, no_pair, dtype=dtype)))
+        self.nearest_indices = np.concatenate((self.nearest_indices, np.full(n - offset, -1, dtype=np.int64)))
+        
+        # Tiles double in size whenever the grid would outgrow LIBRARY_MAX_TILES
+        while -(-n // self.tile_size) > LIBRARY_MAX_TILES:
+            self.tile_minima = coarsen_tile_minima(self.tile_minima, 2)
+            self.tile_size *= 2
+        num_tiles = -(-n // self.tile_size)
+        grown = np.full((num_tiles, num_tiles), no_pair, dtype=dtype)
+        grown[:len(self.tile_minima), :len(self.tile_minima)] = self.tile_minima
+        self.tile_minima = grown
+        if n - offset == 0:
+            return
+        
+        data = prepare_kernel_input(self.sequences)
+        block_size = max(1, MAX_BLOCK_BYTES // ((n - offset) * bytes_per_pair(data)))
+        for start in range(0, offset, block_size):
+            stop = min(start + block_size, offset)
+            block = block_distances(data[start:stop], data[offset:])
+            self.histogram += distance_histogram(block, self.length + 1)
+            self.add_block(start, stop, offset, block.astype(dtype, copy=False))
+        for start in range(offset, n, block_size):
+            stop = min(start + block_size, n)
+            block = block_distances(data[start:stop], data[start:])
+            width = stop - start
+            # Count the block's own square once, then mask each sequence against itself
+            self.histogram += distance_histogram(block[:, width:], self.length + 1)
+            self.histogram += distance_histogram(block[:, :width][np.triu(np.ones((width, width), dtype=bool), k=1)],
+                                                 self.length + 1)
+            block = block.astype(dtype, copy=False)
+            block[np.arange(width), np.arange(width)] = no_pair
+            self.add_block(start, stop, start, block)
+    
+    def add_block(self, start: int, stop: int, col_start: int, block: np.ndarray) -> None:
+        """
+        Fold one block (rows start .. stop-1 against columns from col_start) into the neighbours and tile minima.
+        
+        Columns either all follow the rows, or begin with the rows' own square;
+        every neighbour found earlier has a lower index, so only strictly
+        closer candidates replace it and ties resolve to the lowest index.
+        """
+        nearest = block.argmin(axis=1)
+        row_minima = block[np.arange(stop - start), nearest]
+        closer = row_minima < self.nearest_distances[start:stop]
+        self.nearest_distances[start:stop][closer] = row_minima[closer]
+        self.nearest_indices[start:stop][closer] = col_start + nearest[closer]
+        
+        later = block[:, max(stop - col_start, 0):]
+        if later.shape[1]:
+            later_start = col_start + block.shape[1] - later.shape[1]
+            nearest = later.argmin(axis=0)
+            column_minima = later[nearest, np.arange(later.shape[1])]
+            target = slice(later_start, later_start + later.shape[1])
+            closer = column_minima < self.nearest_distances[target]
+            self.nearest_distances[target][closer] = column_minima[closer]
+            self.nearest_indices[target][closer] = start + nearest[closer]
+        
+        row_tile, col_tile = start // self.tile_size, col_start // self.tile_size
+        col_stop = col_start + block.shape[1]
+        minima = np.minimum.reduceat(block, tile_bounds(start, stop, self.tile_size), axis=0)
+        minima = np.minimum.reduceat(minima, tile_bounds(col_start, col_stop, self.tile_size), axis=1)
+        target = self.tile_minima[row_tile:row_tile + minima.shape[0], col_tile:col_tile + minima.shape[1]]
+        np.minimum(target, minima, out=target)
+        target = self.tile_minima[col_tile:col_tile + minima.shape[1], row_tile:row_tile + minima.shape[0]]
+        np.minimum(target, minima.T, out=target)
+    
+    def heatmap_tile_size(self, tile_size: int) -> int:
+        """Smallest multiple of the index's tile size that is at least tile_size."""
+        return -(-tile_size // self.tile_size) * self.tile_size
+    
+    def summary(self, tile_size: int = None) -> 'DistanceSummary':
+        """
+        The library's distance summary, read from the index without a kernel pass.
+        
+        Args:
+            tile_size: Sequences per heatmap tile, a multiple of the index's
+                tile_size (see heatmap_tile_size); tile minima are skipped when omitted
+                
+        Returns:
+            DistanceSummary of the whole library
+        """
+        tile_minima = None
+        if tile_size:
+            if tile_size % self.tile_size:
+                raise ValueError(f"Tile size must be a multiple of {self.tile_size}. Got {tile_size}")
+            tile_minima = coarsen_tile_minima(self.tile_minima, tile_size // self.tile_size)
+        return DistanceSummary(self.histogram, self.nearest_distances, self.nearest_indices, tile_minima)
+    
+    def distance_matrix(self) -> DistanceMatrix:
+        """Full distance matrix, available while the index still keeps one tile per sequence."""
+        if self.tile_size != 1:
+            raise ValueError(f"The index keeps the full matrix only up to {LIBRARY_MAX_TILES} sequences")
+        n = len(self.sequences)
+        return DistanceMatrix(n, self.length, self.tile_minima[np.triu_indices(n, k=1)])
+    
+    def save(self, file) -> None:
+        """Write the index to a .npz file (path or binary file object)."""
+        np.savez_compressed(
+            file,
+            encoded=encode_sequences(self.sequences),
+            threshold=self.threshold,
+            rows=self.rows,
+            cols=self.cols,
+            distances=self.distances,
+            histogram=self.histogram,
+            nearest_distances=self.nearest_distances,
+            nearest_indices=self.nearest_indices,
+            tile_size=self.tile_size,
+            tile_minima=self.tile_minima
+        )
+    
+    @classmethod
+    def load(cls, file) -> 'CollisionIndex':
+        """Read an index written by save (path or binary file object)."""
+        with np.load(file) as archive:
+            encoded = archive['encoded']
+            sequences = [row.tobytes().decode('ascii') for row in encoded]
+            return cls(sequences, int(archive['threshold']), archive['rows'], archive['cols'], archive['distances'],
+                       archive['histogram'], archive['nearest_distances'], archive['nearest_indices'],
+                       int(archive['tile_size']), archive['tile_minima'])
+
+# Bit-parallel edit distance (Myers 1999): one uint64 column per pair
+MAX_EDIT_LENGTH = 64
+ALL_BITS = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+def calculate_edit_distance(seq1: str, seq2: str) -> int:
+    """
+    Calculate the Levenshtein (edit) distance between two DNA sequences.
+    
+    Args:
+        seq1: First DNA sequence
+        seq2: Second DNA sequence (may differ in length)
+        
+    Returns:
+        Minimum number of substitutions, insertions and deletions
+    """
+    seq1, seq2 = seq1.upper(), seq2.upper()
+    m = len(seq1)
+    if m == 0:
+        return len(seq2)
+    
+    # Python integers hold the whole DP column, whatever the length
+    peq = {}
+    for i, base in enumerate(seq1):
+        peq[base] = peq.get(base, 0) | (1 << i)
+    full = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = full, 0, m
+    
+    for base in seq2:
+        eq = peq.get(base, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    
+    return score
+
+def encode_variable_sequences(sequences: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Encode sequences of any length (at most MAX_EDIT_LENGTH) for the edit-distance kernel.
+    
+    Args:
+        sequences: List of DNA sequences
+        
+    Returns:
+        Tuple (codes, lengths, masks): (n x max length) 2-bit base codes padded
+        with zeros, the length of every sequence, and (n x 4) uint64 bit masks
+        of the positions holding each base
+    """
+    lengths = np.fromiter((len(seq) for seq in sequences), dtype=np.int64, count=len(sequences))
+    max_length = int(lengths.max()) if len(lengths) else 0
+    if max_length > MAX_EDIT_LENGTH:
+        raise ValueError(f"Edit distance supports at most {MAX_EDIT_LENGTH} bases. Got {max_length}")
+    
+    codes = np.zeros((len(sequences), max_length), dtype=np.uint8)
+    if max_length:
+        buffer = np.frombuffer(''.join(sequences).encode('ascii'), dtype=np.uint8)
+        positions = np.arange(len(buffer)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        codes[np.repeat(np.arange(len(sequences)), lengths), positions] = BASE_CODES[buffer]
+    
+    valid = np.arange(max_length) < lengths[:, np.newaxis]
+    bits = np.uint64(1) << np.arange(max_length, dtype=np.uint64)
+    masks = np.stack([
+        np.bitwise_or.reduce(np.where((codes == base) & valid, bits, np.uint64(0)), axis=1)
+        for base in range(4)
+    ], axis=1) if max_length else np.zeros((len(sequences), 4), dtype=np.uint64)
+    return codes, lengths, masks
+
+def low_bits(count: np.ndarray) -> np.ndarray:
+    """uint64 masks with the lowest `count` bits set (0 <= count <= 64)."""
+    count = np.asarray(count, dtype=np.uint64)
+    shifted = ALL_BITS >> (np.uint64(64) - np.maximum(count, np.uint64(1)))
+    return np.where(count == 0, np.uint64(0), shifted)
+
+def edit_pair_distances(encoding: Tuple[np.ndarray, np.ndarray, np.ndarray], rows: np.ndarray,
+                        cols: np.ndarray, max_distance: Optional[int] = None) -> np.ndarray:
+    """
+    Calculate edit distances for explicit (row, col) pairs with Myers' bit-parallel algorithm.
+    
+    All pairs advance one text base per step as uint64 column vectors. With
+    max_distance set, a pair stops as soon as the DP cell on its final
+    diagonal exceeds it (values along a diagonal never decrease), so most
+    unrelated pairs are rejected after a few bases.
+    
+    Args:
+        encoding: Output of encode_variable_sequences
+        rows: Index of the first sequence of each pair
+        cols: Index of the second sequence of each pair
+        max_distance: Stop early above this distance, or None for exact distances
+        
+    Returns:
+        uint8 array with one distance per pair; with max_distance, pairs
+        further apart are reported as max_distance + 1
+    """
+    codes, lengths, masks = encoding
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    cap = MAX_EDIT_LENGTH if max_distance is None else min(max_distance, MAX_EDIT_LENGTH)
+    result = np.empty(len(rows), dtype=np.uint8)
+    
+    for start in range(0, len(rows), CANDIDATE_BATCH_SIZE):
+        pair_ids = np.arange(start, min(start + CANDIDATE_BATCH_SIZE, len(rows)))
+        m, n = lengths[rows[pair_ids]], lengths[cols[pair_ids]]
+        result[pair_ids] = np.minimum(m + n, cap + 1)
+        
+        # Empty patterns and pairs whose length difference alone exceeds the cap are done
+        active = (m > 0) & (np.abs(m - n) <= cap)
+        result[pair_ids[active & (n == 0)]] = m[active & (n == 0)]
+        active &= n > 0
+        pair_ids, m, n = pair_ids[active], m[active], n[active]
+        
+        patterns, texts = rows[pair_ids], cols[pair_ids]
+        full = low_bits(m)
+        high = np.uint64(1) << (m - 1).astype(np.uint64)
+        pv, mv = full.copy(), np.zeros(len(pair_ids), dtype=np.uint64)
+        score = m.copy()
+        alive = np.ones(len(pair_ids), dtype=bool)
+        
+        for j in range(int(n.max()) if len(pair_ids) else 0):
+            eq = masks[patterns, codes[texts, j]]
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | (~(xh | pv) & full)
+            mh = pv & xh
+            score += ((ph & high) != 0).astype(np.int64) - ((mh & high) != 0).astype(np.int64)
+            ph = ((ph << np.uint64(1)) | np.uint64(1)) & full
+            mh = (mh << np.uint64(1)) & full
+            pv = mh | (~(xv | ph) & full)
+            mv = ph & xv
+            
+            finished = alive & (n == j + 1)
+            result[pair_ids[finished]] = np.minimum(score[finished], cap + 1)
+            alive &= ~finished
+            if max_distance is not None:
+                # DP cell (i, j + 1) on the diagonal ending at (m, n), from the vertical deltas below row m
+                i = np.clip(j + 1 + m - n, 0, m)
+                above = full & ~low_bits(i)
+                diagonal = score - popcount64(pv & above).astype(np.int64) + popcount64(mv & above).astype(np.int64)
+                rejected = alive & (j + 1 + m - n >= 0) & (diagonal > cap)
+                result[pair_ids[rejected]] = cap + 1
+                alive &= ~rejected
+            
+            # Finished pairs keep computing harmlessly until enough of them are dropped at once
+            remaining = np.count_nonzero(alive)
+            if remaining == 0:
+                break
+            if remaining < len(alive) // 2:
+                pair_ids, m, n, patterns, texts = pair_ids[alive], m[alive], n[alive], patterns[alive], texts[alive]
+                full, high, pv, mv, score = full[alive], high[alive], pv[alive], mv[alive], score[alive]
+                alive = alive[alive]
+    
+    return result
+
+def base_counts(encoding: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+    """(n x 4) counts of A, C, G and T per encoded sequence."""
+    return popcount64(encoding[2]).astype(np.int16)
+
+def unique_keys(keys: np.ndarray) -> np.ndarray:
+    """Sorted distinct values of an integer key array (sort-based, much faster than np.unique on large arrays)."""
+    keys = np.sort(keys)
+    return keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+
+def window_keys(codes: np.ndarray, start: int, width: int) -> np.ndarray:
+    """Exact-match keys of codes[:, start:start + width] (2-bit base codes)."""
+    window = codes[:, start:start + width]
+    if width <= MAX_PACKED_LENGTH:
+        shifts = np.arange(width, dtype=np.uint64) * np.uint64(2)
+        return np.bitwise_or.reduce(window.astype(np.uint64) << shifts, axis=1)
+    window = np.ascontiguousarray(window)
+    return window.view(np.dtype((np.void, width))).ravel()
+
+def edit_candidate_pairs(lengths: np.ndarray, codes: np.ndarray, threshold: int) -> Iterator[np.ndarray]:
+    """
+    Yield candidate pairs (as i * n + j keys, i < j) that may lie within an edit distance threshold.
+    
+    An edit script with at most k edits leaves one of k + 1 disjoint segments
+    of the shorter sequence intact, and that segment reappears in the other
+    sequence shifted by at most k positions. Each segment is therefore
+    matched against the windows of the same width at every shift in [-k, k].
+    When segments are too short for this to be selective, or a sequence is
+    shorter than k + 1 bases, all pairs with a compatible length are
+    yielded instead.
+    
+    Args:
+        lengths: Length of every sequence
+        codes: Padded 2-bit codes from encode_variable_sequences
+        threshold: Maximum edit distance k
+        
+    Yields:
+        Arrays of candidate pair keys (may repeat across chunks)
+    """
+    n = len(lengths)
+    order = np.argsort(lengths, kind='stable')
+    sorted_lengths = lengths[order]
+    
+    def all_pairs(members: np.ndarray) -> Iterator[np.ndarray]:
+        # Every listed sequence against every longer-or-equal one within the length window
+        positions = np.searchsorted(sorted_lengths, lengths[members], side='left')
+        stops = np.searchsorted(sorted_lengths, lengths[members] + threshold, side='right')
+        for start in range(0, len(members), max(1, CANDIDATE_BATCH_SIZE // max(n, 1))):
+            block = slice(start, start + max(1, CANDIDATE_BATCH_SIZE // max(n, 1)))
+            counts = stops[block] - positions[block]
+            first = np.repeat(members[block], counts)
+            offsets = np.arange(len(first)) - np.repeat(np.cumsum(counts) - counts, counts)
+            second = order[np.repeat(positions[block], counts) + offsets]
+            keep = first != second
+            first, second = first[keep], second[keep]
+            yield np.minimum(first, second) * n + np.maximum(first, second)
+    
+    for length in np.unique(lengths).tolist():
+        members = np.flatnonzero(lengths == length)
+        bounds = segment_bounds(length, threshold)
+        widths = np.diff(bounds)
+        
+        # Expected fraction of random pairs matching some segment at some shift
+        selectivity = (2 * threshold + 1) * float(np.sum(4.0 ** -widths))
+        if length < threshold + 1 or selectivity >= 0.25:
+            yield from all_pairs(members)
+            continue
+        
+        partners = np.flatnonzero((lengths >= length) & (lengths <= length + threshold))
+        for seg_start, seg_stop in zip(bounds[:-1], bounds[1:]):
+            member_keys = window_keys(codes[members], seg_start, seg_stop - seg_start)
+            for shift in range(-threshold, threshold + 1):
+                window_start = seg_start + shift
+                if window_start < 0:
+                    continue
+                fits = partners[lengths[partners] >= window_start + seg_stop - seg_start]
+                if not len(fits):
+                    continue
+                partner_keys = window_keys(codes[fits], window_start, seg_stop - seg_start)
+                for first, second in iter_key_matches(member_keys, partner_keys):
+                    first, second = members[first], fits[second]
+                    keep = first != second
+                    first, second = first[keep], second[keep]
+                    yield unique_keys(np.minimum(first, second) * n + np.maximum(first, second))
+
+def find_edit_collisions(sequences: List[str], threshold: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find all pairs of sequences (of any lengths) within an edit distance threshold.
+    
+    Candidate pairs come from a shifted pigeonhole index (edit_candidate_pairs)
+    and are screened by base composition (every edit changes the base
+    counts by at most two) before the early-exit bit-parallel kernel runs.
+    
+    Args:
+        sequences: List of DNA sequences of at most MAX_EDIT_LENGTH bases
+        threshold: Maximum edit distance of a reported pair
+        
+    Returns:
+        Tuple of (rows, cols, distances) arrays with rows < cols, ordered by (i, j)
+    """
+    n = len(sequences)
+    empty = np.zeros(0, dtype=np.int64)
+    if n < 2 or threshold < 0:
+        return empty, empty, np.zeros(0, dtype=np.uint8)
+    
+    encoding = encode_variable_sequences(sequences)
+    codes, lengths, _ = encoding
+    counts = base_counts(encoding)
+    hits = []
+    
+    pending, pending_count = [], 0
+    
+    def verify_pending():
+        keys = unique_keys(np.concatenate(pending))
+        rows, cols = keys // n, keys % n
+        composition = np.abs(counts[rows] - counts[cols]).sum(axis=1)
+        candidates = (composition + 1) // 2 <= threshold
+        rows, cols = rows[candidates], cols[candidates]
+        distances = edit_pair_distances(encoding, rows, cols, threshold)
+        keep = distances <= threshold
+        hits.append((rows[keep] * n + cols[keep], distances[keep]))
+        pending.clear()
+    
+    for keys in edit_candidate_pairs(lengths, codes, threshold):
+        pending.append(keys)
+        pending_count += len(keys)
+        if pending_count >= CANDIDATE_BATCH_SIZE:
+            verify_pending()
+            pending_count = 0
+    if pending:
+        verify_pending()
+    
+    if not hits:
+        return empty, empty, np.zeros(0, dtype=np.uint8)
+    
+    # Pairs found in several chunks are verified more than once
+    pair_keys, first = np.unique(np.concatenate([h[0] for h in hits]), return_index=True)
+    distances = np.concatenate([h[1] for h in hits])[first]
+    return pair_keys // n, pair_keys % n, distances
+
+def compute_edit_distance_matrix(sequences: List[str]) -> DistanceMatrix:
+    """
+    Calculate all pairwise edit distances as a condensed matrix.
+    
+    Args:
+        sequences: List of DNA sequences of at most MAX_EDIT_LENGTH bases
+        
+    Returns:
+        DistanceMatrix holding every pair's edit distance (length is the longest sequence)
+    """
+    n = len(sequences)
+    encoding = encode_variable_sequences(sequences)
+    matrix = DistanceMatrix(n, encoding[0].shape[1], np.zeros(n * (n - 1) // 2, dtype=np.uint8))
+    rows, cols = matrix.pair_indices(np.arange(matrix.num_pairs))
+    matrix.condensed[:] = edit_pair_distances(encoding, rows, cols)
+    return matrix
+
+def tile_minima_from_pairs(n: int, tile_size: int, rows: np.ndarray, cols: np.ndarray,
+                           distances: np.ndarray, fill: int) -> np.ndarray:
+    """
+    Aggregate known close pairs into per-tile minimum distances.
+    
+    Used where only the pairs within a threshold are known (e.g. edit
+    distance collisions); every other pair is assumed to be at least `fill`.
+    
+    Args:
+        n: Number of sequences
+        tile_size: Number of sequences per tile along each axis
+        rows: First sequence index of each pair
+        cols: Second sequence index of each pair
+        distances: Distance of each pair
+        fill: Value reported for tiles without a listed pair
+        
+    Returns:
+        Symmetric (tiles x tiles) uint8 array of minimum distances; tiles without any pair hold 255
+    """
+    num_tiles = -(-n // tile_size)
+    minima = np.full((num_tiles, num_tiles), fill, dtype=np.uint8)
+    
+    # A trailing single-sequence tile has no pair of its own
+    if n % tile_size == 1:
+        minima[-1, -1] = np.iinfo(np.uint8).max
+    
+    np.minimum.at(minima, (rows // tile_size, cols // tile_size), distances.astype(np.uint8))
+    return np.minimum(minima, minima.T)
+
+def conflict_graph(n: int, rows: np.ndarray, cols: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Build the undirected conflict graph of collision pairs in CSR form.
+    
+    Args:
+        n: Number of sequences (nodes)
+        rows: First index of each conflicting pair
+        cols: Second index of each conflicting pair
+        
+    Returns:
+        Tuple (indptr, indices): the neighbours of node v are indices[indptr[v]:indptr[v + 1]]
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    sources = np.concatenate((rows, cols))
+    targets = np.concatenate((cols, rows))
+    
+    order = np.argsort(sources, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+    return indptr, targets[order]
+
+def greedy_independent_set(indptr: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """
+    Degree-ordered greedy independent set, computed in vectorised rounds.
+    
+    Each round keeps every undecided node that ranks before all of its
+    undecided neighbours by (remaining degree, index) and drops the
+    neighbours of the kept nodes, so low-conflict barcodes are preferred
+    and the result is maximal.
+    
+    Args:
+        indptr: CSR row pointers from conflict_graph
+        indices: CSR neighbour lists from conflict_graph
+        
+    Returns:
+        Boolean mask of kept nodes
+    """
+    n = len(indptr) - 1
+    kept = np.zeros(n, dtype=bool)
+    undecided = np.ones(n, dtype=bool)
+    sources = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr))
+    targets = indices
+    
+    while undecided.any():
+        live = undecided[sources] & undecided[targets]
+        sources, targets = sources[live], targets[live]
+        rank = np.bincount(sources, minlength=n) * n + np.arange(n)
+        
+        # A node wins when no undecided neighbour ranks before it
+        beaten = np.bincount(sources[rank[targets] < rank[sources]], minlength=n) > 0
+        winners = undecided & ~beaten
+        kept |= winners
+        undecided &= ~winners
+        undecided[targets[winners[sources]]] = False
+    
+    return kept
+
+def improve_independent_set(indptr: np.ndarray, indices: np.ndarray, kept: np.ndarray,
+                            time_budget: float, seed: int = 0) -> np.ndarray:
+    """
+    Grow an independent set by iterated local search until time runs out.
+    
+    (1,2)-swaps drop one kept node and keep two non-adjacent neighbours whose
+    only kept neighbour it was. When no swap is left, a random dropped node is
+    forced in to escape the local optimum; the best set seen is returned.
+    
+    Args:
+        indptr: CSR row pointers from conflict_graph
+        indices: CSR neighbour lists from conflict_graph
+        kept: Boolean mask of a maximal independent set, e.g. from greedy_independent_set
+        time_budget: Seconds to spend searching
+        seed: Random seed for the perturbations
+        
+    Returns:
+        Boolean mask of the improved independent set
+    """
+    deadline = time.perf_counter() + time_budget
+    n = len(indptr) - 1
+    degree = np.diff(indptr)
+    conflicted = np.flatnonzero(degree)
+    if not len(conflicted):
+        return kept
+    rng = np.random.default_rng(seed)
+    
+    # tight[v] counts the kept neighbours of v
+    owners = np.repeat(np.arange(n), degree)
+    tight = np.bincount(indices[kept[owners]], minlength=n).tolist()
+    ptr = indptr.tolist()
+    neighbours = indices.tolist()
+    best = kept.copy()
+    best_size = size = int(kept.sum())
+    kept = kept.tolist()
+    pending = deque(v for v in conflicted.tolist() if kept[v])
+    
+    def insert(v: int) -> None:
+        kept[v] = True
+        for w in neighbours[ptr[v]:ptr[v + 1]]:
+            tight[w] += 1
+        pending.append(v)
+    
+    def remove(v: int) -> None:
+        kept[v] = False
+        for w in neighbours[ptr[v]:ptr[v + 1]]:
+            tight[w] -= 1
+    
+    def refill(freed: List[int]) -> int:
+        # Keep every freed node that no longer has a kept neighbour and
+        # revisit the kept nodes that may now allow a swap
+        added = 0
+        for v in freed:
+            if not kept[v] and tight[v] == 0:
+                insert(v)
+                added += 1
+        for v in freed:
+            if tight[v] == 1:
+                pending.extend(w for w in neighbours[ptr[v]:ptr[v + 1]] if kept[w])
+        return added
+    
+    while time.perf_counter() < deadline:
+        if not pending:
+            if size > best_size:
+                best, best_size = np.array(kept, dtype=bool), size
+            v = int(rng.choice(conflicted))
+            if kept[v]:
+                continue
+            blockers = [w for w in neighbours[ptr[v]:ptr[v + 1]] if kept[w]]
+            freed = []
+            for w in blockers:
+                remove(w)
+                freed.extend(neighbours[ptr[w]:ptr[w + 1]])
+            insert(v)
+            size += 1 - len(blockers) + refill(freed)
+            continue
+        
+        x = pending.popleft()
+        if not kept[x]:
+            continue
+        x_neighbours = neighbours[ptr[x]:ptr[x + 1]]
+        candidates = [u for u in x_neighbours if tight[u] == 1]
+        
+        swap = None
+        for k, a in enumerate(candidates[:-1]):
+            adjacent = set(neighbours[ptr[a]:ptr[a + 1]])
+            b = next((b for b in candidates[k + 1:] if b not in adjacent), None)
+            if b is not None:
+                swap = (a, b)
+                break
+        if swap is None:
+            continue
+        
+        remove(x)
+        size += refill([*swap, *x_neighbours]) - 1
+    
+    if size > best_size:
+        best = np.array(kept, dtype=bool)
+    return best
+
+def select_collision_free(n: int, rows: np.ndarray, cols: np.ndarray,
+                          time_budget: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Choose a large subset of sequences with no conflicting pair among them.
+    
+    Args:
+        n: Number of sequences
+        rows: First index of each conflicting pair
+        cols: Second index of each conflicting pair
+        time_budget: Seconds of local search after the greedy pass (0 disables it)
+        
+    Returns:
+        Tuple (kept, dropped) of sorted sequence indices
+    """
+    indptr, indices = conflict_graph(n, rows, cols)
+    kept = greedy_independent_set(indptr, indices)
+    if time_budget > 0:
+        kept = improve_independent_set(indptr, indices, kept, time_budget)
+    return np.flatnonzero(kept), np.flatnonzero(~kept)
+
+GENERATOR_BATCH_SIZE = 1024
+GENERATOR_MAX_CANDIDATES = 10_000_000
+DNA_BASES = np.frombuffer(b'ACGT', dtype=np.uint8)
+
+def candidate_filter(codes: np.ndarray, gc_range: Optional[Tuple[float, float]],
+                     max_homopolymer: Optional[int]) -> np.ndarray:
+    """
+    Check random candidates against composition constraints.
+    
+    Args:
+        codes: (n x L) array of 2-bit base codes (A=0, C=1, G=2, T=3)
+        gc_range: Allowed (min, max) fraction of G and C bases, or None
+        max_homopolymer: Longest allowed run of one base, or None
+        
+    Returns:
+        Boolean mask of candidates passing every filter
+    """
+    passed = np.ones(len(codes), dtype=bool)
+    length = codes.shape[1]
+    
+    if gc_range is not None:
+        gc = ((codes == 1) | (codes == 2)).sum(axis=1) / length
+        passed &= (gc >= gc_range[0]) & (gc <= gc_range[1])
+    
+    # A run longer than max_homopolymer has max_homopolymer equal neighbours in a row
+    if max_homopolymer is not None and max_homopolymer < length:
+        same = codes[:, 1:] == codes[:, :-1]
+        windows = np.lib.stride_tricks.sliding_window_view(same, max_homopolymer, axis=1)
+        passed &= ~windows.all(axis=2).any(axis=1)
+    
+    return passed
+
+def far_from_reference(candidates: np.ndarray, reference: np.ndarray, min_distance: int) -> np.ndarray:
+    """
+    Check which candidates are at least min_distance from every reference row.
+    
+    Candidates are dropped as soon as one reference block rejects them, so
+    later blocks only compare the survivors.
+    
+    Args:
+        candidates: Kernel input of the candidates
+        reference: Kernel input of the reference set (same encoding)
+        min_distance: Required Hamming distance
+        
+    Returns:
+        Boolean mask of accepted candidates
+    """
+    alive = np.arange(len(candidates))
+    if len(candidates):
+        block = max(1, MAX_BLOCK_BYTES // (len(candidates) * bytes_per_pair(candidates)))
+        for start in range(0, len(reference), block):
+            distances = block_distances(candidates[alive], reference[start:start + block])
+            alive = alive[distances.min(axis=1, initial=min_distance) >= min_distance]
+            if not len(alive):
+                break
+    
+    passed = np.zeros(len(candidates), dtype=bool)
+    passed[alive] = True
+    return passed
+
+def generate_distant_barcodes(length: int, count: int, min_distance: int, existing: List[str] = (),
+                              gc_range: Optional[Tuple[float, float]] = None,
+                              max_homopolymer: Optional[int] = None, seed: Optional[int] = None,
+                              max_candidates: int = GENERATOR_MAX_CANDIDATES) -> Iterator[str]:
+    """
+    Stream new random barcodes at distance >= min_distance from the existing
+    set and from each other.
+    
+    Candidates are drawn in batches, filtered by composition and rejected
+    against the growing set with the Hamming kernel. Barcodes are yielded
+    as soon as they are accepted, so the caller can stop at any time.
+    
+    Args:
+        length: Bases per barcode
+        count: Number of barcodes to generate
+        min_distance: Required Hamming distance to every other barcode
+        existing: Barcodes the new ones must stay away from
+        gc_range: Allowed (min, max) fraction of G and C bases, or None
+        max_homopolymer: Longest allowed run of one base, or None
+        seed: Random seed
+        max_candidates: Give up after drawing this many candidates
+        
+    Yields:
+        Accepted DNA barcodes
+    """
+    if length < 1 or min_distance < 1:
+        raise ValueError("Barcode length and minimum distance must be at least 1")
+    if any(len(seq) != length for seq in existing):
+        raise ValueError(f"Existing barcodes must all have length {length}")
+    
+    rng = np.random.default_rng(seed)
+    packed = length <= MAX_PACKED_LENGTH
+    shifts = np.arange(length, dtype=np.uint64) * np.uint64(2)
+    reference = prepare_kernel_input(list(existing)) if existing else (
+        np.zeros(0, dtype=np.uint64) if packed else np.zeros((0, length), dtype=np.uint8))
+    
+    accepted = 0
+    drawn = 0
+    while accepted < count and drawn < max_candidates:
+        batch = min(GENERATOR_BATCH_SIZE, max_candidates - drawn)
+        drawn += batch
+        codes = rng.integers(0, 4, size=(batch, length), dtype=np.uint8)
+        codes = codes[candidate_filter(codes, gc_range, max_homopolymer)]
+        
+        ascii_rows = DNA_BASES[codes]
+        candidates = np.bitwise_or.reduce(codes.astype(np.uint64) << shifts, axis=1) if packed else ascii_rows
+        survivors = np.flatnonzero(far_from_reference(candidates, reference, min_distance))
+        if not len(survivors):
+            continue
+        
+        # Accept survivors in order, skipping those too close to one accepted from this batch
+        within = block_distances(candidates[survivors], candidates[survivors])
+        open_mask = np.ones(len(survivors), dtype=bool)
+        chosen = []
+        for k in range(len(survivors)):
+            if not open_mask[k]:
+                continue
+            chosen.append(survivors[k])
+            open_mask &= within[k] >= min_distance
+            accepted += 1
+            yield ascii_rows[survivors[k]].tobytes().decode('ascii')
+            if accepted == count:
+                break
+        
+        reference = np.concatenate((reference, candidates[chosen]))
+
+def validate_dna_sequence(sequence: str) -> bool:
+    """
+    Validate if a string is a valid DNA sequence (contains only A, T, G, C).
+    
+    Args:
+        sequence: String to validate
+        
+    Returns:
+        True if valid, False otherwise
+    """
+    sequence = sequence.upper().strip()
+    # Stripping every A/T/G/C from both ends leaves nothing only for pure DNA
+    return bool(sequence) and not sequence.strip('ATGC')
+
+# Byte classes for bulk validation of raw (upper-cased) input buffers
+BYTE_BASE, BYTE_SPACE, BYTE_COLON, BYTE_NEWLINE, BYTE_OTHER = 0, 1, 2, 3, 4
+BYTE_CLASS_TABLE = bytearray([BYTE_OTHER]) * 256
+for _byte in b'ATGC':
+    BYTE_CLASS_TABLE[_byte] = BYTE_BASE
+for _byte in b' \t\r\v\f':
+    BYTE_CLASS_TABLE[_byte] = BYTE_SPACE
+BYTE_CLASS_TABLE[ord(':')] = BYTE_COLON
+BYTE_CLASS_TABLE[ord('\n')] = BYTE_NEWLINE
+BYTE_CLASS_TABLE = bytes(BYTE_CLASS_TABLE)
+READ_CHUNK_SIZE = 8 * 1024 * 1024
+
+def bulk_parse_sequences(text: str, first_line: int = 1) -> Tuple[List[str], List[Tuple[int, str]]]:
+    """
+    Parse and validate many lines of plain-text input at once.
+    
+    The whole buffer is upper-cased and classified with a byte translation
+    table. Lines holding a single run of bases, optionally after a "label:"
+    prefix, are extracted without per-line Python work; only the remaining
+    lines go through parse_sequence_line.
+    
+    Args:
+        text: Input text containing one sequence per line
+        first_line: Line number of the first line of text
+        
+    Returns:
+        Tuple of (valid upper-case sequences in input order,
+        (line number, content) for each invalid line)
+    """
+    raw = text.encode('utf-8')
+    upper = raw.upper()
+    codes = np.frombuffer(upper.translate(BYTE_CLASS_TABLE), dtype=np.uint8)
+    size = len(codes)
+    
+    # Marks are every byte that is neither a base nor whitespace; a virtual
+    # newline at position -1 opens the first line
+    marks = np.concatenate(([-1], np.flatnonzero(codes >= BYTE_COLON)))
+    mark_codes = np.concatenate(([BYTE_NEWLINE], codes[marks[1:]]))
+    newline_marks = np.flatnonzero(mark_codes == BYTE_NEWLINE)
+    starts = marks[newline_marks] + 1
+    stops = np.concatenate((marks[newline_marks[1:]], [size]))
+    
+    # A line's content is free of marks when its last mark is the newline
+    # before it, or is its only colon (content then starts after the label)
+    last_mark = np.concatenate((newline_marks[1:], [len(marks)])) - 1
+    last_mark_pos = marks[last_mark]
+    unlabeled = last_mark_pos < starts
+    colons = np.concatenate(([-1], marks[mark_codes == BYTE_COLON]))
+    previous_colon = colons[np.searchsorted(colons, last_mark_pos) - 1]
+    labeled = ~unlabeled & (mark_codes[last_mark] == BYTE_COLON) & (previous_colon < starts)
+    content = np.where(labeled, last_mark_pos + 1, starts)
+    
+    # Clean lines contain exactly one run of bases in their content
+    is_base = codes == BYTE_BASE
+    edges = np.flatnonzero(is_base[1:] != is_base[:-1]) + 1
+    leading = [0] if size and is_base[0] else []
+    trailing = [size] if size and is_base[-1] else []
+    edges = np.concatenate((leading, edges, trailing)).astype(np.int64)
+    run_starts, run_stops = edges[0::2], edges[1::2]
+    first_run = np.searchsorted(run_starts, content)
+    runs = np.searchsorted(run_starts, stops) - first_run
+    clean = (unlabeled | labeled) & (runs == 1)
+    empty = unlabeled & (runs == 0)
+    
+    # Blank out everything except the base runs of clean lines, then split
+    kept = np.zeros(len(run_starts), dtype=bool)
+    kept[first_run[clean]] = True
+    buffer = np.frombuffer(upper, dtype=np.uint8).copy()
+    buffer[~is_base] = ord(' ')
+    dropped_starts, dropped_stops = run_starts[~kept], run_stops[~kept]
+    if len(dropped_starts):
+        lengths = dropped_stops - dropped_starts
+        offsets = np.repeat(dropped_starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        buffer[np.arange(lengths.sum()) + offsets] = ord(' ')
+    clean_sequences = buffer.tobytes().decode('ascii').split()
+    
+    slow_lines = np.flatnonzero(~clean & ~empty)
+    if len(slow_lines) == 0:
+        return clean_sequences, []
+    
+    invalid = []
+    slow_sequences, slow_indices = [], []
+    for index in slow_lines.tolist():
+        line = raw[starts[index]:stops[index]].decode('utf-8').strip()
+        if not line:
+            # Only non-ASCII whitespace (e.g. NBSP, U+2028): blank, like an ASCII-blank line
+            continue
+        _, sequence = parse_sequence_line(line)
+        if validate_dna_sequence(sequence):
+            slow_sequences.append(sequence.upper())
+            slow_indices.append(index)
+        else:
+            invalid.append((first_line + index, sequence))
+    
+    # Merge both groups back into input order
+    line_order = np.concatenate((np.flatnonzero(clean), np.array(slow_indices, dtype=np.int64)))
+    merged = np.array(clean_sequences + slow_sequences, dtype=object)[np.argsort(line_order, kind='stable')]
+    return merged.tolist(), invalid
+
+class SequenceRecord(NamedTuple):
+    """A parsed input record: optional label, raw sequence and 1-based start line."""
+    label: Optional[str]
+    sequence: str
+    line: int
+
+FASTA_EXTENSIONS = ('.fasta', '.fa')
+FASTQ_EXTENSIONS = ('.fastq', '.fq')
+
+def parse_sequence_line(line: str) -> Tuple[Optional[str], str]:
+    """
+    Split a plain-text input line into an optional label and a sequence.
+    
+    Args:
+        line: Stripped, non-empty input line
+        
+    Returns:
+        Tuple of (label, sequence candidate)
+    """
+    # Remove any labels/identifiers (anything before a colon or space)
+    if ':' in line:
+        label, line = line.split(':', 1)
+        return label.strip(), line.strip()
+    elif ' ' in line and not validate_dna_sequence(line):
+        parts = line.split()
+        # Take the longest part that looks like a DNA sequence
+        valid_parts = [part for part in parts if validate_dna_sequence(part)]
+        if valid_parts:
+            return None, max(valid_parts, key=len)
+    
+    return None, line
+
+def iter_text_records(lines: Iterable[str]) -> Iterator[SequenceRecord]:
+    """
+    Yield one record per non-empty line of plain-text input.
+    
+    Args:
+        lines: Iterable of input lines
+        
+    Yields:
+        SequenceRecord for each non-empty line
+    """
+    for i, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        label, sequence = parse_sequence_line(line)
+        yield SequenceRecord(label, sequence, i)
+
+def iter_fasta_records(lines: Iterable[str]) -> Iterator[SequenceRecord]:
+    """
+    Yield FASTA records, joining multi-line sequences.
+    
+    Args:
+        lines: Iterable of input lines
+        
+    Yields:
+        SequenceRecord for each FASTA entry
+    """
+    label, parts, start = None, [], 1
+    for i, line in enumerate(lines, 1):
+        line = line.strip()
+        if line.startswith('>'):
+            if parts:
+                yield SequenceRecord(label, ''.join(parts), start)
+            label, parts, start = line[1:].strip(), [], i
+        elif line:
+            parts.append(line)
+    
+    # Add the last sequence
+    if parts:
+        yield SequenceRecord(label, ''.join(parts), start)
+
+def iter_fastq_records(lines: Iterable[str]) -> Iterator[SequenceRecord]:
+    """
+    Yield FASTQ records (header, sequence, '+' separator, qualities).
+    
+    Args:
+        lines: Iterable of input lines
+        
+    Yields:
+        SequenceRecord for each FASTQ entry
+    """
+    lines = enumerate((line.strip() for line in lines), 1)
+    for i, header in lines:
+        if not header.startswith('@'):
+            continue
+        sequence = next(lines, (i, ''))[1]
+        next(lines, None)  # '+' separator
+        next(lines, None)  # quality string
+        yield SequenceRecord(header[1:].strip(), sequence, i)
+
+def detect_file_format(name: str) -> str:
+    """
+    Detect the input format from a file name, ignoring a trailing .gz.
+    
+    Args:
+        name: File name
+        
+    Returns:
+        'fasta', 'fastq' or 'text'
+    """
+    name = name.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith(FASTA_EXTENSIONS):
+        return 'fasta'
+    if name.endswith(FASTQ_EXTENSIONS):
+        return 'fastq'
+    return 'text'
+
+@contextmanager
+def open_text_stream(file) -> Iterator[io.TextIOWrapper]:
+    """
+    Open an uploaded file as buffered text, decompressing .gz names on the fly.
+    
+    Lines end at '\n' only and keep a trailing '\r', which the parsers strip,
+    so a lone '\r' never starts a new line and line numbers count '\n' only.
+    The caller's file object is left open when the context exits.
+    
+    Args:
+        file: Uploaded file object (binary, with a name attribute)
+        
+    Yields:
+        Text stream over the file content
+    """
+    compressed = file.name.lower().endswith('.gz')
+    stream = gzip.GzipFile(fileobj=file, mode='rb') if compressed else file
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='\n')
+    try:
+        yield text
+    finally:
+        if compressed:
+            text.close()
+        else:
+            text.detach()
+
+def iter_sequence_records(file) -> Iterator[SequenceRecord]:
+    """
+    Stream records from an uploaded file without loading it into memory.
+    
+    The format is chosen from the file name (.fasta/.fa, .fastq/.fq or plain
+    text); a trailing .gz is decompressed on the fly.
+    
+    Args:
+        file: Uploaded file object (binary, with a name attribute)
+        
+    Yields:
+        SequenceRecord for each entry in the file
+    """
+    file_format = detect_file_format(file.name)
+    with open_text_stream(file) as text:
+        if file_format == 'fasta':
+            yield from iter_fasta_records(text)
+        elif file_format == 'fastq':
+            yield from iter_fastq_records(text)
+        else:
+            yield from iter_text_records(text)
+
+def parse_text(text: str) -> Tuple[List[str], List[Tuple[int, str]]]:
+    """
+    Parse DNA sequences from text input, one sequence per line.
+    
+    Args:
+        text: Input text containing sequences
+        
+    Returns:
+        Tuple of (cleaned DNA sequences, (line number, content) of invalid lines)
+    """
+    return bulk_parse_sequences(text.strip())
+
+def parse_file(file) -> Tuple[List[str], List[Tuple[int, str]]]:
+    """
+    Parse DNA sequences from a binary file object.
+    Supports .txt, .fasta, .fa and .fastq, .fq files, optionally gzipped.
+    
+    Invalid plain-text lines are returned with their line numbers; invalid
+    FASTA/FASTQ records are skipped.
+    
+    Args:
+        file: Binary file object with a name attribute
+        
+    Returns:
+        Tuple of (DNA sequences, (line number, content) of invalid lines)
+    """
+    sequences, invalid = [], []
+    
+    if detect_file_format(file.name) == 'text':
+        # Validate plain text in large chunks of whole lines
+        with open_text_stream(file) as text:
+            line_number = 1
+            for lines in iter(lambda: text.readlines(READ_CHUNK_SIZE), []):
+                chunk_sequences, chunk_invalid = bulk_parse_sequences(''.join(lines), line_number)
+                sequences.extend(chunk_sequences)
+                invalid.extend(chunk_invalid)
+                line_number += len(lines)
+    else:
+        for record in iter_sequence_records(file):
+            if validate_dna_sequence(record.sequence):
+                sequences.append(record.sequence.upper())
+    
+    return sequences, invalid
+
+# Dual-index (i7 + i5) input: pairs are shown and stored joined as 'I7+I5'
+INDEX_PAIR_JOINER = '+'
+INDEX_SEPARATOR_TABLE = str.maketrans({',': ' ', ';': ' ', '\t': ' ', '+': ' '})
+
+def parse_index_pair_line(line: str) -> Optional[Tuple[str, str]]:
+    """
+    Extract an (i7, i5) index pair from one sample-sheet style line.
+    
+    Accepts 'i7+i5' notation or two columns separated by commas, semicolons,
+    tabs or spaces, optionally preceded by a label ('S1: i7+i5', 'S1,i7,i5').
+    
+    Args:
+        line: Stripped, non-empty input line
+        
+    Returns:
+        Upper-case (i7, i5) tuple, or None if the line holds no valid pair
+    """
+    if ':' in line:
+        line = line.split(':', 1)[1]
+    tokens = line.translate(INDEX_SEPARATOR_TABLE).split()
+    if len(tokens) >= 2 and validate_dna_sequence(tokens[-2]) and validate_dna_sequence(tokens[-1]):
+        return tokens[-2].upper(), tokens[-1].upper()
+    return None
+
+def parse_index_pairs(lines: Iterable[str], first_line: int = 1) -> Tuple[List[str], List[Tuple[int, str]]]:
+    """
+    Parse index pairs, one per line.
+    
+    Args:
+        lines: Iterable of input lines
+        first_line: Line number of the first line
+        
+    Returns:
+        Tuple of (pairs joined as 'I7+I5', (line number, content) of invalid lines)
+    """
+    pairs, invalid = [], []
+    for line_number, line in enumerate(lines, first_line):
+        line = line.strip()
+        if not line:
+            continue
+        pair = parse_index_pair_line(line)
+        if pair is None:
+            invalid.append((line_number, line))
+        else:
+            pairs.append(INDEX_PAIR_JOINER.join(pair))
+    return pairs, invalid
+
+def parse_index_pairs_text(text: str) -> Tuple[List[str], List[Tuple[int, str]]]:
+    """Parse index pairs from pasted text (see parse_index_pairs)."""
+    return parse_index_pairs(text.strip().splitlines())
+
+def parse_index_pairs_file(file) -> Tuple[List[str], List[Tuple[int, str]]]:
+    """Parse index pairs from a binary text or CSV file object, optionally gzipped (see parse_index_pairs)."""
+    with open_text_stream(file) as text:
+        return parse_index_pairs(text)
+
+def split_index_pairs(pairs: List[str]) -> Tuple[List[str], List[str]]:
+    """Split 'I7+I5' strings into the list of i7 and the list of i5 indexes."""
+    i7, i5 = [], []
+    for pair in pairs:
+        first, second = pair.split(INDEX_PAIR_JOINER, 1)
+        i7.append(first)
+        i5.append(second)
+    return i7, i5
+
+def find_dual_index_collisions(i7: List[str], i5: List[str], threshold: int
+                               ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find all pairs of samples whose combined i7 + i5 Hamming distance is within the threshold.
+    
+    A combined distance of at most k needs each index within k, so the
+    pigeonhole search runs on one index only and the other index is
+    compared just for those candidates; samples whose first index is
+    already further apart are never looked at again. The index with more
+    distinct sequences prunes first, since combinatorial designs reuse
+    the same i7 or i5 across many samples.
+    
+    Args:
+        i7: i7 index of every sample (equal lengths)
+        i5: i5 index of every sample (equal lengths)
+        threshold: Maximum combined distance of a reported pair
+        
+    Returns:
+        Tuple of (rows, cols, combined distances, i7 distances, i5 distances), ordered by (i, j)
+    """
+    if len(i7) != len(i5):
+        raise ValueError(f"Every sample needs both indexes. Got {len(i7)} i7 and {len(i5)} i5")
+    if not i7:
+        empty = np.zeros(0, dtype=np.int64)
+        no_distances = np.zeros(0, dtype=np.uint8)
+        return empty, empty, no_distances, no_distances, no_distances
+    
+    swap = len(set(i5)) > len(set(i7))
+    first, second = (i5, i7) if swap else (i7, i5)
+    rows, cols, first_distances = find_collisions(first, threshold)
+    second_distances = pair_distances(prepare_kernel_input(second), rows, cols) if len(rows) else first_distances
+    
+    combined = first_distances.astype(np.int64) + second_distances
+    keep = combined <= threshold
+    rows, cols, combined = rows[keep], cols[keep], combined[keep].astype(distance_dtype(len(i7[0]) + len(i5[0])))
+    first_distances, second_distances = first_distances[keep], second_distances[keep]
+    if swap:
+        first_distances, second_distances = second_distances, first_distances
+    return rows, cols, combined, first_distances, second_distances
+
+def compute_tile_minima(sequences: List[str], tile_size: int) -> np.ndarray:
+    """
+    Calculate the minimum off-diagonal distance inside every tile of the matrix.
+    
+    Works block by block on the upper triangle, so memory stays bounded by
+    MAX_BLOCK_BYTES instead of growing with n squared.
+    
+    Args:
+        sequences: List of DNA sequences of equal length
+        tile_size: Number of sequences per tile along each axis
+        
+    Returns:
+        Symmetric (tiles x tiles) array of minimum distances
+    """
+    n = len(sequences)
+    length = len(sequences[0]) if sequences else 0
+    num_tiles = -(-n // tile_size)
+    no_pair = np.iinfo(distance_dtype(length)).max
+    minima = np.full((num_tiles, num_tiles), no_pair, dtype=distance_dtype(length))
+    if n < 2:
+        return minima
+    
+    data = prepare_kernel_input(sequences)
+    tiles_per_chunk = max(1, MAX_BLOCK_BYTES // (tile_size * tile_size * bytes_per_pair(data)))
+    
+    for row_tile in range(num_tiles):
+        row_start = row_tile * tile_size
+        row_stop = min(row_start + tile_size, n)
+        
+        for col_tile in range(row_tile, num_tiles, tiles_per_chunk):
+            col_start = col_tile * tile_size
+            col_stop = min(col_start + tiles_per_chunk * tile_size, n)
+            block = block_distances(data[row_start:row_stop], data[col_start:col_stop])
+            if col_tile == row_tile:
+                # Ignore each sequence's distance to itself
+                diagonal = np.arange(row_stop - row_start)
+                block[diagonal, diagonal] = no_pair
+            column_minima = block.min(axis=0)
+            tile_starts = np.arange(0, col_stop - col_start, tile_size)
+            last_tile = col_tile + len(tile_starts)
+            minima[row_tile, col_tile:last_tile] = np.minimum.reduceat(column_minima, tile_starts)
+    
+    return np.minimum(minima, minima.T)
+
+def iter_upper_blocks(data: np.ndarray, block_size: int) -> Iterator[Tuple[int, int, np.ndarray]]:
+    """
+    Yield row blocks of the upper triangle, each compared with itself and every later sequence.
+    
+    Args:
+        data: Output of prepare_kernel_input for all n sequences
+        block_size: Number of rows per block
+        
+    Yields:
+        Tuple of (start, stop, block) where block holds the distances of rows
+        [start, stop) to sequences start .. n-1, with the diagonal (each
+        sequence against itself) set to the dtype maximum
+    """
+    for start in range(0, len(data), block_size):
+        stop = min(start + block_size, len(data))
+        block_rows = np.arange(stop - start)
+        block = block_distances(data[start:stop], data[start:])
+        block[block_rows, block_rows] = np.iinfo(block.dtype).max
+        yield start, stop, block
+
+def find_nearest_neighbors(sequences: List[str], k: int = 1, block_size: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the k closest other sequences of every sequence with streaming row blocks.
+    
+    Each block of rows is compared against itself and every later sequence
+    (the upper triangle only) and immediately reduced: row minima update the
+    block's own rows, column minima update the later sequences. Only the
+    O(n * k) running results and one block bounded by MAX_BLOCK_BYTES are
+    held at a time.
+    
+    Args:
+        sequences: List of DNA sequences of equal length
+        k: Number of neighbours kept per sequence
+        block_size: Number of rows compared per block (derived from
+            MAX_BLOCK_BYTES when omitted)
+        
+    Returns:
+        Tuple of (distances, indices) arrays of shape (n, k), ordered by
+        distance and then index; missing neighbours (k >= n) hold the dtype
+        maximum and -1
+    """
+    return stream_distance_summary(sequences, k, block_size)[1:3]
+
+# Risk levels of a barcode by the distance to its closest neighbour, as coloured in the app
+RISK_LEVELS = np.array(['red', 'orange', 'blue'])
+
+def risk_level_codes(distances: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Risk level of every distance as an index into RISK_LEVELS.
+    
+    Red is below the collision threshold, orange at the threshold or one
+    above it, and blue further away.
+    
+    Args:
+        distances: Closest-neighbour distances
+        threshold: Collision threshold
+        
+    Returns:
+        int8 array of indices into RISK_LEVELS
+    """
+    return (distances >= threshold).astype(np.int8) + (distances > threshold + 1)
+
+def distance_histogram(values: np.ndarray, size: int) -> np.ndarray:
+    """
+    Count how often each distance 0 .. size - 1 occurs; larger values are ignored.
+    
+    Args:
+        values: Array of distances (any shape)
+        size: Number of histogram bins
+        
+    Returns:
+        int64 array of counts per distance
+    """
+    flat = values.ravel()
+    if flat.dtype == np.uint8 and len(flat) > 1:
+        # Count adjacent byte pairs as one uint16 (half as many elements to bin) and add up both bytes
+        even = len(flat) & ~1
+        pairs = np.bincount(flat[:even].view(np.uint16), minlength=1 << 16).reshape(256, 256)
+        counts = pairs.sum(axis=0) + pairs.sum(axis=1)
+        if even < len(flat):
+            counts[flat[-1]] += 1
+        return counts[:size].astype(np.int64)
+    return np.bincount(flat, minlength=size)[:size].astype(np.int64)
+
+def upper_block_pairs(start: int, block: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find the pairs within a threshold in one block from iter_upper_blocks, each pair once.
+    
+    Args:
+        start: First row of the block
+        block: Distances of rows start .. start + len(block) to sequences start .. n-1
+        threshold: Maximum distance of a reported pair
+        
+    Returns:
+        Tuple of (rows, cols, distances) arrays with rows < cols
+    """
+    rows, cols = np.nonzero(block <= threshold)
+    keep = cols > rows   # drop the lower half of the block's own square
+    rows, cols = rows[keep], cols[keep]
+    return rows + start, cols + start, block[rows, cols]
+
+def neighbor_key_dtype(block_dtype: np.dtype, n: int) -> np.dtype:
+    """
+    Smallest dtype for neighbour sort keys distance * n + index.
+    
+    The masked diagonal holds the maximum of the kernel's block dtype (65535
+    for the unpacked kernel, whatever the barcode length), and its keys must
+    still fit, or a sequence could rank as its own neighbour.
+    
+    Args:
+        block_dtype: Dtype of the distance blocks (see kernel_dtype)
+        n: Number of sequences
+        
+    Returns:
+        uint32 when every key fits, otherwise int64
+    """
+    if (int(np.iinfo(block_dtype).max) + 1) * n <= np.iinfo(np.uint32).max:
+        return np.dtype(np.uint32)
+    return np.dtype(np.int64)
+
+def stream_distance_summary(sequences: List[str], k: int = 1, block_size: int = None, tile_size: int = None,
+                            on_block: Callable[[int, int, np.ndarray], None] = None
+                            ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """
+    One streaming pass over the upper triangle: distance histogram, k nearest neighbours and tile minima.
+    
+    Args:
+        sequences: List of DNA sequences of equal length
+        k: Number of neighbours kept per sequence
+        block_size: Number of rows compared per block (derived from
+            MAX_BLOCK_BYTES when omitted)
+        tile_size: Sequences per heatmap tile; tile minima are skipped when omitted
+        on_block: Called as on_block(start, stop, block) after every block of
+            iter_upper_blocks, e.g. to report progress or collect pairs; an
+            exception raised here ends the pass
+        
+    Returns:
+        Tuple of (histogram, distances, indices, tile_minima): pair counts per
+        distance 0 .. L, the neighbours as returned by find_nearest_neighbors
+        and the tile minima as returned by compute_tile_minima (or None)
+    """
+    n = len(sequences)
+    length = len(sequences[0]) if sequences else 0
+    dtype = distance_dtype(length)
+    histogram = np.zeros(length + 1, dtype=np.int64)
+    distances = np.full((n, k), np.iinfo(dtype).max, dtype=dtype)
+    indices = np.full((n, k), -1, dtype=np.int64)
+    tile_minima = None
+    if tile_size:
+        num_tiles = -(-n // tile_size)
+        tile_minima = np.full((num_tiles, num_tiles), np.iinfo(dtype).max, dtype=dtype)
+        tile_starts = np.arange(0, n, tile_size)
+    found = min(k, max(n - 1, 0))
+    if n < 2:
+        return histogram, distances, indices, tile_minima
+    
+    data = prepare_kernel_input(sequences)
+    # Running neighbours as sort keys distance * n + index, so ties resolve to the lowest index
+    key_dtype = neighbor_key_dtype(kernel_dtype(data), n)
+    keys = np.full((n, found), np.iinfo(key_dtype).max, dtype=key_dtype)
+    if block_size is None:
+        # Top-k blocks are widened to sort keys
+        block_size = max(1, MAX_BLOCK_BYTES // (n * max(bytes_per_pair(data), key_dtype.itemsize if found > 1 else 1)))
+    
+    def merge(target: np.ndarray, candidates: np.ndarray) -> None:
+        merged = np.concatenate((target, candidates), axis=1)
+        target[...] = np.partition(merged, found - 1, axis=1)[:, :found]
+    
+    for start, stop, block in iter_upper_blocks(data, block_size):
+        width = stop - start
+        block_rows = np.arange(width)
+        later = block[:, width:]
+        # The block's own square holds every pair twice (and the masked diagonal, beyond any bin)
+        histogram += distance_histogram(block, length + 1)
+        histogram -= distance_histogram(block[:, :width][np.tril(np.ones((width, width), dtype=bool), k=-1)], length + 1)
+        
+        if tile_minima is not None:
+            first_tile = start // tile_size
+            col_bounds = np.concatenate(([0], tile_starts[first_tile + 1:] - start))
+            for row_tile in range(first_tile, (stop - 1) // tile_size + 1):
+                rows_lo = max(start, row_tile * tile_size) - start
+                rows_hi = min(stop, (row_tile + 1) * tile_size) - start
+                target = tile_minima[row_tile, first_tile:]
+                np.minimum(target, np.minimum.reduceat(block[rows_lo:rows_hi].min(axis=0), col_bounds), out=target)
+        
+        if found == 1:
+            # argmin returns the first (lowest index) minimum
+            nearest = block.argmin(axis=1)
+            row_keys = (block[block_rows, nearest].astype(np.int64) * n + start + nearest).astype(key_dtype)
+            np.minimum(keys[start:stop, 0], row_keys, out=keys[start:stop, 0])
+            if later.shape[1]:
+                # Later columns only hold neighbours of lower index, so only strictly closer rows can win
+                column_minima = later.min(axis=0)
+                closer = np.flatnonzero(column_minima < keys[stop:, 0] // n)
+                if len(closer):
+                    nearest = later[:, closer].argmin(axis=0)
+                    col_keys = column_minima[closer].astype(np.int64) * n + start + nearest
+                    keys[stop + closer, 0] = col_keys.astype(key_dtype)
+        elif found > 1:
+            row_keys = block.astype(key_dtype)
+            row_keys *= n
+            row_keys += np.arange(start, n, dtype=key_dtype)
+            if row_keys.shape[1] > found:
+                row_keys = np.partition(row_keys, found - 1, axis=1)[:, :found]
+            merge(keys[start:stop], row_keys)
+            if later.shape[1]:
+                col_keys = later.T.astype(key_dtype, order='C')
+                col_keys *= n
+                col_keys += np.arange(start, stop, dtype=key_dtype)
+                if col_keys.shape[1] > found:
+                    col_keys = np.partition(col_keys, found - 1, axis=1)[:, :found]
+                merge(keys[stop:], col_keys)
+        
+        if on_block is not None:
+            on_block(start, stop, block)
+    
+    keys.sort(axis=1)
+    distances[:, :found] = keys // n
+    indices[:, :found] = keys % n
+    if tile_minima is not None:
+        tile_minima = np.minimum(tile_minima, tile_minima.T)
+    return histogram, distances, indices, tile_minima
+
+@dataclass
+class DistanceSummary:
+    """
+    Threshold-independent summary of a sequence set, computed in one pass.
+    
+    `histogram[d]` counts the pairs at distance d; the nearest arrays hold
+    every sequence's minimum distance and its closest sequence. Counts for
+    any collision threshold are read from these without another kernel pass.
+    `tile_minima` is the aggregated heatmap, when a tile size was requested.
+    """
+    histogram: np.ndarray
+    nearest_distances: np.ndarray
+    nearest_indices: np.ndarray
+    tile_minima: Optional[np.ndarray] = None
+    
+    def pairs_within(self, threshold: int) -> int:
+        """Number of pairs with distance <= threshold."""
+        return int(self.histogram[:max(threshold + 1, 0)].sum())
+    
+    def sequences_within(self, threshold: int) -> int:
+        """Number of sequences with another sequence at distance <= threshold."""
+        return int((self.nearest_distances <= threshold).sum())
+    
+    def max_threshold(self, max_pairs: int) -> int:
+        """Largest threshold whose collision pairs number at most max_pairs (-1 if none)."""
+        return int(np.searchsorted(np.cumsum(self.histogram), max_pairs, side='right')) - 1
+
+def compute_distance_summary(sequences: List[str], tile_size: int = None, block_size: int = None,
+                             on_block: Callable[[int, int, np.ndarray], None] = None) -> DistanceSummary:
+    """
+    Calculate the distance histogram and every sequence's nearest neighbour in one pass.
+    
+    Args:
+        sequences: List of DNA sequences of equal length
+        tile_size: Sequences per heatmap tile; the same pass then also fills
+            the tile minima of compute_tile_minima
+        block_size: Number of rows compared per block (derived from
+            MAX_BLOCK_BYTES when omitted)
+        on_block: Per-block callback, see stream_distance_summary
+        
+    Returns:
+        DistanceSummary of the set
+    """
+    histogram, distances, indices, tile_minima = stream_distance_summary(sequences, 1, block_size, tile_size, on_block)
+    return DistanceSummary(histogram, distances[:, 0], indices[:, 0], tile_minima)
+
+def compute_cross_distance_summary(sequences1: List[str], sequences2: List[str], tile_size: int = None,
+                                   block_size: int = None) -> DistanceSummary:
+    """
+    Summarise the rectangular block of distances between two sets in one pass.
+    
+    Only the n1 x n2 pairs across the sets are compared, a block of first-set
+    rows at a time; pairs inside either set are never computed.
+    
+    Args:
+        sequences1: First list of DNA sequences (set A)
+        sequences2: Second list of DNA sequences (set B, same length)
+        tile_size: Sequences per heatmap tile along both axes; tile minima
+            are skipped when omitted
+        block_size: Number of first-set rows compared per block (derived from
+            MAX_BLOCK_BYTES when omitted)
+    
+    Returns:
+        DistanceSummary over the cross pairs: the nearest arrays hold the
+        n1 first-set sequences followed by the n2 second-set ones, each with
+        its minimum distance to and closest sequence (index) in the other set,
+        and tile_minima is a (row tiles x column tiles) array
+    """
+    n1, n2 = len(sequences1), len(sequences2)
+    length = len(sequences1[0]) if sequences1 else (len(sequences2[0]) if sequences2 else 0)
+    dtype = distance_dtype(length)
+    no_pair = np.iinfo(dtype).max
+    histogram = np.zeros(length + 1, dtype=np.int64)
+    nearest_distances = np.full(n1 + n2, no_pair, dtype=dtype)
+    nearest_indices = np.full(n1 + n2, -1, dtype=np.int64)
+    tile_minima = None
+    if tile_size:
+        tile_minima = np.full((-(-n1 // tile_size), -(-n2 // tile_size)), no_pair, dtype=dtype)
+        col_bounds = np.arange(0, n2, tile_size)
+    if n1 == 0 or n2 == 0:
+        return DistanceSummary(histogram, nearest_distances, nearest_indices, tile_minima)
+    if len(sequences2[0]) != length:
+        raise ValueError(f"Sequences must be of equal length. Got {length} and {len(sequences2[0])}")
+    
+    data1, data2 = prepare_kernel_input(sequences1), prepare_kernel_input(sequences2)
+    if block_size is None:
+        block_size = max(1, MAX_BLOCK_BYTES // (n2 * bytes_per_pair(data1)))
+    if tile_size:
+        # Whole row tiles per block, so every block updates complete rows of tile minima
+        block_size = max(1, block_size // tile_size) * tile_size
+    
+    first_nearest, second_nearest = nearest_distances[:n1], nearest_distances[n1:]
+    first_indices, second_indices = nearest_indices[:n1], nearest_indices[n1:]
+    for start in range(0, n1, block_size):
+        stop = min(start + block_size, n1)
+        block = block_distances(data1[start:stop], data2)
+        histogram += distance_histogram(block, length + 1)
+        
+        # argmin returns the first (lowest index) minimum; earlier blocks win ties for the columns
+        nearest = block.argmin(axis=1)
+        first_nearest[start:stop] = block[np.arange(stop - start), nearest]
+        first_indices[start:stop] = nearest
+        column_minima = block.min(axis=0)
+        closer = np.flatnonzero(column_minima < second_nearest)
+        if len(closer):
+            second_nearest[closer] = column_minima[closer]
+            second_indices[closer] = block[:, closer].argmin(axis=0) + start
+        
+        if tile_minima is not None:
+            row_minima = np.minimum.reduceat(block, np.arange(0, stop - start, tile_size), axis=0)
+            tile_minima[start // tile_size:-(-stop // tile_size)] = np.minimum.reduceat(row_minima, col_bounds, axis=1)
+    
+    return DistanceSummary(histogram, nearest_distances, nearest_indices, tile_minima)
+
+# Demultiplexing simulation: owner codes for reads that match no single barcode
+UNASSIGNED = -1
+AMBIGUOUS = -2
+DEMUX_BATCH_SIZE = 1_000_000
+DENSE_LOOKUP_MAX_LENGTH = 11   # 4**11 keys: a 16 MiB direct-address owner table
+IS_BASE_BYTE = np.zeros(256, dtype=bool)
+IS_BASE_BYTE[np.frombuffer(b'ACGTacgt', dtype=np.uint8)] = True
+
+@dataclass
+class DemuxTable:
+    """
+    Lookup table from every barcode variant within max_mismatches to its owner.
+    
+    Variants are packed 2-bit keys kept sorted, so a batch of reads is
+    resolved with one vectorised binary search instead of a per-read dict
+    lookup; short barcodes get a direct-address table over all 4**L keys
+    instead. A variant closest to several barcodes is owned by AMBIGUOUS.
+    """
+    barcodes: List[str]
+    max_mismatches: int
+    keys: np.ndarray
+    owners: np.ndarray
+    mismatches: np.ndarray
+    ambiguous_variants: np.ndarray
+    dense_owners: Optional[np.ndarray] = None
+    dense_mismatches: Optional[np.ndarray] = None
+    
+    @classmethod
+    def build(cls, barcodes: List[str], max_mismatches: int) -> 'DemuxTable':
+        """
+        Enumerate the 0/1-mismatch neighbourhood of every barcode.
+        
+        Args:
+            barcodes: Barcodes of equal length (at most 32 bases)
+            max_mismatches: Mismatch tolerance, 0 or 1
+            
+        Returns:
+            DemuxTable ready for assign
+        """
+        if max_mismatches not in (0, 1):
+            raise ValueError(f"Mismatch tolerance must be 0 or 1. Got {max_mismatches}")
+        packed = pack_sequences(barcodes)
+        n, length = len(barcodes), len(barcodes[0]) if barcodes else 0
+        
+        keys, owners, mismatches = [packed], [np.arange(n)], [np.zeros(n, dtype=np.uint8)]
+        if max_mismatches:
+            # XOR with 1, 2 or 3 at a position turns its base into each of the other three
+            shifts = np.arange(length, dtype=np.uint64) * np.uint64(2)
+            flips = (np.arange(1, 4, dtype=np.uint64)[:, np.newaxis] << shifts).ravel()
+            keys.append((packed[:, np.newaxis] ^ flips).ravel())
+            owners.append(np.repeat(np.arange(n), len(flips)))
+            mismatches.append(np.ones(n * len(flips), dtype=np.uint8))
+        keys, owners, mismatches = np.concatenate(keys), np.concatenate(owners), np.concatenate(mismatches)
+        
+        # Per key, only the closest owners count; more than one of them makes the key ambiguous
+        order = np.lexsort((mismatches, keys))
+        keys, owners, mismatches = keys[order], owners[order], mismatches[order]
+        first = np.concatenate(([True], keys[1:] != keys[:-1]))
+        best = np.repeat(mismatches[first], np.diff(np.append(np.flatnonzero(first), len(keys))))
+        closest = mismatches == best
+        group = np.cumsum(first) - 1
+        ties = np.bincount(group[closest], minlength=int(first.sum()))
+        
+        ambiguous = ties > 1
+        ambiguous_variants = np.bincount(owners[closest & ambiguous[group]], minlength=n)
+        unique_owners = np.where(ambiguous, AMBIGUOUS, owners[first])
+        table = cls(list(barcodes), max_mismatches, keys[first], unique_owners, mismatches[first], ambiguous_variants)
+        
+        if length <= DENSE_LOOKUP_MAX_LENGTH:
+            table.dense_owners = np.full(4 ** length, UNASSIGNED, dtype=np.int32)
+            table.dense_owners[table.keys] = table.owners
+            table.dense_mismatches = np.zeros(4 ** length, dtype=np.uint8)
+            table.dense_mismatches[table.keys] = table.mismatches
+        return table
+    
+    @property
+    def length(self) -> int:
+        return len(self.barcodes[0]) if self.barcodes else 0
+    
+    def assign(self, reads: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Assign a batch of index reads to barcodes.
+        
+        Args:
+            reads: (n x length) uint8 array of ASCII bases; anything other
+                than A/C/G/T (e.g. N) counts as a mismatch
+                
+        Returns:
+            Tuple of (owner index, UNASSIGNED or AMBIGUOUS per read; mismatches to the owner)
+        """
+        # Column by column is cheaper than a reduce over a (n x length) uint64 temporary
+        codes = BASE_CODES.astype(np.uint8)[reads]
+        packed = np.zeros(len(reads), dtype=np.uint64)
+        for position in range(self.length):
+            packed |= codes[:, position].astype(np.uint64) << np.uint64(2 * position)
+        clean = IS_BASE_BYTE[reads].all(axis=1)
+        
+        if self.dense_owners is not None:
+            owners = np.where(clean, self.dense_owners[packed], UNASSIGNED).astype(np.int64)
+            mismatches = np.where(clean, self.dense_mismatches[packed], 0).astype(np.uint8)
+        else:
+            slot = np.minimum(np.searchsorted(self.keys, packed), len(self.keys) - 1)
+            found = clean & (self.keys[slot] == packed)
+            owners = np.where(found, self.owners[slot], UNASSIGNED)
+            mismatches = np.where(found, self.mismatches[slot], 0).astype(np.uint8)
+        
+        # Reads with N bases are rare; compare them against every barcode directly
+        dirty = np.flatnonzero(~clean)
+        if len(dirty) and self.max_mismatches:
+            barcodes = encode_sequences(self.barcodes)
+            block = max(1, MAX_BLOCK_BYTES // max(1, len(self.barcodes) * self.length))
+            for start in range(0, len(dirty), block):
+                rows = dirty[start:start + block]
+                distances = block_distances(reads[rows], barcodes)
+                best = distances.min(axis=1)
+                hits = (distances == best[:, np.newaxis]).sum(axis=1)
+                within = best <= self.max_mismatches
+                owners[rows] = np.where(within, np.where(hits == 1, distances.argmin(axis=1), AMBIGUOUS), UNASSIGNED)
+                mismatches[rows] = np.where(within, best, 0)
+        
+        return owners, mismatches
+
+@dataclass
+class DemuxCounts:
+    """
+    Read assignment counts accumulated over batches.
+    
+    The per-origin arrays are only filled for synthetic reads, whose true
+    barcode is known.
+    """
+    reads: int
+    assigned: np.ndarray
+    exact: np.ndarray
+    ambiguous: int = 0
+    unassigned: int = 0
+    origin_reads: Optional[np.ndarray] = None
+    correct: Optional[np.ndarray] = None
+    misassigned: Optional[np.ndarray] = None
+    origin_ambiguous: Optional[np.ndarray] = None
+    origin_lost: Optional[np.ndarray] = None
+    
+    @classmethod
+    def empty(cls, num_barcodes: int, with_origins: bool) -> 'DemuxCounts':
+        zeros = lambda: np.zeros(num_barcodes, dtype=np.int64)
+        if not with_origins:
+            return cls(0, zeros(), zeros())
+        return cls(0, zeros(), zeros(), origin_reads=zeros(), correct=zeros(), misassigned=zeros(),
+                   origin_ambiguous=zeros(), origin_lost=zeros())
+    
+    def add(self, owners: np.ndarray, mismatches: np.ndarray, origins: Optional[np.ndarray] = None) -> None:
+        """Add one batch of assignments (and true origins for synthetic reads)."""
+        n = len(self.assigned)
+        matched = owners >= 0
+        self.reads += len(owners)
+        self.assigned += np.bincount(owners[matched], minlength=n)
+        self.exact += np.bincount(owners[matched & (mismatches == 0)], minlength=n)
+        self.ambiguous += int((owners == AMBIGUOUS).sum())
+        self.unassigned += int((owners == UNASSIGNED).sum())
+        
+        if origins is not None:
+            self.origin_reads += np.bincount(origins, minlength=n)
+            self.correct += np.bincount(origins[owners == origins], minlength=n)
+            self.misassigned += np.bincount(origins[matched & (owners != origins)], minlength=n)
+            self.origin_ambiguous += np.bincount(origins[owners == AMBIGUOUS], minlength=n)
+            self.origin_lost += np.bincount(origins[owners == UNASSIGNED], minlength=n)
+
+def iter_synthetic_index_reads(barcodes: List[str], num_reads: int, error_rate: float,
+                               seed: Optional[int] = None,
+                               batch_size: int = DEMUX_BATCH_SIZE) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Generate index reads from uniformly chosen barcodes with random substitutions.
+    
+    Args:
+        barcodes: Barcodes of equal length
+        num_reads: Total number of reads
+        error_rate: Per-base probability of a substitution
+        seed: Random seed
+        batch_size: Reads per batch
+        
+    Yields:
+        Tuples of ((n x length) ASCII reads, true barcode index per read)
+    """
+    rng = np.random.default_rng(seed)
+    codes = BASE_CODES[encode_sequences(barcodes)].astype(np.uint8)
+    for start in range(0, num_reads, batch_size):
+        count = min(batch_size, num_reads - start)
+        origins = rng.integers(0, len(barcodes), size=count)
+        reads = codes[origins]
+        errors = rng.random(reads.shape) < error_rate
+        reads[errors] = (reads[errors] + rng.integers(1, 4, size=int(errors.sum()), dtype=np.uint8)) % 4
+        yield DNA_BASES[reads], origins
+
+def iter_fastq_index_reads(file, length: int, batch_size: int = DEMUX_BATCH_SIZE) -> Iterator[np.ndarray]:
+    """
+    Stream the first `length` bases of every FASTQ read in batches.
+    
+    Reads shorter than `length` are padded with N (so they count as mismatches).
+    
+    Args:
+        file: Binary FASTQ file object with a name attribute, optionally gzipped
+        length: Barcode length
+        batch_size: Reads per batch
+        
+    Yields:
+        (n x length) uint8 arrays of ASCII bases
+    """
+    compressed = file.name.lower().endswith('.gz')
+    stream = gzip.GzipFile(fileobj=file, mode='rb') if compressed else file
+    
+    def to_array(records: List[bytes]) -> np.ndarray:
+        sequences = [line[:length] for line in records[1::4]]
+        reads = np.frombuffer(b''.join(sequences), dtype=np.uint8)
+        # Short reads leave line breaks in their slice; pad those with N instead
+        if len(reads) != len(sequences) * length or (reads < ord('A')).any():
+            padded = b''.join(sequence.rstrip().ljust(length, b'N') for sequence in sequences)
+            reads = np.frombuffer(padded, dtype=np.uint8)
+        return reads.reshape(len(sequences), length)
+    
+    # Records are four lines long; a chunk's incomplete last record waits for the next chunk
+    leftover = []
+    try:
+        for lines in iter(lambda: stream.readlines(READ_CHUNK_SIZE), []):
+            lines = leftover + lines
+            complete = len(lines) - len(lines) % 4
+            reads, leftover = to_array(lines[:complete]), lines[complete:]
+            for start in range(0, len(reads), batch_size):
+                yield reads[start:start + batch_size]
+        if len(leftover) >= 2:
+            yield to_array(leftover)
+    finally:
+        # Releases the decompressor; the caller's file object stays open
+        if compressed:
+            stream.close()
+
+class JobCancelled(Exception):
+    """Raised inside a BackgroundJob's function once the job has been cancelled."""
+
+class BackgroundJob:
+    """
+    Run a function on a daemon worker thread with progress, partial results and cancellation.
+    
+    The function is called as func(job, *args) and should call job.report()
+    regularly; after cancel(), the next report() raises JobCancelled and the
+    job ends early. NumPy kernels release the GIL, so the caller's thread
+    (e.g. a Streamlit script polling the job) stays responsive.
+    """
+    def __init__(self, func: Callable[..., object], *args):
+        self.progress = 0.0
+        self.stage = ""
+        self._partial: List[Tuple[np.ndarray, ...]] = []
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._result = None
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, args=(func, args), daemon=True)
+        self._thread.start()
+    
+    def _run(self, func: Callable[..., object], args: tuple) -> None:
+        try:
+            self._result = func(self, *args)
+        except JobCancelled:
+            pass
+        except BaseException as error:
+            self._error = error
+    
+    def report(self, progress: float, stage: str = None, partial: Tuple[np.ndarray, ...] = None) -> None:
+        """
+        Publish progress from inside the job, raising JobCancelled once cancelled.
+        
+        Args:
+            progress: Completed fraction (0 to 1)
+            stage: Description of the current step
+            partial: Arrays of partial results, concatenated by partial_results()
+        """
+        if self._cancel.is_set():
+            raise JobCancelled()
+        with self._lock:
+            self.progress = progress
+            if stage is not None:
+                self.stage = stage
+            if partial is not None:
+                self._partial.append(partial)
+    
+    def cancel(self) -> None:
+        """Ask the job to stop at its next report()."""
+        self._cancel.set()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+    
+    @property
+    def done(self) -> bool:
+        return not self._thread.is_alive()
+    
+    def wait(self, timeout: float = None) -> bool:
+        """Wait for the job to end; returns whether it has."""
+        self._thread.join(timeout)
+        return self.done
+    
+    def partial_results(self) -> Tuple[np.ndarray, ...]:
+        """Partial results reported so far, concatenated array by array (empty tuple if none)."""
+        with self._lock:
+            parts = list(self._partial)
+        return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+    
+    def result(self) -> object:
+        """Wait for and return the function's result, re-raising its error or JobCancelled."""
+        self.wait()
+        if self._error is not None:
+            raise self._error
+        if self.cancelled:
+            raise JobCancelled()
+        return self._result
+
+def content_key(content) -> str:
+    """
+    Hash raw input content (text or bytes) for use as a cache key.
+    
+    Args:
+        content: Text or bytes to hash
+        
+    Returns:
+        Hex digest of the content
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+def sequence_set_key(sequences: List[str]) -> str:
+    """
+    Hash a normalized sequence set, including its size and sequence length.
+    
+    Args:
+        sequences: List of validated, upper-case DNA sequences
+        
+    Returns:
+        Cache key identifying the sequence set
+    """
+    length = len(sequences[0]) if sequences else 0
+    return f"{len(sequences)}x{length}:{content_key(chr(10).join(sequences))}"
+
+@dataclass
+class StageRecord:
+    """Timing of one pipeline stage."""
+    name: str
+    seconds: float = 0.0
+    pairs: int = 0
+    peak_bytes: Optional[int] = None
+
+class PerformanceLog:
+    """
+    Collects wall time, pair counts and (optionally) allocation peaks per stage.
+    
+    Memory is measured with tracemalloc, which is only active inside stages
+    and only when track_memory is set, so the default cost is two
+    perf_counter calls per stage. Stages may be nested; each reports the
+    peak above its own starting point. A trace started elsewhere (e.g. by a
+    profiler) is read but never reset or stopped, so there a stage that stays
+    below the earlier peak reports only the memory it still holds at its end.
+    """
+    
+    def __init__(self, track_memory: bool = False):
+        self.track_memory = track_memory
+        self.records: List[StageRecord] = []
+        self.open_peaks: List[List[int]] = []   # [baseline, peak at entry, highest peak seen] per open stage
+        self.owns_trace = False
+    
+    def fold_peak(self, peak: int) -> None:
+        """Credit a traced peak to every open stage whose own starting peak it exceeds."""
+        for frame in self.open_peaks:
+            if peak > frame[1]:
+                frame[2] = max(frame[2], peak)
+    
+    @contextmanager
+    def stage(self, name: str, pairs: int = 0) -> Iterator[StageRecord]:
+        """
+        Time the enclosed block as one stage.
+        
+        Args:
+            name: Stage name
+            pairs: Number of sequence pairs processed (can also be set on the
+                yielded record once known)
+            
+        Yields:
+            The StageRecord being filled in
+        """
+        record = StageRecord(name, pairs=pairs)
+        started_tracing = False
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = self.owns_trace = True
+            current, peak = tracemalloc.get_traced_memory()
+            self.fold_peak(peak)
+            if self.owns_trace and hasattr(tracemalloc, 'reset_peak'):
+                # Open stages were credited above, so the peak can restart at this stage's baseline
+                tracemalloc.reset_peak()
+                peak = current
+            frame = [current, peak, current]
+            self.open_peaks.append(frame)
+        
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            if self.track_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                self.fold_peak(peak)
+                frame[2] = max(frame[2], current)
+                self.open_peaks.remove(frame)
+                record.peak_bytes = frame[2] - frame[0]
+                if started_tracing:
+                    tracemalloc.stop()
+                    self.owns_trace = False
+            self.records.append(record)
+    
+    def to_dict(self) -> dict:
+        """Stage records plus the total wall time, ready for JSON export."""
+        return {
+            'stages': [asdict(record) for record in self.records],
+            'total_seconds': sum(record.seconds for record in self.records)
+        }
+    
+    def log(self, logger: logging.Logger, level: int = logging.INFO) -> None:
+        """Emit one log line per stage."""
+        for record in self.records:
+            logger.log(level, "stage=%s seconds=%.6f pairs=%d peak_bytes=%s",
+                       record.name, record.seconds, record.pairs, record.peak_bytes)
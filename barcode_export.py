@@ -0,0 +1,231 @@
+"""
+Chunked report export for the barcode collision calculator.
+
+Collision pairs, closest-neighbour summaries and condensed distance
+matrices are written straight from the engine's index and distance
+arrays, a chunk of rows at a time, as CSV, Parquet or Arrow IPC files.
+In Parquet and Arrow, barcode labels and sequences are dictionary-encoded:
+a column stores each barcode's index into one shared dictionary, so even
+multi-million-row reports hold every label and sequence only once.
+
+Parquet and Arrow output need pyarrow, which is installed with Streamlit.
+
+Example:
+    rows, cols, distances = find_collisions(sequences, 2)
+    with open('collisions.parquet', 'wb') as out:
+        write_collision_report(out, 'parquet', sequences, rows, cols, distances)
+"""
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from barcode_core import DistanceMatrix
+
+# File extension and MIME type per export format
+EXPORT_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('.arrow', 'application/vnd.apache.arrow.file'),
+}
+EXPORT_CHUNK_ROWS = 1_000_000
+
+def iter_chunks(arrays: Tuple[np.ndarray, ...], chunk_rows: int = EXPORT_CHUNK_ROWS,
+                order: np.ndarray = None) -> Iterator[Tuple[np.ndarray, ...]]:
+    """
+    Slice aligned arrays into chunks of rows.
+
+    Args:
+        arrays: Arrays of equal length, one per report column
+        chunk_rows: Rows per chunk
+        order: Optional row order (e.g. worst collisions first); gathered chunk by chunk
+
+    Yields:
+        Tuple of array slices per chunk
+    """
+    total = len(order) if order is not None else len(arrays[0])
+    for start in range(0, total, chunk_rows):
+        if order is None:
+            yield tuple(values[start:start + chunk_rows] for values in arrays)
+        else:
+            chunk_order = order[start:start + chunk_rows]
+            yield tuple(values[chunk_order] for values in arrays)
+
+def write_report(out: BinaryIO, output_format: str, sequences: List[str], columns: List[str],
+                 chunks: Iterable[Tuple[np.ndarray, ...]], sequence_columns: List[str]) -> int:
+    """
+    Write a report chunk by chunk as CSV, Parquet or Arrow IPC.
+
+    Every column in sequence_columns holds sequence indices and is written
+    as two columns: the label ('Seq_1') and, suffixed '_dna', the sequence.
+    The other columns hold integer distances.
+
+    Args:
+        out: Binary stream to write to
+        output_format: 'csv', 'parquet' or 'arrow'
+        sequences: List of DNA sequences the indices refer to
+        columns: Column names, in the order of the arrays in each chunk
+        chunks: Tuples of aligned arrays, one per column
+        sequence_columns: Names of the columns holding sequence indices
+
+    Returns:
+        Number of rows written
+    """
+    if output_format == 'csv':
+        return write_csv_report(out, sequences, columns, chunks, sequence_columns)
+    if output_format in ('parquet', 'arrow'):
+        return write_arrow_report(out, output_format, sequences, columns, chunks, sequence_columns)
+    raise ValueError(f"Unknown export format: {output_format}")
+
+def write_csv_report(out: BinaryIO, sequences: List[str], columns: List[str],
+                     chunks: Iterable[Tuple[np.ndarray, ...]], sequence_columns: List[str]) -> int:
+    """CSV variant of write_report; each chunk is formatted and written as one block of lines."""
+    header = []
+    for name in columns:
+        header += [name, f'{name}_dna'] if name in sequence_columns else [name]
+    out.write((','.join(header) + '\n').encode('ascii'))
+
+    # One 'label,sequence' cell per barcode, shared by every row that refers to it
+    cells = [f'Seq_{i+1},{seq}' for i, seq in enumerate(sequences)]
+    count = 0
+    for chunk in chunks:
+        fields = [
+            [cells[i] for i in values.tolist()] if name in sequence_columns else list(map(str, values.tolist()))
+            for name, values in zip(columns, chunk)
+        ]
+        lines = list(map(','.join, zip(*fields)))
+        if lines:
+            out.write(('\n'.join(lines) + '\n').encode('ascii'))
+        count += len(lines)
+    return count
+
+def write_arrow_report(out: BinaryIO, output_format: str, sequences: List[str], columns: List[str],
+                       chunks: Iterable[Tuple[np.ndarray, ...]], sequence_columns: List[str]) -> int:
+    """Parquet and Arrow IPC variant of write_report; each chunk becomes one record batch."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError("Parquet and Arrow export need pyarrow (pip install pyarrow)") from error
+
+    # Sequence index columns become dictionary arrays over these two shared dictionaries;
+    # dictionary values must be unique, so duplicate barcodes share one sequence entry
+    labels = pa.array([f'Seq_{i+1}' for i in range(len(sequences))], pa.string())
+    unique_sequences, sequence_codes = np.unique(np.array(sequences, dtype=str), return_inverse=True)
+    dna = pa.array(unique_sequences.tolist(), pa.string())
+    sequence_codes = sequence_codes.astype(np.int32).ravel()
+    dictionary_type = pa.dictionary(pa.int32(), pa.string())
+    fields = []
+    for name in columns:
+        if name in sequence_columns:
+            fields += [pa.field(name, dictionary_type), pa.field(f'{name}_dna', dictionary_type)]
+        else:
+            fields.append(pa.field(name, pa.int16()))
+    schema = pa.schema(fields)
+
+    writer = pq.ParquetWriter(out, schema) if output_format == 'parquet' else pa.ipc.new_file(out, schema)
+    count = 0
+    with writer:
+        for chunk in chunks:
+            arrays = []
+            for name, values in zip(columns, chunk):
+                if name in sequence_columns:
+                    indices = values.astype(np.int32, copy=False)
+                    arrays += [pa.DictionaryArray.from_arrays(pa.array(indices), labels),
+                               pa.DictionaryArray.from_arrays(pa.array(sequence_codes[indices]), dna)]
+                else:
+                    arrays.append(pa.array(values.astype(np.int16, copy=False)))
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            count += len(chunk[0])
+    return count
+
+def write_collision_report(out: BinaryIO, output_format: str, sequences: List[str], rows: np.ndarray,
+                           cols: np.ndarray, distances: np.ndarray, component_distances: Dict[str, np.ndarray] = None,
+                           order: np.ndarray = None, chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    """
+    Write collision pairs, one row per pair.
+
+    Args:
+        out: Binary stream to write to
+        output_format: 'csv', 'parquet' or 'arrow'
+        sequences: List of DNA sequences
+        rows: First sequence index of every pair
+        cols: Second sequence index of every pair
+        distances: Distance of every pair
+        component_distances: Optional extra distance columns by name (e.g. 'i7_distance')
+        order: Optional row order, e.g. np.argsort(distances) for the closest pairs first
+        chunk_rows: Rows per written chunk
+
+    Returns:
+        Number of pairs written
+    """
+    components = component_distances or {}
+    columns = ['sequence_1', 'sequence_2', *components, 'distance']
+    arrays = (rows, cols, *components.values(), distances)
+    return write_report(out, output_format, sequences, columns, iter_chunks(arrays, chunk_rows, order),
+                        ['sequence_1', 'sequence_2'])
+
+def write_neighbor_report(out: BinaryIO, output_format: str, sequences: List[str], distances: np.ndarray,
+                          indices: np.ndarray, chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    """
+    Write every sequence's closest neighbours, one row per sequence.
+
+    Args:
+        out: Binary stream to write to
+        output_format: 'csv', 'parquet' or 'arrow'
+        sequences: List of DNA sequences
+        distances: (n x k) neighbour distances from find_nearest_neighbors
+        indices: (n x k) neighbour indices from find_nearest_neighbors
+        chunk_rows: Rows per written chunk
+
+    Returns:
+        Number of sequences written
+    """
+    found = min(distances.shape[1], len(sequences) - 1) if len(sequences) else 0
+    columns = ['sequence']
+    arrays = [np.arange(len(sequences))]
+    sequence_columns = ['sequence']
+    for rank in range(1, found + 1):
+        columns += [f'neighbor_{rank}', f'distance_{rank}']
+        arrays += [indices[:, rank - 1], distances[:, rank - 1]]
+        sequence_columns.append(f'neighbor_{rank}')
+    return write_report(out, output_format, sequences, columns, iter_chunks(tuple(arrays), chunk_rows),
+                        sequence_columns)
+
+def iter_condensed_chunks(matrix: DistanceMatrix, chunk_rows: int = EXPORT_CHUNK_ROWS
+                          ) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Read a condensed distance matrix in chunks of whole matrix rows.
+
+    Args:
+        matrix: Distance matrix (in memory or memory-mapped)
+        chunk_rows: Approximate number of pairs per chunk
+
+    Yields:
+        Tuple of (rows, cols, distances) for the pairs of each chunk
+    """
+    offsets = np.append(matrix.row_offsets(), matrix.num_pairs)
+    start = 0
+    while start < matrix.n - 1:
+        stop = max(start + 1, int(np.searchsorted(offsets, offsets[start] + chunk_rows, side='right')) - 1)
+        stop = min(stop, matrix.n)
+        rows, cols = matrix.pair_indices(np.arange(offsets[start], offsets[stop]))
+        yield rows, cols, np.asarray(matrix.condensed[offsets[start]:offsets[stop]])
+        start = stop
+
+def write_distance_matrix_report(out: BinaryIO, output_format: str, sequences: List[str], matrix: DistanceMatrix,
+                                 chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    """
+    Write a condensed distance matrix, one row per pair (i < j) in condensed order.
+
+    Args:
+        out: Binary stream to write to
+        output_format: 'csv', 'parquet' or 'arrow'
+        sequences: List of DNA sequences
+        matrix: Distance matrix of the sequences
+        chunk_rows: Approximate number of pairs per written chunk
+
+    Returns:
+        Number of pairs written
+    """
+    return write_report(out, output_format, sequences, ['sequence_1', 'sequence_2', 'distance'],
+                        iter_condensed_chunks(matrix, chunk_rows), ['sequence_1', 'sequence_2'])
@@ -0,0 +1,257 @@
+"""
+Benchmark harness for the barcode collision calculator.
+
+Times each stage on synthetic barcode sets over a grid of set sizes (n) and
+barcode lengths (L), records throughput and peak traced memory, and saves
+the results as JSON so runs can be compared across engines and releases.
+
+Example:
+    python benchmark.py --sizes 100 1000 10000 --lengths 8 16 -o bench.json
+    python benchmark.py --compare bench.json -o bench_new.json
+"""
+import argparse
+import gc
+import io
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import numpy as np
+
+import barcode_core
+from barcode_core import (
+    MAX_PACKED_LENGTH,
+    DemuxTable,
+    calculate_hamming_distance,
+    compute_cross_distance_summary,
+    compute_distance_matrix,
+    compute_distance_summary,
+    find_collisions,
+    find_nearest_neighbors,
+    iter_synthetic_index_reads,
+    parse_file,
+    parse_text,
+)
+
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_LENGTHS = [6, 8, 12, 16, 24, 32]
+HAMMING_SAMPLE_PAIRS = 100_000
+
+def generate_barcodes(n: int, length: int, seed: int = 0) -> List[str]:
+    """
+    Generate uniformly random barcodes.
+
+    Args:
+        n: Number of barcodes
+        length: Bases per barcode
+        seed: Random seed
+
+    Returns:
+        List of DNA sequences
+    """
+    rng = np.random.default_rng(seed)
+    bases = np.frombuffer(b'ACGT', dtype=np.uint8)[rng.integers(0, 4, size=(n, length))]
+    joined = bases.tobytes().decode('ascii')
+    return [joined[i * length:(i + 1) * length] for i in range(n)]
+
+def expected_collision_pairs(n: int, length: int, threshold: int) -> float:
+    """Expected number of random pairs within the threshold (binomial mismatch model)."""
+    p = sum(math.comb(length, k) * 0.75 ** k * 0.25 ** (length - k) for k in range(min(threshold, length) + 1))
+    return n * (n - 1) / 2 * p
+
+def measure(func: Callable[[], object], track_memory: bool) -> Dict[str, float]:
+    """
+    Time one call of func and, optionally, its peak traced allocation in a second call.
+
+    Args:
+        func: Zero-argument callable running the stage
+        track_memory: Whether to measure peak memory with tracemalloc
+
+    Returns:
+        Dict with 'seconds' and 'peak_bytes' (None when not tracked)
+    """
+    gc.collect()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+
+    peak_bytes = None
+    if track_memory:
+        gc.collect()
+        tracemalloc.start()
+        func()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {'seconds': seconds, 'peak_bytes': peak_bytes}
+
+class NamedBytesIO(io.BytesIO):
+    """In-memory upload with a file name, like Streamlit's UploadedFile."""
+    def __init__(self, content: bytes, name: str):
+        super().__init__(content)
+        self.name = name
+
+def benchmark_case(n: int, length: int, args: argparse.Namespace) -> List[Dict[str, object]]:
+    """
+    Run every stage for one (n, L) point of the grid.
+
+    Args:
+        n: Number of barcodes
+        length: Bases per barcode
+        args: Parsed command-line options
+
+    Returns:
+        One result record per stage
+    """
+    sequences = generate_barcodes(n, length, args.seed)
+    text = '\n'.join(f"Seq{i+1}: {seq}" for i, seq in enumerate(sequences))
+    content = text.encode('ascii')
+    pairs = n * (n - 1) // 2
+    results = []
+
+    def record(stage: str, items: int, func: Callable[[], object], skip_reason: str = None):
+        entry = {'stage': stage, 'n': n, 'length': length, 'items': items}
+        if skip_reason:
+            entry['skipped'] = skip_reason
+        else:
+            entry.update(measure(func, not args.no_memory))
+            entry['throughput'] = items / entry['seconds'] if entry['seconds'] > 0 else None
+        results.append(entry)
+        print(json.dumps(entry), file=sys.stderr)
+
+    record('parse_text', n, lambda: parse_text(text))
+    record('parse_file', n, lambda: parse_file(NamedBytesIO(content, 'barcodes.txt')))
+
+    sample = min(HAMMING_SAMPLE_PAIRS, pairs)
+    rng = np.random.default_rng(args.seed + 1)
+    left = rng.integers(0, n, size=sample).tolist()
+    right = rng.integers(0, n, size=sample).tolist()
+    record('calculate_hamming_distance', sample,
+           lambda: [calculate_hamming_distance(sequences[i], sequences[j]) for i, j in zip(left, right)])
+
+    expected = expected_collision_pairs(n, length, args.threshold)
+    record('find_collisions', pairs, lambda: find_collisions(sequences, args.threshold),
+           f"~{expected:.3g} expected collision pairs" if expected > args.max_collisions else None)
+
+    # Demultiplexing throughput: the lookup table is built outside the timed call
+    table_size = n * (3 * length + 1)
+    if length <= MAX_PACKED_LENGTH and table_size <= args.max_pairs:
+        table = DemuxTable.build(sequences, 1)
+        reads, _ = next(iter_synthetic_index_reads(sequences, args.demux_reads, 0.01, seed=args.seed,
+                                                   batch_size=args.demux_reads))
+        record('demultiplex', args.demux_reads, lambda: table.assign(reads))
+    else:
+        record('demultiplex', args.demux_reads, None,
+               f"barcodes over {MAX_PACKED_LENGTH} bases" if length > MAX_PACKED_LENGTH
+               else f"{table_size} lookup keys exceed --max-pairs")
+
+    record('compute_distance_summary', pairs, lambda: compute_distance_summary(sequences),
+           f"{pairs} pairs exceed --max-pairs" if pairs > args.max_pairs else None)
+    # Cross-set comparison of the first half against the second: only the rectangular block
+    half = n // 2
+    cross_pairs = half * (n - half)
+    record('compute_cross_distance_summary', cross_pairs,
+           lambda: compute_cross_distance_summary(sequences[:half], sequences[half:]),
+           f"{cross_pairs} pairs exceed --max-pairs" if cross_pairs > args.max_pairs else None)
+    record('find_nearest_neighbors', pairs, lambda: find_nearest_neighbors(sequences),
+           f"{pairs} pairs exceed --max-pairs" if pairs > args.max_pairs else None)
+
+    record('compute_distance_matrix', pairs, lambda: compute_distance_matrix(sequences, workers=args.workers),
+           f"{pairs} pairs exceed --max-pairs" if pairs > args.max_pairs else None)
+
+    if not args.no_render:
+        # Imported lazily (and outside the timed call): the app module configures Streamlit on import
+        from dna_hamming_calculator import create_distance_matrix_plot
+        record('create_distance_matrix_plot', pairs, lambda: create_distance_matrix_plot(sequences).to_json(),
+               f"{pairs} pairs exceed --max-pairs" if pairs > args.max_pairs else None)
+
+    return results
+
+def compare_results(current: List[Dict[str, object]], baseline: List[Dict[str, object]],
+                    tolerance: float) -> List[str]:
+    """
+    Find stages that got slower than the baseline by more than the tolerance.
+
+    Args:
+        current: Result records of this run
+        baseline: Result records of a previous run
+        tolerance: Allowed relative slowdown (0.2 = 20%)
+
+    Returns:
+        Human-readable regression messages
+    """
+    previous = {(r['stage'], r['n'], r['length']): r for r in baseline if 'seconds' in r}
+    regressions = []
+    for result in current:
+        old = previous.get((result['stage'], result['n'], result['length']))
+        if old is None or 'seconds' not in result:
+            continue
+        ratio = result['seconds'] / max(old['seconds'], 1e-9)
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{result['stage']} n={result['n']} L={result['length']}: "
+                f"{old['seconds']:.4f}s -> {result['seconds']:.4f}s ({ratio:.2f}x)"
+            )
+    return regressions
+
+def main(argv: List[str] = None) -> int:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark parsing, distance, collision and rendering stages.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Barcode set sizes (n)")
+    parser.add_argument('--lengths', type=int, nargs='+', default=DEFAULT_LENGTHS, help="Barcode lengths (L)")
+    parser.add_argument('--threshold', type=int, default=2, help="Collision threshold (default: 2)")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes for the distance matrix")
+    parser.add_argument('--max-pairs', type=int, default=50_000_000,
+                        help="Skip full-matrix stages above this many pairs")
+    parser.add_argument('--max-collisions', type=float, default=50_000_000,
+                        help="Skip collision search when more pairs than this are expected to collide")
+    parser.add_argument('--demux-reads', type=int, default=1_000_000,
+                        help="Synthetic index reads per demultiplexing run")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed for synthetic barcodes")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the traced peak-memory runs")
+    parser.add_argument('--no-render', action='store_true', help="Skip the Plotly heatmap stage")
+    parser.add_argument('--compare', help="Baseline JSON to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown against the baseline")
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help="Output JSON file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for length in args.lengths:
+        for n in args.sizes:
+            results.extend(benchmark_case(n, length, args))
+
+    report = {
+        'metadata': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'max_block_bytes': barcode_core.MAX_BLOCK_BYTES,
+            'threshold': args.threshold,
+            'workers': args.workers,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as out:
+        json.dump(report, out, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare_results(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,8 +5,62 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import io
-from typing import List, Tuple, Dict
-import re
+from typing import Callable, List, Tuple, Dict, Optional
+import json
+import logging
+import os
+import time
+
+from barcode_core import (
+    DEFAULT_WORKERS,
+    DISTANCE_STORE_DIR,
+    MAX_EDIT_LENGTH,
+    MAX_PACKED_LENGTH,
+    BackgroundJob,
+    CollisionIndex,
+    DemuxCounts,
+    DemuxTable,
+    DistanceMatrix,
+    DistanceSummary,
+    PerformanceLog,
+    block_distances,
+    calculate_hamming_distance,
+    compute_distance_matrix,
+    compute_cross_distance_summary,
+    compute_distance_summary,
+    compute_edit_distance_matrix,
+    compute_tile_minima,
+    content_key,
+    edit_pair_distances,
+    encode_variable_sequences,
+    find_collisions,
+    find_cross_collisions,
+    find_dual_index_collisions,
+    find_edit_collisions,
+    find_nearest_neighbors,
+    generate_distant_barcodes,
+    iter_fastq_index_reads,
+    iter_synthetic_index_reads,
+    select_collision_free,
+    parse_file,
+    parse_index_pairs_file,
+    parse_index_pairs_text,
+    parse_text,
+    prepare_kernel_input,
+    risk_level_codes,
+    sequence_set_key,
+    split_index_pairs,
+    store_distance_matrix,
+    tile_minima_from_pairs,
+    upper_block_pairs,
+    validate_dna_sequence,
+)
+from barcode_export import (
+    EXPORT_FORMATS,
+    write_collision_report,
+    write_distance_matrix_report,
+    write_neighbor_report,
+)
 
 # Configure page
 st.set_page_config(
@@ -433,77 +487,33 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def calculate_hamming_distance(seq1: str, seq2: str) -> int:
-    """
-    Calculate the Hamming distance between two DNA sequences.
-    
-    Args:
-        seq1: First DNA sequence
-        seq2: Second DNA sequence
-        
-    Returns:
-        Hamming distance (number of positions where sequences differ)
-    """
-    if len(seq1) != len(seq2):
-        raise ValueError(f"Sequences must be of equal length. Got {len(seq1)} and {len(seq2)}")
-    
-    return sum(c1 != c2 for c1, c2 in zip(seq1.upper(), seq2.upper()))
-
-def validate_dna_sequence(sequence: str) -> bool:
-    """
-    Validate if a string is a valid DNA sequence (contains only A, T, G, C).
-    
-    Args:
-        sequence: String to validate
-        
-    Returns:
-        True if valid, False otherwise
-    """
-    return bool(re.match(r'^[ATGC]+$', sequence.upper().strip()))
-
-def parse_sequences_from_text(text: str) -> List[str]:
+def parse_sequences_from_text(text: str, dual_index: bool = False) -> List[str]:
     """
     Parse DNA sequences from text input.
     Expects each sequence on a new line.
     
     Args:
         text: Input text containing sequences
+        dual_index: Parse i7 + i5 index pairs (returned joined as 'I7+I5')
         
     Returns:
         List of cleaned DNA sequences
     """
-    sequences = []
-    lines = text.strip().split('\n')
+    sequences, invalid = parse_index_pairs_text(text) if dual_index else parse_text(text)
     
-    for i, line in enumerate(lines, 1):
-        line = line.strip()
-        if not line:
-            continue
-            
-        # Remove any labels/identifiers (anything before a colon or space)
-        if ':' in line:
-            line = line.split(':', 1)[1].strip()
-        elif ' ' in line and not validate_dna_sequence(line):
-            parts = line.split()
-            # Take the longest part that looks like a DNA sequence
-            valid_parts = [part for part in parts if validate_dna_sequence(part)]
-            if valid_parts:
-                line = max(valid_parts, key=len)
-        
-        if validate_dna_sequence(line):
-            sequences.append(line.upper())
-        else:
-            st.error(f"Invalid DNA sequence at line {i}: {line[:50]}...")
+    for line_number, content in invalid:
+        st.error(f"Invalid DNA sequence at line {line_number}: {content[:50]}...")
             
     return sequences
 
-def parse_sequences_from_file(file) -> List[str]:
+def parse_sequences_from_file(file, dual_index: bool = False) -> List[str]:
     """
     Parse DNA sequences from uploaded file.
-    Supports .txt, .fasta, .fa files.
+    Supports .txt, .fasta, .fa and .fastq, .fq files, optionally gzipped.
     
     Args:
         file: Uploaded file object
+        dual_index: Parse i7 + i5 index pairs from a text or CSV sample sheet
         
     Returns:
         List of DNA sequences
@@ -511,90 +521,117 @@ def parse_sequences_from_file(file) -> List[str]:
     sequences = []
     
     try:
-        # Read file content
-        content = file.read().decode('utf-8')
-        
-        # Handle FASTA format
-        if file.name.endswith(('.fasta', '.fa')):
-            lines = content.strip().split('\n')
-            current_seq = ""
-            
-            for line in lines:
-                line = line.strip()
-                if line.startswith('>'):
-                    if current_seq:
-                        if validate_dna_sequence(current_seq):
-                            sequences.append(current_seq.upper())
-                        current_seq = ""
-                else:
-                    current_seq += line
-            
-            # Add the last sequence
-            if current_seq and validate_dna_sequence(current_seq):
-                sequences.append(current_seq.upper())
-        
-        # Handle plain text format
-        else:
-            sequences = parse_sequences_from_text(content)
+        sequences, invalid = parse_index_pairs_file(file) if dual_index else parse_file(file)
+        for line_number, content in invalid:
+            st.error(f"Invalid DNA sequence at line {line_number}: {content[:50]}...")
             
     except Exception as e:
         st.error(f"Error reading file: {str(e)}")
         
     return sequences
 
-def get_color_for_distance(distance: int) -> str:
+# Pairs at or below this distance are reported as collisions (default of the sidebar slider)
+COLLISION_THRESHOLD = 2
+# Largest number of collision pairs the threshold slider can reach
+MAX_COLLISION_PAIRS = 1_000_000
+# Collision pairs are fetched beyond the slider value while the histogram shows at most this many
+PREFETCH_COLLISION_PAIRS = 100_000
+
+def slider_max_threshold(summary: DistanceSummary) -> int:
+    """Largest threshold offered by the slider: at least the default, at most MAX_COLLISION_PAIRS pairs."""
+    return max(COLLISION_THRESHOLD, summary.max_threshold(MAX_COLLISION_PAIRS))
+
+def collision_fetch_threshold(summary: DistanceSummary, threshold: int) -> int:
+    """
+    Threshold to search collision pairs at for the slider value.
+    
+    The search reaches past the slider value up to the largest threshold
+    with at most PREFETCH_COLLISION_PAIRS pairs, so moving the slider within
+    that range reuses one cached search; beyond it, pairs are searched at
+    the slider value itself, keeping the pigeonhole pruning tight.
+    
+    Args:
+        summary: DistanceSummary of the input
+        threshold: Current slider value
+        
+    Returns:
+        Threshold of the collision search (at least threshold)
+    """
+    return max(threshold, min(summary.max_threshold(PREFETCH_COLLISION_PAIRS), slider_max_threshold(summary)))
+
+def get_color_for_distance(distance: int, threshold: int = COLLISION_THRESHOLD) -> str:
     """
     Get color based on Hamming distance thresholds with HAYA precision medicine palette.
     
     Args:
         distance: Hamming distance value
+        threshold: Collision threshold; red below it, orange up to threshold + 1
         
     Returns:
         Color string for the distance
     """
-    if distance < 2:
+    if distance < threshold:
         return '#ff4444'  # Red - very similar sequences (critical)
-    elif 2 <= distance <= 3:
+    elif threshold <= distance <= threshold + 1:
         return '#ffa500'  # Orange - moderately similar sequences
     else:
         return '#4a90e2'  # Blue - different sequences (safe)
 
-def create_distance_matrix_plot(sequences: List[str], labels: List[str] = None) -> go.Figure:
+def risk_levels(distances: np.ndarray, threshold: int = COLLISION_THRESHOLD) -> np.ndarray:
+    """Risk label per distance, using the same cut-offs as get_color_for_distance."""
+    return np.array(["🔴 Red", "🟠 Orange", "🔵 Blue"])[risk_level_codes(distances, threshold)]
+
+def render_color_legend(threshold: int) -> str:
+    """HTML info box explaining the colour scale for a collision threshold."""
+    return f"""
+    <div class="info-box">
+        <strong>Barcode Analysis Platform:</strong><br>
+        <br>
+        Calculate that computes the hamming distance between DNA sequences:
+        <ul>
+            <li><span style="color: #ff4444; font-weight: 600;">🔴 Red:</span> Distance < {threshold} (nearly identical sequences - barcode conflicts - BAD)</li>
+            <li><span style="color: #ffa500; font-weight: 600;">🟠 Orange:</span> Distance {threshold}-{threshold + 1} (similar sequences with potential issues - PROCEED WITH CARE)</li>
+            <li><span style="color: #4a90e2; font-weight: 600;">🔵 Blue:</span> Distance ≥ {threshold + 2} (sufficiently different sequences - safe barcodes - GOOD)</li>
+        </ul>
+    </div>
+    """
+
+# Heatmap rendering strategy by number of sequences
+HEATMAP_TEXT_MAX = 30        # per-cell distance labels up to this size
+HEATMAP_DETAIL_MAX = 400     # full-resolution matrix up to this size
+HEATMAP_MAX_TILES = 200      # tiles per axis in the aggregated view
+
+def create_heatmap_figure(z: np.ndarray, x_labels: List[str], y_labels: List[str],
+                          title: str = "Sequence Distance Matrix",
+                          colorbar_title: str = "Hamming Distance",
+                          show_text: bool = True) -> go.Figure:
     """
-    Create an interactive heatmap of Hamming distances.
+    Create a styled heatmap figure from a distance array.
     
     Args:
-        sequences: List of DNA sequences
-        labels: Optional labels for sequences
+        z: 2-D array of distances
+        x_labels: Column labels
+        y_labels: Row labels
+        title: Figure title
+        colorbar_title: Title of the colour bar
+        show_text: Whether to print the distance in every cell
         
     Returns:
         Plotly figure object
     """
-    n = len(sequences)
-    
-    if labels is None:
-        labels = [f"Seq_{i+1}" for i in range(n)]
-    
-    # Calculate distance matrix
-    distance_matrix = np.zeros((n, n))
-    colors = []
-    
-    for i in range(n):
-        color_row = []
-        for j in range(n):
-            if i == j:
-                distance = 0
-            else:
-                distance = calculate_hamming_distance(sequences[i], sequences[j])
-            distance_matrix[i][j] = distance
-            color_row.append(get_color_for_distance(distance))
-        colors.append(color_row)
+    text_options = {}
+    if show_text:
+        text_options = dict(
+            text=z.astype(int),
+            texttemplate="%{text}",
+            textfont={"size": 14, "color": "white", "family": "Inter"}
+        )
     
     # Create HAYA-inspired precision medicine heatmap with distinct colors
     fig = go.Figure(data=go.Heatmap(
-        z=distance_matrix,
-        x=labels,
-        y=labels,
+        z=z,
+        x=x_labels,
+        y=y_labels,
         colorscale=[
             [0, '#ffffff'],      # White for distance 0 (identical sequences)
             [0.15, '#ff4444'],   # Red for low distances (critical)
@@ -605,7 +642,7 @@ def create_distance_matrix_plot(sequences: List[str], labels: List[str] = None)
         showscale=True,
         colorbar=dict(
             title=dict(
-                text="Hamming Distance",
+                text=colorbar_title,
                 side="right",
                 font=dict(size=14, color="#ffffff", family="Inter")
             ),
@@ -615,15 +652,13 @@ def create_distance_matrix_plot(sequences: List[str], labels: List[str] = None)
             borderwidth=1,
             bgcolor="rgba(255,255,255,0.05)"
         ),
-        text=distance_matrix.astype(int),
-        texttemplate="%{text}",
-        textfont={"size": 14, "color": "white", "family": "Inter"},
+        **text_options,
         hovertemplate="<b style='color:#ffffff'>%{y}</b> vs <b style='color:#ffffff'>%{x}</b><br><b>Distance: %{z}</b><extra></extra>"
     ))
     
     fig.update_layout(
         title={
-            'text': "Sequence Distance Matrix",
+            'text': title,
             'x': 0.5,
             'xanchor': 'center',
             'font': {'size': 24, 'color': '#ffffff', 'family': 'Inter'}
@@ -658,25 +693,896 @@ def create_distance_matrix_plot(sequences: List[str], labels: List[str] = None)
     
     return fig
 
+# Distance metrics offered in the sidebar, with their axis labels
+METRIC_LABELS = {
+    'hamming': "Hamming Distance",
+    'edit': "Edit Distance"
+}
+
+def heatmap_tile_size(n: int) -> int:
+    """Number of sequences per tile so the aggregated view has at most HEATMAP_MAX_TILES tiles per axis."""
+    return max(1, -(-n // HEATMAP_MAX_TILES))
+
+def create_tile_minimum_plot(minima: np.ndarray, tile_size: int, n: int, metric: str = 'hamming',
+                             capped_at: int = None) -> go.Figure:
+    """
+    Create a block-aggregated heatmap showing the minimum distance per tile.
+    
+    Args:
+        minima: Output of compute_tile_minima or tile_minima_from_pairs
+        tile_size: Number of sequences per tile
+        n: Total number of sequences
+        metric: 'hamming' or 'edit'
+        capped_at: Largest exact value when minima were capped (noted in the title)
+        
+    Returns:
+        Plotly figure object
+    """
+    tile_labels = [
+        f"Seq_{start + 1}-{min(start + tile_size, n)}"
+        for start in range(0, n, tile_size)
+    ]
+    # Tiles without any pair (a trailing single-sequence tile) stay blank
+    z = minima.astype(float)
+    z[minima == np.iinfo(minima.dtype).max] = np.nan
+    title = f"Minimum Distance per Block ({tile_size} x {tile_size} sequences)"
+    if capped_at is not None:
+        title += f"<br><sup>distances above {capped_at} shown as {capped_at + 1}</sup>"
+    return create_heatmap_figure(
+        z, tile_labels, tile_labels,
+        title=title,
+        colorbar_title="Min " + METRIC_LABELS[metric],
+        show_text=False
+    )
+
+def create_distance_block_plot(sequences: List[str], row_range: Tuple[int, int],
+                               col_range: Tuple[int, int], metric: str = 'hamming',
+                               distances: DistanceMatrix = None) -> go.Figure:
+    """
+    Create a full-resolution heatmap of one sub-block of the distance matrix.
+    
+    Args:
+        sequences: List of DNA sequences
+        row_range: (start, stop) sequence indices of the rows
+        col_range: (start, stop) sequence indices of the columns
+        metric: 'hamming' or 'edit'
+        distances: Precomputed (e.g. on-disk) distances to read the block from
+        
+    Returns:
+        Plotly figure object
+    """
+    if distances is not None:
+        block = distances.block(row_range, col_range)
+    elif metric == 'edit':
+        rows, cols = np.meshgrid(np.arange(*row_range), np.arange(*col_range), indexing='ij')
+        block = edit_pair_distances(encode_variable_sequences(sequences), rows.ravel(), cols.ravel()).reshape(rows.shape)
+    else:
+        data = prepare_kernel_input(sequences)
+        block = block_distances(data[row_range[0]:row_range[1]], data[col_range[0]:col_range[1]])
+    return create_heatmap_figure(
+        block,
+        [f"Seq_{i+1}" for i in range(*col_range)],
+        [f"Seq_{i+1}" for i in range(*row_range)],
+        title="Sequence Distance Matrix (detail)",
+        colorbar_title=METRIC_LABELS[metric],
+        show_text=max(block.shape) <= HEATMAP_TEXT_MAX
+    )
+
+def create_distance_matrix_plot(sequences: List[str], labels: List[str] = None,
+                                distances: DistanceMatrix = None, metric: str = 'hamming') -> go.Figure:
+    """
+    Create an interactive heatmap of Hamming or edit distances.
+    
+    Small sets get per-cell labels, medium sets a plain full-resolution
+    matrix and large sets a block-aggregated minimum-distance view. Large
+    sets without precomputed distances are tiled by Hamming distance; the
+    app draws capped edit-distance tiles from its collision pairs instead.
+    
+    Args:
+        sequences: List of DNA sequences
+        labels: Optional labels for sequences
+        distances: Precomputed distances (computed from sequences when omitted)
+        metric: 'hamming' or 'edit'
+        
+    Returns:
+        Plotly figure object
+    """
+    n = len(sequences)
+    
+    if n > HEATMAP_DETAIL_MAX:
+        tile_size = heatmap_tile_size(n)
+        if distances is not None:
+            return create_tile_minimum_plot(distances.tile_minima(tile_size), tile_size, n, metric)
+        return create_tile_minimum_plot(compute_tile_minima(sequences, tile_size), tile_size, n)
+    
+    if labels is None:
+        labels = [f"Seq_{i+1}" for i in range(n)]
+    
+    # Expand the shared condensed distances for display
+    if distances is None:
+        distances = compute_edit_distance_matrix(sequences) if metric == 'edit' else compute_distance_matrix(sequences)
+    
+    return create_heatmap_figure(distances.to_square(), labels, labels, colorbar_title=METRIC_LABELS[metric],
+                                 show_text=n <= HEATMAP_TEXT_MAX)
+
+def create_cross_distance_plot(sequences1: List[str], sequences2: List[str], tile_minima: np.ndarray = None,
+                               tile_size: int = None) -> go.Figure:
+    """
+    Create a rectangular heatmap of the distances between set A (rows) and set B (columns).
+    
+    Args:
+        sequences1: Set A sequences
+        sequences2: Set B sequences
+        tile_minima: Minimum distance per tile from compute_cross_distance_summary;
+            when omitted, every pair is shown at full resolution
+        tile_size: Sequences per tile along both axes
+        
+    Returns:
+        Plotly figure object
+    """
+    n1, n2 = len(sequences1), len(sequences2)
+    if tile_minima is None:
+        z = block_distances(prepare_kernel_input(sequences1), prepare_kernel_input(sequences2))
+        x_labels = [f"B_{j+1}" for j in range(n2)]
+        y_labels = [f"A_{i+1}" for i in range(n1)]
+        title = "Cross-Set Distance Matrix"
+        colorbar_title = METRIC_LABELS['hamming']
+    else:
+        z = tile_minima.astype(float)
+        x_labels = [f"B_{start + 1}-{min(start + tile_size, n2)}" for start in range(0, n2, tile_size)]
+        y_labels = [f"A_{start + 1}-{min(start + tile_size, n1)}" for start in range(0, n1, tile_size)]
+        title = f"Minimum Cross-Set Distance per Block ({tile_size} x {tile_size} sequences)"
+        colorbar_title = "Min " + METRIC_LABELS['hamming']
+    fig = create_heatmap_figure(z, x_labels, y_labels, title=title, colorbar_title=colorbar_title,
+                                show_text=tile_minima is None and max(n1, n2) <= HEATMAP_TEXT_MAX)
+    fig.update_layout(xaxis_title="Set B", yaxis_title="Set A")
+    return fig
+
+def create_distance_histogram_plot(histogram: np.ndarray, threshold: int, metric: str = 'hamming',
+                                   capped_at: int = None) -> go.Figure:
+    """
+    Create a bar chart of pair counts per distance, coloured by risk at the threshold.
+    
+    Args:
+        histogram: Number of pairs at every distance (index = distance)
+        threshold: Collision threshold
+        metric: 'hamming' or 'edit'
+        capped_at: Largest distance counted when only collision pairs are known (noted in the title)
+        
+    Returns:
+        Plotly figure object
+    """
+    values = np.arange(len(histogram))
+    fig = go.Figure(data=go.Bar(
+        x=values,
+        y=histogram,
+        marker_color=[get_color_for_distance(value, threshold) for value in values.tolist()],
+        hovertemplate="<b>Distance %{x}</b><br>%{y:,} pairs<extra></extra>"
+    ))
+    title = "Pairs per Distance"
+    if capped_at is not None:
+        title += f"<br><sup>only pairs up to distance {capped_at} are searched</sup>"
+    fig.update_layout(
+        title={'text': title, 'x': 0.5, 'xanchor': 'center', 'font': {'size': 20, 'color': '#ffffff', 'family': 'Inter'}},
+        xaxis_title=METRIC_LABELS[metric],
+        yaxis_title="Pairs (log scale)",
+        yaxis_type='log',
+        height=350,
+        font=dict(size=14, color="#ffffff", family="Inter"),
+        plot_bgcolor='rgba(255,255,255,0.02)',
+        paper_bgcolor='rgba(255,255,255,0.05)',
+        xaxis=dict(tickmode='linear', dtick=1, gridcolor='rgba(255,255,255,0.1)'),
+        yaxis=dict(gridcolor='rgba(255,255,255,0.1)')
+    )
+    return fig
+
+# Collision table pagination
+COLLISION_PAGE_SIZES = [100, 500, 1000]
+COLLISION_ROW_COLORS = {
+    'Red': 'background-color: rgba(255, 68, 68, 0.3)',     # Distance < threshold - highest severity
+    'Orange': 'background-color: rgba(255, 165, 0, 0.3)'   # Distance = threshold - medium severity
+}
+
+def build_collision_table(sequences: List[str], rows: np.ndarray, cols: np.ndarray,
+                          distances: np.ndarray, order: np.ndarray,
+                          component_distances: Dict[str, np.ndarray] = None,
+                          threshold: int = COLLISION_THRESHOLD, col_sequences: List[str] = None,
+                          label_prefixes: Tuple[str, str] = ('Seq', 'Seq')) -> pd.DataFrame:
+    """
+    Build collision table rows for a slice of collision pairs.
+    
+    Pairs are kept as index and distance arrays until here; labels and DNA
+    are only looked up for the rows that are actually displayed.
+    
+    Args:
+        sequences: List of DNA sequences
+        rows: First sequence index of every collision pair
+        cols: Second sequence index of every collision pair
+        distances: Distance of every collision pair
+        order: Positions of the pairs to include, in display order
+        component_distances: Optional per-part distances shown before the total
+            (e.g. {'i7 Distance': ..., 'i5 Distance': ...} for dual indexes)
+        threshold: Collision threshold; closer pairs are red, pairs at it orange
+        col_sequences: Sequences the column indices refer to (defaults to sequences),
+            e.g. the second set of a cross-set comparison
+        label_prefixes: Label prefixes of the first and second sequence ('Seq' gives 'Seq_1')
+        
+    Returns:
+        DataFrame with one row per selected collision pair
+    """
+    page_rows, page_cols, page_distances = rows[order], cols[order], distances[order]
+    critical = page_distances < threshold
+    col_sequences = sequences if col_sequences is None else col_sequences
+    row_prefix, col_prefix = label_prefixes
+    
+    columns = {
+        'Sequence 1': [f'{row_prefix}_{i+1}' for i in page_rows.tolist()],
+        'Sequence 1 DNA': [sequences[i] for i in page_rows.tolist()],
+        'Sequence 2': [f'{col_prefix}_{j+1}' for j in page_cols.tolist()],
+        'Sequence 2 DNA': [col_sequences[j] for j in page_cols.tolist()],
+    }
+    for name, values in (component_distances or {}).items():
+        columns[name] = values[order].astype(int)
+    columns.update({
+        'Distance': page_distances.astype(int),
+        'Risk Level': np.where(critical, "🔴 Red", "🟠 Orange"),
+        'Color Category': np.where(critical, "Red", "Orange")
+    })
+    return pd.DataFrame(columns, index=order)
+
+def highlight_collision_severity(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Row background colours for a collision table, computed for the whole frame at once.
+    
+    Args:
+        df: Collision table from build_collision_table
+        
+    Returns:
+        DataFrame of CSS strings with the same shape as df
+    """
+    row_styles = df['Color Category'].map(COLLISION_ROW_COLORS).to_numpy()
+    return pd.DataFrame(np.repeat(row_styles[:, np.newaxis], df.shape[1], axis=1),
+                        index=df.index, columns=df.columns)
+
+def build_neighbor_table(sequences: List[str], distances: np.ndarray, indices: np.ndarray,
+                         threshold: int = COLLISION_THRESHOLD) -> pd.DataFrame:
+    """
+    Build the per-barcode closest neighbour table, most at-risk barcodes first.
+    
+    Args:
+        sequences: List of DNA sequences
+        distances: (n x k) neighbour distances from find_nearest_neighbors
+        indices: (n x k) neighbour indices from find_nearest_neighbors
+        threshold: Collision threshold used for the risk level
+        
+    Returns:
+        DataFrame with one row per barcode; neighbours after the first are
+        listed as 'Seq_j (distance)'
+    """
+    order = np.lexsort((np.arange(len(sequences)), distances[:, 0]))
+    nearest, nearest_distances = indices[order, 0], distances[order, 0].astype(int)
+    columns = {
+        'Sequence': [f'Seq_{i+1}' for i in order.tolist()],
+        'DNA': [sequences[i] for i in order.tolist()],
+        'Nearest': [f'Seq_{j+1}' if j >= 0 else '' for j in nearest.tolist()],
+        'Nearest DNA': [sequences[j] if j >= 0 else '' for j in nearest.tolist()],
+        'Distance': nearest_distances,
+        'Risk Level': risk_levels(nearest_distances, threshold),
+    }
+    if distances.shape[1] > 1:
+        columns['Next Neighbours'] = [
+            ', '.join(f'Seq_{j+1} ({d})' for j, d in zip(row_indices, row_distances) if j >= 0)
+            for row_indices, row_distances in zip(indices[order, 1:].tolist(), distances[order, 1:].tolist())
+        ]
+    return pd.DataFrame(columns, index=order)
+
+# Result cache shared across reruns: bounded entry count, LRU eviction and TTL
+CACHE_TTL_SECONDS = int(os.environ.get("BC_CALC_CACHE_TTL", 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get("BC_CALC_CACHE_MAX_ENTRIES", 16))
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_parse_text(key: str, _text: str, dual_index: bool = False) -> List[str]:
+    """Parse pasted text, cached by its content hash."""
+    return parse_sequences_from_text(_text, dual_index)
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_parse_file(key: str, _file, dual_index: bool = False) -> List[str]:
+    """Parse an uploaded file, cached by its name and content hash."""
+    _file.seek(0)
+    return parse_sequences_from_file(_file, dual_index)
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_distance_matrix(key: str, _sequences: List[str], _workers: int = 1) -> DistanceMatrix:
+    """Compute the distance matrix, cached by sequence set key."""
+    return compute_distance_matrix(_sequences, workers=_workers)
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_distance_store(key: str, _sequences: List[str], _workers: int = 1) -> DistanceMatrix:
+    """Open (or compute) the on-disk distance matrix, cached by sequence set key."""
+    return store_distance_matrix(_sequences, key=key, workers=_workers)
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_store_collisions(key: str, threshold: int, _store: DistanceMatrix) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Scan the on-disk distance matrix for collisions, cached by sequence set key and threshold."""
+    return _store.pairs_within(threshold)
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_store_tile_minima(key: str, tile_size: int, _store: DistanceMatrix) -> np.ndarray:
+    """Aggregate heatmap tiles from the on-disk distance matrix, cached by sequence set key and tile size."""
+    return _store.tile_minima(tile_size)
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_edit_distance_matrix(key: str, _sequences: List[str]) -> DistanceMatrix:
+    """Compute the edit distance matrix, cached by sequence set key."""
+    return compute_edit_distance_matrix(_sequences)
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_tile_minima(key: str, tile_size: int, _sequences: List[str]) -> np.ndarray:
+    """Compute aggregated heatmap tiles, cached by sequence set key and tile size."""
+    return compute_tile_minima(_sequences, tile_size)
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_find_collisions(key: str, threshold: int, _sequences: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Find collisions, cached by sequence set key and threshold."""
+    return find_collisions(_sequences, threshold)
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_distance_summary(key: str, tile_size: Optional[int], _sequences: List[str],
+                            _store: DistanceMatrix = None) -> DistanceSummary:
+    """Compute the distance histogram, nearest neighbours and heatmap tiles in one pass, cached by sequence set key."""
+    if _store is not None:
+        return _store.summary(tile_size)
+    return compute_distance_summary(_sequences, tile_size)
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_nearest_neighbors(key: str, k: int, _sequences: List[str], _summary: DistanceSummary = None
+                             ) -> Tuple[np.ndarray, np.ndarray]:
+    """Find every barcode's k closest neighbours, cached by sequence set key and k."""
+    if _summary is not None and k == 1:
+        return _summary.nearest_distances[:, np.newaxis], _summary.nearest_indices[:, np.newaxis]
+    return find_nearest_neighbors(_sequences, k)
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_collision_free(key: str, min_distance: int, time_budget: float, _n: int, _rows: np.ndarray,
+                          _cols: np.ndarray, _distances: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Select a collision-free subset, cached by sequence set key, minimum distance and search time."""
+    conflicts = _distances < min_distance
+    return select_collision_free(_n, _rows[conflicts], _cols[conflicts], time_budget)
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_find_edit_collisions(key: str, threshold: int, _sequences: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Find edit distance collisions, cached by sequence set key and threshold."""
+    return find_edit_collisions(_sequences, threshold)
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_find_dual_index_collisions(key: str, threshold: int, _i7: List[str], _i5: List[str]
+                                      ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Find combined i7 + i5 collisions, cached by sequence set key and threshold."""
+    return find_dual_index_collisions(_i7, _i5, threshold)
+
+# Downloadable reports; the full distance matrix is offered up to this many pairs
+EXPORT_FORMAT_LABELS = {'csv': "CSV", 'parquet': "Parquet", 'arrow': "Arrow IPC"}
+MAX_MATRIX_EXPORT_PAIRS = int(os.environ.get("BC_CALC_MAX_MATRIX_EXPORT_PAIRS", 10_000_000))
+
+def show_report_export(reports: Dict[str, Tuple[str, Callable[[io.BytesIO, str], int]]], export_key: tuple,
+                       perf: PerformanceLog) -> None:
+    """
+    Let the user pick a report and format, write it on request and offer it for download.
+    
+    Reports are only written when "Prepare export" is clicked, then kept in the
+    session until the input or the report settings change.
+    
+    Args:
+        reports: Report name -> (file name stem, writer called as writer(out, output_format))
+        export_key: Input and settings the reports depend on
+        perf: Performance log of the current run
+    """
+    col1, col2 = st.columns(2)
+    with col1:
+        report = st.selectbox("Report:", list(reports))
+    with col2:
+        output_format = st.selectbox("Format:", list(EXPORT_FORMATS), format_func=EXPORT_FORMAT_LABELS.get,
+                                     help="Parquet and Arrow store barcode labels and sequences dictionary-encoded")
+    
+    export_id = (export_key, report, output_format)
+    stem, writer = reports[report]
+    if st.button("📤 Prepare export"):
+        buffer = io.BytesIO()
+        with perf.stage(f"export {report.lower()}"):
+            rows = writer(buffer, output_format)
+        st.session_state["export"] = (export_id, buffer.getvalue(), rows)
+    
+    prepared = st.session_state.get("export")
+    if prepared is not None and prepared[0] == export_id:
+        extension, mime = EXPORT_FORMATS[output_format]
+        st.download_button(f"Download {report.lower()} ({prepared[2]:,} rows, {len(prepared[1]) / 1e6:,.2f} MB)",
+                           prepared[1], file_name=stem + extension, mime=mime)
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_cross_summary(key: str, tile_size: Optional[int], _sequences1: List[str], _sequences2: List[str]
+                         ) -> DistanceSummary:
+    """Summarise the set A x set B distances in one pass, cached by both set keys and tile size."""
+    return compute_cross_distance_summary(_sequences1, _sequences2, tile_size)
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_find_cross_collisions(key: str, threshold: int, _sequences1: List[str], _sequences2: List[str]
+                                 ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Find set A x set B collisions, cached by both set keys and threshold."""
+    return find_cross_collisions(_sequences1, _sequences2, threshold)
+
+def format_sequence_list(sequences: List[str], indices: np.ndarray) -> str:
+    """Render selected sequences as labelled lines ('Seq_1: ATGC') for download."""
+    return ''.join(f"Seq_{i+1}: {sequences[i]}\n" for i in indices.tolist())
+
+def manage_library(new_sequences: List[str]) -> Optional[CollisionIndex]:
+    """
+    Sidebar controls for incremental mode: a barcode library kept in the
+    session whose collision index grows as new barcodes are added.
+    
+    Args:
+        new_sequences: Sequences parsed from the current input
+        
+    Returns:
+        The current library, or None when it is empty
+    """
+    library = st.session_state.get("library")
+    
+    col1, col2 = st.sidebar.columns(2)
+    with col1:
+        add_clicked = st.button("➕ Add to library", disabled=not new_sequences)
+    with col2:
+        clear_clicked = st.button("🗑️ Clear library")
+    
+    if clear_clicked:
+        library = None
+    elif add_clicked:
+        try:
+            if library is None:
+                library = CollisionIndex.build(new_sequences, COLLISION_THRESHOLD)
+                added = len(library.distances)
+            else:
+                added = library.append(new_sequences)
+            st.sidebar.success(f"Added {len(new_sequences)} barcodes ({added} new collision pairs).")
+        except ValueError as e:
+            st.sidebar.error(str(e))
+    
+    restore_file = st.sidebar.file_uploader("Restore library index:", type=['npz'],
+                                            help="A library index saved earlier with 'Save library index'")
+    if restore_file and st.sidebar.button("📂 Load library index"):
+        try:
+            library = CollisionIndex.load(restore_file)
+        except Exception as e:
+            st.sidebar.error(f"Error reading library index: {str(e)}")
+    
+    st.session_state["library"] = library
+    st.sidebar.markdown(f"**Library:** {len(library.sequences) if library else 0} barcodes")
+    
+    if library is not None:
+        buffer = io.BytesIO()
+        library.save(buffer)
+        st.sidebar.download_button("💾 Save library index", buffer.getvalue(),
+                                   file_name="barcode_library.npz", mime="application/octet-stream")
+    
+    return library
+
+def show_barcode_generator(sequences: List[str]) -> None:
+    """
+    Generate new barcodes at a minimum distance from the current sequences,
+    showing them as they are found.
+    
+    Args:
+        sequences: Current (validated, equal-length) sequences
+    """
+    with st.expander("🧪 Generate New Barcodes"):
+        with st.form("barcode_generator"):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                length = st.number_input("Length:", min_value=1, max_value=256,
+                                         value=len(sequences[0]) if sequences else 8)
+            with col2:
+                count = st.number_input("Number of barcodes:", min_value=1, max_value=1_000_000, value=96)
+            with col3:
+                min_distance = st.number_input("Minimum distance:", min_value=1, max_value=256,
+                                               value=COLLISION_THRESHOLD + 1)
+            col1, col2 = st.columns(2)
+            with col1:
+                gc_percent = st.slider("GC content (%):", 0, 100, (40, 60))
+            with col2:
+                max_homopolymer = st.number_input("Longest homopolymer run:", min_value=1, max_value=256, value=3)
+            keep_away = st.checkbox("Keep distance from the current sequences", value=True)
+            submitted = st.form_submit_button("Generate")
+        
+        if submitted:
+            existing = sequences if keep_away else []
+            if any(len(seq) != length for seq in existing):
+                st.error(f"All current sequences must have length {length} to keep distance from them.")
+                return
+            
+            progress = st.progress(0.0)
+            preview = st.empty()
+            generated = []
+            last_update = 0.0
+            for barcode in generate_distant_barcodes(length, count, min_distance, existing,
+                                                     gc_range=(gc_percent[0] / 100, gc_percent[1] / 100),
+                                                     max_homopolymer=max_homopolymer):
+                generated.append(barcode)
+                if time.perf_counter() - last_update > 0.2:
+                    last_update = time.perf_counter()
+                    progress.progress(len(generated) / count)
+                    preview.text(f"{len(generated)} barcodes found...")
+            progress.progress(1.0)
+            preview.empty()
+            st.session_state["generated_barcodes"] = generated
+            if len(generated) < count:
+                st.warning(f"Only {len(generated)} of {count} barcodes found; the constraints leave no more room.")
+        
+        generated = st.session_state.get("generated_barcodes")
+        if generated:
+            text = ''.join(f"New_{i+1}: {barcode}\n" for i, barcode in enumerate(generated))
+            st.text_area("Generated barcodes:", text, height=200)
+            st.download_button("Download generated barcodes", text, file_name="generated_barcodes.txt", mime="text/plain")
+
+def build_demux_table_frame(sequences: List[str], table: DemuxTable, counts: DemuxCounts) -> pd.DataFrame:
+    """
+    Per-barcode demultiplexing results.
+    
+    Args:
+        sequences: Barcodes in table order
+        table: Lookup table used for the run
+        counts: Accumulated assignment counts
+        
+    Returns:
+        DataFrame with one row per barcode
+    """
+    columns = {
+        'Barcode': [f'Seq_{i+1}' for i in range(len(sequences))],
+        'DNA': sequences,
+        'Ambiguous Variants': table.ambiguous_variants,
+        'Assigned Reads': counts.assigned,
+        'Exact Matches': counts.exact,
+    }
+    if counts.origin_reads is not None:
+        simulated = np.maximum(counts.origin_reads, 1)
+        columns.update({
+            'Simulated Reads': counts.origin_reads,
+            'Correct %': 100 * counts.correct / simulated,
+            'Misassigned %': 100 * counts.misassigned / simulated,
+            'Ambiguous %': 100 * counts.origin_ambiguous / simulated,
+            'Lost %': 100 * counts.origin_lost / simulated,
+        })
+    return pd.DataFrame(columns)
+
+def show_demultiplexing_simulator(sequences: List[str]) -> None:
+    """
+    Simulate demultiplexing of index reads against the current barcodes.
+    
+    Args:
+        sequences: Current (validated, equal-length) barcodes
+    """
+    with st.expander("📬 Demultiplexing Simulation"):
+        if len(sequences[0]) > MAX_PACKED_LENGTH:
+            st.info(f"Demultiplexing simulation supports barcodes of up to {MAX_PACKED_LENGTH} bases.")
+            return
+        
+        with st.form("demux_simulator"):
+            col1, col2 = st.columns(2)
+            with col1:
+                max_mismatches = st.radio("Mismatch tolerance:", [0, 1], index=1, horizontal=True)
+            with col2:
+                source = st.radio("Reads:", ["Synthetic", "FASTQ file"], horizontal=True)
+            col1, col2 = st.columns(2)
+            with col1:
+                num_reads = st.number_input("Synthetic reads:", min_value=1_000, max_value=100_000_000,
+                                            value=1_000_000, step=100_000)
+            with col2:
+                error_rate = st.number_input("Per-base error rate (%):", min_value=0.0, max_value=50.0, value=1.0, step=0.1)
+            fastq_file = st.file_uploader("Index read FASTQ:", type=['fastq', 'fq', 'gz'],
+                                          help="The first bases of every read are matched against the barcodes")
+            submitted = st.form_submit_button("Simulate")
+        
+        if not submitted:
+            return
+        if source == "FASTQ file" and fastq_file is None:
+            st.error("Upload a FASTQ file of index reads first.")
+            return
+        
+        table = DemuxTable.build(sequences, max_mismatches)
+        synthetic = source == "Synthetic"
+        counts = DemuxCounts.empty(len(sequences), with_origins=synthetic)
+        if synthetic:
+            batches = iter_synthetic_index_reads(sequences, num_reads, error_rate / 100)
+        else:
+            fastq_file.seek(0)
+            batches = ((reads, None) for reads in iter_fastq_index_reads(fastq_file, len(sequences[0])))
+        
+        progress = st.progress(0.0)
+        start = time.perf_counter()
+        for reads, origins in batches:
+            owners, mismatches = table.assign(reads)
+            counts.add(owners, mismatches, origins)
+            # Uploads advance by bytes read (the compressed offset for .gz, which GzipFile reads from)
+            done = counts.reads / num_reads if synthetic else fastq_file.tell() / max(fastq_file.size, 1)
+            progress.progress(min(1.0, done), text=f"{counts.reads:,} reads processed")
+        elapsed = time.perf_counter() - start
+        progress.progress(1.0, text=f"{counts.reads:,} reads processed")
+        
+        total = max(counts.reads, 1)
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("📈 Reads per Second", f"{counts.reads / max(elapsed, 1e-9):,.0f}")
+        with col2:
+            st.metric("✅ Assigned", f"{100 * int(counts.assigned.sum()) / total:.2f}%")
+        with col3:
+            st.metric("⚠️ Ambiguous", f"{100 * counts.ambiguous / total:.2f}%")
+        with col4:
+            st.metric("🗑️ Unassigned", f"{100 * counts.unassigned / total:.2f}%")
+        if synthetic:
+            st.markdown(f"**Misassigned to the wrong barcode:** {100 * int(counts.misassigned.sum()) / total:.3f}% of reads")
+        
+        st.dataframe(build_demux_table_frame(sequences, table, counts), use_container_width=True)
+
+# Per-stage performance records are also emitted here when enabled
+perf_logger = logging.getLogger("bc_calc.performance")
+if not perf_logger.handlers:
+    perf_logger.addHandler(logging.StreamHandler())
+    perf_logger.setLevel(logging.INFO)
+
+# Inputs with at least this many pairs are summarised by a background job
+BACKGROUND_MIN_PAIRS = int(os.environ.get("BC_CALC_BACKGROUND_MIN_PAIRS", 20_000_000))
+JOB_POLL_SECONDS = 0.5
+
+def run_distance_job(job: BackgroundJob, sequences: List[str], tile_size: Optional[int],
+                     partial_threshold: int) -> Tuple[DistanceSummary, int, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Background job: the one-pass distance summary, then the collision search for the slider.
+    
+    Pairs within partial_threshold are published block by block as partial
+    results (up to MAX_COLLISION_PAIRS), so the worst collisions show up
+    long before the pass ends.
+    
+    Args:
+        job: The running job, used to report progress
+        sequences: List of DNA sequences of equal length
+        tile_size: Heatmap tile size passed to compute_distance_summary
+        partial_threshold: Threshold of the partial collision results
+        
+    Returns:
+        Tuple of the DistanceSummary, the threshold the collision pairs were
+        searched at (see collision_fetch_threshold) and those pairs
+    """
+    n = len(sequences)
+    num_pairs = max(1, n * (n - 1) // 2)
+    collected = 0
+    
+    def on_block(start: int, stop: int, block: np.ndarray) -> None:
+        nonlocal collected
+        partial = None
+        if collected < MAX_COLLISION_PAIRS:
+            partial = upper_block_pairs(start, block, partial_threshold)
+            collected += len(partial[0])
+        job.report((stop * n - stop * (stop + 1) // 2) / num_pairs, partial=partial)
+    
+    job.report(0.0, "Scanning all pairs")
+    summary = compute_distance_summary(sequences, tile_size, on_block=on_block)
+    job.report(1.0, "Collecting collision pairs")
+    fetched = collision_fetch_threshold(summary, partial_threshold)
+    return summary, fetched, find_collisions(sequences, fetched)
+
+def cancel_stale_distance_job(set_key: Optional[str]) -> None:
+    """Cancel and forget this session's background job when it belongs to another input."""
+    current = st.session_state.get("distance_job")
+    if current is not None and current[0] != set_key:
+        current[1].cancel()
+        del st.session_state["distance_job"]
+
+def current_distance_job(set_key: str, sequences: List[str], tile_size: Optional[int]) -> BackgroundJob:
+    """This session's background job for the input, started on first use."""
+    current = st.session_state.get("distance_job")
+    if current is None or current[0] != set_key:
+        job = BackgroundJob(run_distance_job, sequences, tile_size,
+                            st.session_state.get("collision_threshold", COLLISION_THRESHOLD))
+        current = st.session_state["distance_job"] = (set_key, job)
+    return current[1]
+
+def show_distance_job(job: BackgroundJob, sequences: List[str]) -> None:
+    """
+    Show a running job's progress and the collisions found so far, then poll again.
+    
+    Args:
+        job: Unfinished or cancelled background job from current_distance_job
+        sequences: List of DNA sequences
+    """
+    if job.cancelled:
+        st.markdown("""
+        <div class="info-box">
+            <strong>⏹️ Computation cancelled.</strong> Restart it to analyse this input.
+        </div>
+        """, unsafe_allow_html=True)
+        if st.button("▶️ Restart computation"):
+            del st.session_state["distance_job"]
+            st.rerun()
+        return
+    
+    st.progress(min(job.progress, 1.0), text=f"{job.stage}: {job.progress:.0%}")
+    if st.button("⏹️ Cancel computation"):
+        job.cancel()
+        st.rerun()
+    
+    partial = job.partial_results()
+    if partial:
+        rows, cols, distances = partial
+        threshold = st.session_state.get("collision_threshold", COLLISION_THRESHOLD)
+        st.markdown(f"""
+        <div class="error-box">
+            <strong>⚠️ Collisions so far:</strong> {len(distances)} pairs within distance {threshold} in the pairs scanned yet.
+            The closest are listed below while the computation continues.
+        </div>
+        """, unsafe_allow_html=True)
+        order = np.argsort(distances, kind='stable')[:COLLISION_PAGE_SIZES[0]]
+        partial_df = build_collision_table(sequences, rows, cols, distances, order, threshold=threshold)
+        st.dataframe(partial_df.style.apply(highlight_collision_severity, axis=None), use_container_width=True)
+    
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
+
+def read_cross_set(input_method: str, dual_index: bool, perf: PerformanceLog) -> List[str]:
+    """
+    Sidebar input for set B of the cross-set comparison, in the same form as the main input.
+    
+    Args:
+        input_method: Main input method; set B is pasted or uploaded the same way
+        dual_index: Parse i7 + i5 index pairs
+        perf: Performance log of the current run
+        
+    Returns:
+        List of set B sequences (empty until provided)
+    """
+    if input_method == "📝 Copy & Paste":
+        text_input = st.sidebar.text_area("Set B sequences:", height=150,
+                                          help="Barcodes compared against the main input (set A)")
+        if text_input:
+            with perf.stage("parse set B"):
+                return cached_parse_text(content_key(text_input), text_input, dual_index)
+    else:
+        uploaded_file = st.sidebar.file_uploader("Set B file:", type=['txt', 'fasta', 'fa', 'fastq', 'fq', 'gz'],
+                                                 help="Barcodes compared against the main input (set A)")
+        if uploaded_file:
+            with perf.stage("parse set B"):
+                return cached_parse_file(uploaded_file.name + ':' + content_key(uploaded_file.getvalue()),
+                                         uploaded_file, dual_index)
+    return []
+
+def show_cross_set_comparison(sequences_a: List[str], sequences_b: List[str], perf: PerformanceLog,
+                              color_legend) -> None:
+    """
+    Compare set A against set B: only the |A| x |B| pairs are computed, never pairs inside either set.
+    
+    Args:
+        sequences_a: Set A sequences (the main input, validated)
+        sequences_b: Set B sequences
+        perf: Performance log of the current run
+        color_legend: Placeholder of the colour legend, redrawn for the chosen threshold
+    """
+    st.markdown('<h3 class="sub-header">🔀 Cross-Set Comparison</h3>', unsafe_allow_html=True)
+    if not sequences_b:
+        st.markdown("""
+        <div class="info-box">
+            <strong>🔀 Set B:</strong> Paste or upload the barcodes to compare against in the sidebar.
+        </div>
+        """, unsafe_allow_html=True)
+        return
+    lengths_b = sorted({len(seq) for seq in sequences_b})
+    if lengths_b != [len(sequences_a[0])]:
+        st.markdown(f"""
+        <div class="error-box">
+            <strong>⚠️ Error:</strong> Set B sequences must have the same length as set A ({len(sequences_a[0])}).
+            <br>Set B lengths: {lengths_b}
+        </div>
+        """, unsafe_allow_html=True)
+        return
+    
+    n1, n2 = len(sequences_a), len(sequences_b)
+    num_pairs = n1 * n2
+    cross_key = sequence_set_key(sequences_a) + ':' + sequence_set_key(sequences_b)
+    tile_size = heatmap_tile_size(max(n1, n2)) if max(n1, n2) > HEATMAP_DETAIL_MAX else None
+    with perf.stage("cross-set summary", pairs=num_pairs):
+        summary = cached_cross_summary(cross_key, tile_size, sequences_a, sequences_b)
+    
+    max_threshold = slider_max_threshold(summary)
+    threshold = st.sidebar.slider(
+        "Collision threshold:", 0, max_threshold, min(COLLISION_THRESHOLD, max_threshold),
+        key="collision_threshold",
+        help=f"Pairs at or below this distance are collisions (up to {max_threshold} for this input)"
+    )
+    color_legend.markdown(render_color_legend(threshold), unsafe_allow_html=True)
+    
+    with perf.stage("cross-set collision search", pairs=num_pairs):
+        rows, cols, distances = cached_find_cross_collisions(cross_key, collision_fetch_threshold(summary, threshold),
+                                                             sequences_a, sequences_b)
+        within = distances <= threshold
+        rows, cols, distances = rows[within], cols[within], distances[within]
+    
+    total_pairs = summary.pairs_within(threshold)
+    red_count = summary.pairs_within(threshold - 1)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("⚠️ Cross-Set Collision Pairs", total_pairs)
+    with col2:
+        st.metric(f"🔴 Red Collisions (< {threshold})", red_count)
+    with col3:
+        st.metric("🅰️ Set A Barcodes Involved", int((summary.nearest_distances[:n1] <= threshold).sum()))
+    with col4:
+        st.metric("🅱️ Set B Barcodes Involved", int((summary.nearest_distances[n1:] <= threshold).sum()))
+    
+    if total_pairs:
+        st.markdown(f"""
+        <div class="error-box">
+            <strong>⚠️ Collision Alert:</strong> {total_pairs} pairs of a set A and a set B barcode are within distance {threshold}.
+            These may be confused when both sets are used on the same run.
+        </div>
+        """, unsafe_allow_html=True)
+        collision_order = np.argsort(distances, kind='stable')
+        col1, col2 = st.columns(2)
+        with col1:
+            page_size = st.selectbox("Rows per page:", COLLISION_PAGE_SIZES)
+        num_pages = max(1, -(-len(collision_order) // page_size))
+        with col2:
+            page = st.number_input(f"Page (of {num_pages}):", min_value=1, max_value=num_pages, value=1)
+        page_order = collision_order[(page - 1) * page_size:page * page_size]
+        with perf.stage("cross-set collision table", pairs=len(page_order)):
+            collision_df = build_collision_table(sequences_a, rows, cols, distances, page_order, threshold=threshold,
+                                                 col_sequences=sequences_b, label_prefixes=('A', 'B'))
+            st.dataframe(collision_df.style.apply(highlight_collision_severity, axis=None), use_container_width=True)
+    else:
+        st.markdown(f"""
+        <div class="success-box">
+            <strong>✅ No Cross-Set Collisions:</strong> Every set A barcode is more than {threshold} away from every set B barcode.
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with perf.stage("cross-set heatmap", pairs=num_pairs):
+        fig = create_cross_distance_plot(sequences_a, sequences_b, summary.tile_minima, tile_size)
+        st.plotly_chart(fig, use_container_width=True)
+
+def show_performance_panel(perf: PerformanceLog) -> None:
+    """
+    Show per-stage timings in an optional sidebar expander.
+    
+    Args:
+        perf: Stage records collected during this run
+    """
+    if st.session_state.get("perf_log_enabled") or os.environ.get("BC_CALC_PERF_LOG"):
+        perf.log(perf_logger)
+    
+    with st.sidebar.expander("Performance"):
+        st.checkbox("Track memory (slower)", key="perf_track_memory",
+                    help="Measure peak bytes allocated per stage with tracemalloc")
+        st.checkbox("Emit to log", key="perf_log_enabled",
+                    help="Write stage timings to the 'bc_calc.performance' logger")
+        
+        if not perf.records:
+            st.markdown("*No stages ran yet.*")
+            return
+        
+        report = perf.to_dict()
+        st.dataframe(pd.DataFrame(report['stages']).rename(columns={
+            'name': 'Stage', 'seconds': 'Seconds', 'pairs': 'Pairs', 'peak_bytes': 'Peak Bytes'
+        }), use_container_width=True, hide_index=True)
+        st.markdown(f"**Total:** {report['total_seconds']:.3f} s")
+        st.download_button("Download JSON", json.dumps(report, indent=2),
+                           file_name="barcode_performance.json", mime="application/json")
+
 def main():
     """Main Streamlit application."""
     
+    perf = PerformanceLog(track_memory=st.session_state.get("perf_track_memory", False))
+    
     # Header
     st.markdown('<h1 class="main-header">Barcode Distance Calculator</h1>', unsafe_allow_html=True)
     
-    # Info section
-    st.markdown("""
-    <div class="info-box">
-        <strong>Barcode Analysis Platform:</strong><br>
-        <br>
-        Calculate that computes the hamming distance between DNA sequences:
-        <ul>
-            <li><span style="color: #ff4444; font-weight: 600;">🔴 Red:</span> Distance < 2 (nearly identical sequences - barcode conflicts - BAD)</li>
-            <li><span style="color: #ffa500; font-weight: 600;">🟠 Orange:</span> Distance 2-3 (similar sequences with potential issues - PROCEED WITH CARE)</li>
-            <li><span style="color: #4a90e2; font-weight: 600;">🔵 Blue:</span> Distance ≥ 4 (sufficiently different sequences - safe barcodes - GOOD)</li>
-        </ul>
-    </div>
-    """, unsafe_allow_html=True)
+    # Info section; redrawn once the collision threshold is chosen
+    color_legend = st.empty()
+    color_legend.markdown(render_color_legend(COLLISION_THRESHOLD), unsafe_allow_html=True)
     
     # Sidebar for input options
     st.sidebar.markdown('<h2 class="sub-header">Input Options</h2>', unsafe_allow_html=True)
@@ -687,6 +1593,12 @@ def main():
         help="Select how you want to provide your DNA sequences"
     )
     
+    dual_index = st.sidebar.checkbox(
+        "🔗 Dual-index input (i7 + i5)",
+        help="One sample per line as 'i7+i5' or two columns (comma, tab or space separated); "
+             "collisions use the combined distance of both indexes"
+    )
+    
     sequences = []
     
     if input_method == "📝 Copy & Paste":
@@ -702,126 +1614,399 @@ def main():
         )
         
         if text_input:
-            sequences = parse_sequences_from_text(text_input)
+            with perf.stage("parse"):
+                sequences = cached_parse_text(content_key(text_input), text_input, dual_index)
     
     else:  # File upload
         st.sidebar.markdown("**Upload a file containing DNA sequences:**")
         uploaded_file = st.sidebar.file_uploader(
             "Choose a file:",
-            type=['txt', 'fasta', 'fa'],
-            help="Supported formats: .txt, .fasta, .fa"
+            type=['txt', 'fasta', 'fa', 'fastq', 'fq', 'gz'],
+            help="Supported formats: .txt, .fasta, .fa, .fastq, .fq (optionally .gz compressed)"
         )
         
         if uploaded_file:
-            sequences = parse_sequences_from_file(uploaded_file)
+            with perf.stage("parse"):
+                sequences = cached_parse_file(uploaded_file.name + ':' + content_key(uploaded_file.getvalue()), uploaded_file, dual_index)
+    
+    # Incremental mode analyses the session library instead of the raw input
+    library = None
+    if st.sidebar.checkbox("📚 Incremental mode", help="Keep a barcode library and only compare newly added barcodes against it"):
+        library = manage_library(sequences)
+        sequences = library.sequences if library is not None else []
+    
+    # Cross-set mode compares the input (set A) only against a second set B
+    cross_set = st.sidebar.checkbox(
+        "🔀 Cross-set mode (A vs B)",
+        help="Compare the input (set A) against a second barcode set B, e.g. a kit already in use; "
+             "pairs inside either set are not compared"
+    )
+    sequences_b = read_cross_set(input_method, dual_index, perf) if cross_set else []
+    
+    # A background job for a previous input stops as soon as the input changes
+    cancel_stale_distance_job(sequence_set_key(sequences) if sequences else None)
+    
+    metric = st.sidebar.radio(
+        "Distance metric:",
+        list(METRIC_LABELS),
+        format_func=lambda key: {'hamming': "Hamming (substitutions)", 'edit': "Levenshtein (substitutions and indels)"}[key],
+        help="Levenshtein also counts insertions and deletions and accepts barcodes of different lengths"
+    )
+    if dual_index and metric == 'edit':
+        st.sidebar.info("Dual-index pairs are compared by Hamming distance.")
+        metric = 'hamming'
+    if cross_set and metric == 'edit':
+        st.sidebar.info("Cross-set mode compares barcodes by Hamming distance.")
+        metric = 'hamming'
+    
+    # Worker processes only speed up full distance matrices (the on-disk store and the matrix
+    # export); the default views stream row blocks in this process
+    workers = DEFAULT_WORKERS
+    
+    use_store = st.sidebar.checkbox(
+        "💾 On-disk distance store",
+        help=f"Write the full Hamming distance matrix (one byte per pair) to a memory-mapped file in {DISTANCE_STORE_DIR} "
+             "and read collisions and heatmap blocks from it; the file is reused when the same barcodes are loaded again"
+    )
     
     # Main content area
     if sequences:
-        # Validate all sequences have the same length
+        # Validate all sequences have the same length (Hamming) or fit the edit kernel
         seq_lengths = [len(seq) for seq in sequences]
-        if len(set(seq_lengths)) > 1:
+        index_pairs = split_index_pairs(sequences) if dual_index else None
+        if index_pairs and any(len({len(index) for index in indexes}) > 1 for indexes in index_pairs):
+            st.markdown("""
+            <div class="error-box">
+                <strong>⚠️ Error:</strong> All i7 indexes must have the same length, and so must all i5 indexes.
+                <br>i7 lengths: """ + str(sorted({len(i) for i in index_pairs[0]})) + """,
+                i5 lengths: """ + str(sorted({len(i) for i in index_pairs[1]})) + """
+            </div>
+            """, unsafe_allow_html=True)
+            show_performance_panel(perf)
+            return
+        if metric == 'hamming' and len(set(seq_lengths)) > 1:
             st.markdown("""
             <div class="error-box">
                 <strong>⚠️ Error:</strong> All DNA sequences must have the same length for Hamming distance calculation.
+                Switch the distance metric to Levenshtein to compare barcodes of different lengths.
                 <br>Current lengths: """ + str(seq_lengths) + """
             </div>
             """, unsafe_allow_html=True)
+            show_performance_panel(perf)
+            return
+        if metric == 'edit' and max(seq_lengths) > MAX_EDIT_LENGTH:
+            st.markdown(f"""
+            <div class="error-box">
+                <strong>⚠️ Error:</strong> Edit distance supports sequences of up to {MAX_EDIT_LENGTH} bases.
+                The longest sequence has {max(seq_lengths)}.
+            </div>
+            """, unsafe_allow_html=True)
+            show_performance_panel(perf)
             return
         
+        min_length, max_length = min(seq_lengths), max(seq_lengths)
+        length_text = f"length {min_length}" if min_length == max_length else f"lengths {min_length}-{max_length}"
+        if index_pairs:
+            length_text = f"i7 length {len(index_pairs[0][0])} + i5 length {len(index_pairs[1][0])}"
         st.markdown(f"""
         <div class="success-box">
-            <strong>✅ Success:</strong> Found {len(sequences)} valid DNA sequences of length {len(sequences[0])}.
+            <strong>✅ Success:</strong> Found {len(sequences)} valid DNA sequences of {length_text}.
         </div>
         """, unsafe_allow_html=True)
         
-        # Barcode Collisions - sequences with distance <= 2
+        if cross_set:
+            show_cross_set_comparison(sequences, sequences_b, perf, color_legend)
+            show_performance_panel(perf)
+            return
+        
+        num_pairs = len(sequences) * (len(sequences) - 1) // 2
+        set_key = sequence_set_key(sequences)
+        component_distances = None
+        store = None
+        if use_store and metric == 'hamming':
+            with perf.stage("distance store", pairs=num_pairs):
+                store = cached_distance_store(set_key, sequences, workers)
+        
+        # One pass over all pairs gives the distance histogram, per-barcode minima and the
+        # aggregated heatmap tiles, so the counts for any threshold are known without running
+        # the distance kernel again. Dual indexes skip it: their collision search prunes by one
+        # index first, which a pass over all pairs would defeat. A library keeps its summary
+        # up to date on every append, so it is read from the index instead
+        summary = None
+        job_collisions = None
+        job_threshold = -1
+        tile_size = heatmap_tile_size(len(sequences)) if len(sequences) > HEATMAP_DETAIL_MAX else None
+        if metric == 'hamming' and not index_pairs:
+            if library is not None:
+                # Heatmap tiles are merged from the index's own, so their size is a multiple of its tile size
+                tile_size = library.heatmap_tile_size(tile_size) if tile_size else None
+                summary = library.summary(tile_size)
+            elif store is None and num_pairs >= BACKGROUND_MIN_PAIRS:
+                # Large inputs: run on a worker thread and show progress and partial collisions meanwhile
+                job = current_distance_job(set_key, sequences, tile_size)
+                if not job.done or job.cancelled:
+                    show_distance_job(job, sequences)
+                    show_performance_panel(perf)
+                    return
+                try:
+                    summary, job_threshold, job_collisions = job.result()
+                except Exception as e:
+                    # The worker thread failed (e.g. MemoryError); forget the job so the next run starts afresh
+                    del st.session_state["distance_job"]
+                    st.error(f"Error computing distances: {str(e) or type(e).__name__}")
+                    # Any click reruns the script, which starts a new job
+                    st.button("🔁 Retry computation")
+                    show_performance_panel(perf)
+                    return
+            else:
+                with perf.stage("distance summary", pairs=num_pairs):
+                    summary = cached_distance_summary(set_key, tile_size, sequences, store)
+        
+        # Collision pairs are searched ahead of the slider while the histogram shows they are few,
+        # and filtered per threshold; larger thresholds are searched when the slider gets there
+        if library is not None:
+            max_threshold = library.threshold
+        elif summary is not None:
+            max_threshold = slider_max_threshold(summary)
+        else:
+            # The edit distance and dual-index searches get much slower with every extra unit of threshold
+            max_threshold = COLLISION_THRESHOLD
+        threshold = st.sidebar.slider(
+            "Collision threshold:", 0, max_threshold, min(COLLISION_THRESHOLD, max_threshold),
+            key="collision_threshold",
+            help=f"Pairs at or below this distance are collisions (up to {max_threshold} for this input)"
+        )
+        color_legend.markdown(render_color_legend(threshold), unsafe_allow_html=True)
+        search_threshold = collision_fetch_threshold(summary, threshold) if summary is not None else max_threshold
+        
+        if metric == 'edit':
+            with perf.stage("edit collision search", pairs=num_pairs):
+                collision_rows, collision_cols, collision_distances = cached_find_edit_collisions(set_key, max_threshold, sequences)
+        elif index_pairs:
+            with perf.stage("dual-index collision search", pairs=num_pairs):
+                collision_rows, collision_cols, collision_distances, i7_distances, i5_distances = \
+                    cached_find_dual_index_collisions(set_key, max_threshold, *index_pairs)
+            component_distances = {'i7 Distance': i7_distances, 'i5 Distance': i5_distances}
+        elif library is not None:
+            collision_rows, collision_cols, collision_distances = library.rows, library.cols, library.distances
+        elif job_collisions is not None and search_threshold <= job_threshold:
+            collision_rows, collision_cols, collision_distances = job_collisions
+        elif store is not None:
+            with perf.stage("collision scan", pairs=num_pairs):
+                collision_rows, collision_cols, collision_distances = cached_store_collisions(set_key, search_threshold, store)
+        else:
+            with perf.stage("collision search", pairs=num_pairs):
+                collision_rows, collision_cols, collision_distances = cached_find_collisions(set_key, search_threshold, sequences)
+        
+        # Distance distribution: exact for every distance from the summary, otherwise up to the search threshold
+        st.markdown('<h3 class="sub-header">📊 Distance Distribution</h3>', unsafe_allow_html=True)
+        if summary is not None:
+            histogram_fig = create_distance_histogram_plot(summary.histogram, threshold, metric)
+        else:
+            histogram_fig = create_distance_histogram_plot(np.bincount(collision_distances, minlength=max_threshold + 1),
+                                                           threshold, metric, capped_at=max_threshold)
+        st.plotly_chart(histogram_fig, use_container_width=True)
+        
+        with perf.stage("threshold filter", pairs=len(collision_distances)):
+            within = collision_distances <= threshold
+            if not within.all():
+                collision_rows, collision_cols, collision_distances = \
+                    collision_rows[within], collision_cols[within], collision_distances[within]
+                if component_distances:
+                    component_distances = {name: values[within] for name, values in component_distances.items()}
+        if summary is not None:
+            total_collision_pairs = summary.pairs_within(threshold)
+            red_collision_count = summary.pairs_within(threshold - 1)
+            involved_count = summary.sequences_within(threshold)
+        else:
+            total_collision_pairs = len(collision_distances)
+            red_collision_count = int((collision_distances < threshold).sum())
+            involved_count = len(np.union1d(collision_rows, collision_cols))
+        orange_collision_count = total_collision_pairs - red_collision_count
+        
+        # Barcode Collisions - sequences with distance <= threshold, each pair once
         st.markdown('<h3 class="sub-header">⚠️ Barcode Collisions</h3>', unsafe_allow_html=True)
         
-        # Find unique collision pairs (distance <= 2) - no duplicates
-        collision_pairs = []
-        red_collision_count = 0
-        orange_collision_count = 0
-        
-        for i in range(len(sequences)):
-            for j in range(i+1, len(sequences)):
-                distance = calculate_hamming_distance(sequences[i], sequences[j])
-                
-                if distance <= 2:  # Collision detected
-                    collision_type = "🔴 Red" if distance < 2 else "🟠 Orange"
-                    collision_color = "Red" if distance < 2 else "Orange"
-                    
-                    if distance < 2:
-                        red_collision_count += 1
-                    else:
-                        orange_collision_count += 1
-                    
-                    collision_pairs.append({
-                        'Sequence 1': f'Seq_{i+1}',
-                        'Sequence 1 DNA': sequences[i],
-                        'Sequence 2': f'Seq_{j+1}',
-                        'Sequence 2 DNA': sequences[j],
-                        'Distance': distance,
-                        'Risk Level': collision_type,
-                        'Color Category': collision_color
-                    })
-        
-        if collision_pairs:
-            st.markdown("""
+        if total_collision_pairs:
+            st.markdown(f"""
             <div class="error-box">
-                <strong>⚠️ Collision Alert:</strong> Found sequence pairs with insufficient distance (≤2). These may cause barcode conflicts in multiplexed applications.
+                <strong>⚠️ Collision Alert:</strong> Found sequence pairs with insufficient distance (≤{threshold}). These may cause barcode conflicts in multiplexed applications.
             </div>
             """, unsafe_allow_html=True)
             
-            # Create collision dataframe - each row is a unique collision pair
-            collision_df = pd.DataFrame(collision_pairs)
-            collision_df = collision_df.sort_values('Distance')  # Sort by distance (most critical first)
-            
-            # Style the collision dataframe based on risk level
-            def highlight_collision_severity(row):
-                if row['Color Category'] == 'Red':  # Distance < 2 - highest severity
-                    return ['background-color: rgba(255, 68, 68, 0.3)'] * len(row)  # Red highlight
-                else:  # Distance = 2 - medium severity
-                    return ['background-color: rgba(255, 165, 0, 0.3)'] * len(row)  # Orange highlight
+            # Sort by distance (most critical first) and show one page at a time
+            collision_order = np.argsort(collision_distances, kind='stable')
+            col1, col2 = st.columns(2)
+            with col1:
+                page_size = st.selectbox("Rows per page:", COLLISION_PAGE_SIZES)
+            num_pages = max(1, -(-len(collision_order) // page_size))
+            with col2:
+                page = st.number_input(f"Page (of {num_pages}):", min_value=1, max_value=num_pages, value=1)
             
-            styled_collision_df = collision_df.style.apply(highlight_collision_severity, axis=1)
-            st.dataframe(styled_collision_df, use_container_width=True)
+            page_order = collision_order[(page - 1) * page_size:page * page_size]
+            with perf.stage("collision table", pairs=len(page_order)):
+                collision_df = build_collision_table(sequences, collision_rows, collision_cols, collision_distances, page_order,
+                                                     component_distances, threshold)
+            with perf.stage("table styling", pairs=len(page_order)):
+                styled_collision_df = collision_df.style.apply(highlight_collision_severity, axis=None)
+                st.dataframe(styled_collision_df, use_container_width=True)
             
             # Collision summary statistics
             col1, col2, col3 = st.columns(3)
             
-            total_collision_pairs = len(collision_pairs)
-            unique_sequences = set()
-            for pair in collision_pairs:
-                unique_sequences.add(pair['Sequence 1'])
-                unique_sequences.add(pair['Sequence 2'])
-            
             with col1:
                 st.metric("⚠️ Total Collision Pairs", total_collision_pairs)
             with col2:
-                st.metric("🔴 Red Collisions (< 2)", red_collision_count)
+                st.metric(f"🔴 Red Collisions (< {threshold})", red_collision_count)
             with col3:
-                st.metric("🟠 Orange Collisions (= 2)", orange_collision_count)
+                st.metric(f"🟠 Orange Collisions (= {threshold})", orange_collision_count)
             
             # Additional info about affected sequences
             st.markdown(f"""
             <div class="info-box">
-                <strong>📊 Impact Summary:</strong> {len(unique_sequences)} out of {len(sequences)} sequences are involved in collisions.
+                <strong>📊 Impact Summary:</strong> {involved_count} out of {len(sequences)} sequences are involved in collisions.
             </div>
             """, unsafe_allow_html=True)
+            
+            # Suggest which barcodes to drop so the rest are collision-free
+            st.markdown('<h3 class="sub-header">🧩 Collision-Free Subset</h3>', unsafe_allow_html=True)
+            col1, col2 = st.columns(2)
+            with col1:
+                min_distance = st.selectbox(
+                    "Minimum distance between kept barcodes:",
+                    list(range(1, threshold + 2)),
+                    index=threshold,
+                    help="Pairs closer than this conflict; one barcode of every such pair is dropped"
+                )
+            with col2:
+                search_seconds = st.slider(
+                    "Local search time (s):", 0.0, 10.0, 0.0, 0.5,
+                    help="Extra time spent improving the greedy selection (0 keeps the greedy result)"
+                )
+            
+            num_conflicts = int((collision_distances < min_distance).sum())
+            with perf.stage("collision-free subset", pairs=num_conflicts):
+                kept, dropped = cached_collision_free(set_key, min_distance, search_seconds, len(sequences),
+                                                      collision_rows, collision_cols, collision_distances)
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("✅ Kept Barcodes", len(kept))
+                st.download_button("Download kept barcodes", format_sequence_list(sequences, kept),
+                                   file_name="kept_barcodes.txt", mime="text/plain")
+            with col2:
+                st.metric("🗑️ Dropped Barcodes", len(dropped))
+                st.download_button("Download dropped barcodes", format_sequence_list(sequences, dropped),
+                                   file_name="dropped_barcodes.txt", mime="text/plain")
         
         else:
-            st.markdown("""
+            st.markdown(f"""
             <div class="success-box">
-                <strong>✅ No Collisions Detected:</strong> All sequences have sufficient distance (> 2) for barcode applications.
+                <strong>✅ No Collisions Detected:</strong> All sequences have sufficient distance (> {threshold}) for barcode applications.
             </div>
             """, unsafe_allow_html=True)
         
+        # Per-barcode screening: closest neighbour of every barcode, without the full matrix
+        st.markdown('<h3 class="sub-header">🧭 Closest Neighbours</h3>', unsafe_allow_html=True)
+        if metric == 'hamming':
+            # A library only keeps each barcode's closest neighbour; more would rescan every pair
+            num_neighbors = st.selectbox("Neighbours per barcode:", [1] if library is not None else [1, 2, 3, 5, 10],
+                                         help="Barcodes are listed by the distance to their closest neighbour")
+            with perf.stage("nearest neighbours", pairs=num_pairs):
+                neighbor_distances, neighbor_indices = cached_nearest_neighbors(set_key, num_neighbors, sequences, summary)
+            with perf.stage("neighbour table", pairs=len(sequences)):
+                neighbor_df = build_neighbor_table(sequences, neighbor_distances, neighbor_indices, threshold)
+            
+            risk_counts = neighbor_df['Risk Level'].value_counts()
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric(f"🔴 Barcodes at Risk (< {threshold})", int(risk_counts.get("🔴 Red", 0)))
+            with col2:
+                st.metric(f"🟠 Barcodes to Watch ({threshold}-{threshold + 1})", int(risk_counts.get("🟠 Orange", 0)))
+            with col3:
+                st.metric(f"🔵 Safe Barcodes (≥ {threshold + 2})", int(risk_counts.get("🔵 Blue", 0)))
+            st.dataframe(neighbor_df, use_container_width=True)
+        else:
+            st.info("The closest neighbour summary uses Hamming distance.")
+        
         # Display distance matrix
         st.markdown('<h3 class="sub-header">🎯 Distance Matrix</h3>', unsafe_allow_html=True)
         
-        # Create and display the heatmap
-        fig = create_distance_matrix_plot(sequences)
-        st.plotly_chart(fig, use_container_width=True)
+        # Create and display the heatmap; joined 'I7+I5' pairs line up at the '+',
+        # so their Hamming distance is exactly the combined distance of both indexes
+        if len(sequences) <= HEATMAP_DETAIL_MAX:
+            with perf.stage("distance matrix", pairs=num_pairs):
+                if metric == 'edit':
+                    distances = cached_edit_distance_matrix(set_key, sequences)
+                elif store is not None:
+                    distances = store
+                elif library is not None and not index_pairs:
+                    distances = library.distance_matrix()
+                else:
+                    distances = cached_distance_matrix(set_key, sequences, workers)
+            with perf.stage("heatmap figure"):
+                fig = create_distance_matrix_plot(sequences, distances=distances, metric=metric)
+        else:
+            # Without a summary or store, only pairs within the collision threshold are known
+            capped_tiles = metric == 'edit' or bool(index_pairs and store is None)
+            with perf.stage("heatmap tiles", pairs=num_pairs):
+                if summary is not None:
+                    minima = summary.tile_minima
+                elif capped_tiles:
+                    minima = tile_minima_from_pairs(len(sequences), tile_size, collision_rows, collision_cols,
+                                                    collision_distances, threshold + 1)
+                elif store is not None:
+                    minima = cached_store_tile_minima(set_key, tile_size, store)
+                else:
+                    minima = cached_tile_minima(set_key, tile_size, sequences)
+            with perf.stage("heatmap figure"):
+                fig = create_tile_minimum_plot(minima, tile_size, len(sequences), metric,
+                                               capped_at=threshold if capped_tiles else None)
+        with perf.stage("heatmap serialization"):
+            st.plotly_chart(fig, use_container_width=True)
+        if store is not None and isinstance(store.condensed, np.memmap):
+            st.caption(f"Distances read from {store.condensed.filename} ({store.condensed.nbytes / 1e6:,.1f} MB)")
+        
+        if len(sequences) > HEATMAP_DETAIL_MAX:
+            
+            # Drill down into one block at full resolution
+            st.markdown("**Block detail:** pick a block of the aggregated view to inspect every pair.")
+            num_tiles = minima.shape[0]
+            col1, col2 = st.columns(2)
+            with col1:
+                row_tile = st.number_input("Row block:", min_value=1, max_value=num_tiles, value=1)
+            with col2:
+                col_tile = st.number_input("Column block:", min_value=1, max_value=num_tiles, value=1)
+            
+            row_start, col_start = (row_tile - 1) * tile_size, (col_tile - 1) * tile_size
+            row_stop, col_stop = min(row_start + tile_size, len(sequences)), min(col_start + tile_size, len(sequences))
+            with perf.stage("block detail", pairs=(row_stop - row_start) * (col_stop - col_start)):
+                detail_fig = create_distance_block_plot(sequences, (row_start, row_stop), (col_start, col_stop), metric,
+                                                        distances=store)
+                st.plotly_chart(detail_fig, use_container_width=True)
+        
+        # Reports are written chunk by chunk from the index and distance arrays
+        reports = {}
+        if total_collision_pairs:
+            export_components = {name.lower().replace(' ', '_'): values
+                                 for name, values in (component_distances or {}).items()}
+            reports["Collision pairs"] = ("collisions", lambda out, output_format: write_collision_report(
+                out, output_format, sequences, collision_rows, collision_cols, collision_distances,
+                export_components, order=collision_order))
+        if metric == 'hamming':
+            reports["Closest neighbours"] = ("closest_neighbours", lambda out, output_format: write_neighbor_report(
+                out, output_format, sequences, neighbor_distances, neighbor_indices))
+        if num_pairs <= MAX_MATRIX_EXPORT_PAIRS:
+            def write_matrix(out: io.BytesIO, output_format: str) -> int:
+                if metric == 'edit':
+                    matrix = cached_edit_distance_matrix(set_key, sequences)
+                else:
+                    matrix = store if store is not None else cached_distance_matrix(set_key, sequences, workers)
+                return write_distance_matrix_report(out, output_format, sequences, matrix)
+            reports["Distance matrix"] = ("distance_matrix", write_matrix)
+        if reports:
+            st.markdown('<h3 class="sub-header">📤 Export</h3>', unsafe_allow_html=True)
+            show_report_export(reports, (set_key, metric, threshold, num_neighbors if metric == 'hamming' else None), perf)
     
     else:
         st.markdown("""
@@ -837,6 +2022,11 @@ def main():
             </ul>
         </div>
         """, unsafe_allow_html=True)
+    
+    if sequences and metric == 'hamming' and not dual_index:
+        show_demultiplexing_simulator(sequences)
+    show_barcode_generator([] if dual_index else sequences)
+    show_performance_panel(perf)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
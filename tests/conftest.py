@@ -0,0 +1,55 @@
+"""Shared fixtures for the barcode core tests."""
+import os
+import sys
+from typing import List, Tuple
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def random_barcodes(n: int, length: int, seed: int = 0, duplicates: int = 0) -> List[str]:
+    """Uniformly random barcodes, with the first `duplicates` repeated at the end."""
+    rng = np.random.default_rng(seed)
+    sequences = [''.join(row) for row in np.array(list('ACGT'))[rng.integers(0, 4, size=(n, length))]]
+    return sequences + sequences[:duplicates]
+
+def brute_force_hamming(sequences1: List[str], sequences2: List[str]) -> np.ndarray:
+    """Full (n1 x n2) Hamming distance matrix, one pair at a time."""
+    return np.array([[sum(a != b for a, b in zip(s, t)) for t in sequences2] for s in sequences1],
+                    dtype=np.int64).reshape(len(sequences1), len(sequences2))
+
+def brute_force_edit(s: str, t: str) -> int:
+    """Levenshtein distance by the textbook dynamic programme."""
+    previous = list(range(len(t) + 1))
+    for i, a in enumerate(s, 1):
+        current = [i]
+        for j, b in enumerate(t, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a != b)))
+        previous = current
+    return previous[-1]
+
+def brute_force_pairs(full: np.ndarray, threshold: int, upper: bool = True
+                      ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(rows, cols, distances) of a full distance matrix within a threshold, ordered by (i, j)."""
+    within = full <= threshold
+    if upper:
+        within &= np.triu(np.ones(full.shape, dtype=bool), k=1)
+    rows, cols = np.nonzero(within)
+    return rows, cols, full[rows, cols]
+
+def brute_force_tile_minima(full: np.ndarray, tile_size: int) -> np.ndarray:
+    """Minimum of every tile_size x tile_size tile of a full distance matrix."""
+    n1, n2 = full.shape
+    return np.array([[full[i:i + tile_size, j:j + tile_size].min() for j in range(0, n2, tile_size)]
+                     for i in range(0, n1, tile_size)])
+
+def assert_pairs_equal(found: Tuple[np.ndarray, ...], expected: Tuple[np.ndarray, ...]) -> None:
+    """Compare collision search results array by array."""
+    assert len(found) == len(expected)
+    for values, expected_values in zip(found, expected):
+        assert np.array_equal(values, expected_values)
+
+@pytest.fixture
+def barcodes() -> List[str]:
+    return random_barcodes(150, 8, seed=1, duplicates=3)
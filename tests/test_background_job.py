@@ -0,0 +1,55 @@
+import threading
+
+import numpy as np
+import pytest
+
+from barcode_core import BackgroundJob, JobCancelled
+
+def count_up(job, steps):
+    for step in range(steps):
+        job.report((step + 1) / steps, stage="counting", partial=(np.array([step]), np.array([step * 2])))
+    return steps
+
+def test_completed_job_returns_its_result():
+    job = BackgroundJob(count_up, 5)
+    assert job.result() == 5
+    assert job.done and not job.cancelled
+    assert job.progress == 1.0 and job.stage == "counting"
+    rows, doubled = job.partial_results()
+    assert rows.tolist() == [0, 1, 2, 3, 4] and doubled.tolist() == [0, 2, 4, 6, 8]
+
+def test_cancel_stops_the_job_at_its_next_report():
+    started = threading.Event()
+    
+    def run_until_cancelled(job):
+        started.set()
+        while True:
+            job.report(0.5, partial=(np.array([1]),))
+    
+    job = BackgroundJob(run_until_cancelled)
+    assert started.wait(5)
+    job.cancel()
+    assert job.wait(5)
+    assert job.cancelled and job.done
+    with pytest.raises(JobCancelled):
+        job.result()
+    assert len(job.partial_results()[0]) >= 1
+
+def test_errors_in_the_job_are_raised_by_result():
+    def fail(job):
+        job.report(0.25, stage="allocating")
+        raise MemoryError("Unable to allocate")
+    
+    job = BackgroundJob(fail)
+    assert job.wait(5)
+    assert job.progress == 0.25 and not job.cancelled
+    with pytest.raises(MemoryError, match="Unable to allocate"):
+        job.result()
+
+def test_partial_results_before_any_report():
+    gate = threading.Event()
+    job = BackgroundJob(lambda job: gate.wait(5))
+    assert job.partial_results() == ()
+    assert not job.done
+    gate.set()
+    assert job.result() is True
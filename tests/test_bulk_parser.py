@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from barcode_core import bulk_parse_sequences, parse_sequence_line, parse_text, validate_dna_sequence
+
+def line_by_line(text, first_line=1):
+    """Reference: validate one stripped line at a time, as the original parser did."""
+    sequences, invalid = [], []
+    for number, line in enumerate(text.split('\n'), first_line):
+        line = line.strip()
+        if not line:
+            continue
+        _, sequence = parse_sequence_line(line)
+        if validate_dna_sequence(sequence):
+            sequences.append(sequence.upper())
+        else:
+            invalid.append((number, sequence))
+    return sequences, invalid
+
+PIECES = ['ACGT', 'acgt', 'GATTACA', 'S1:', ' label:', ':', ' ', '\t', '\r', 'N', 'X', 'é', ' ', ' ', ',', '']
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_the_line_by_line_parser(seed):
+    rng = np.random.default_rng(seed)
+    lines = [''.join(rng.choice(PIECES, size=rng.integers(0, 5))) for _ in range(500)]
+    text = '\n'.join(lines)
+    assert bulk_parse_sequences(text, first_line=7) == line_by_line(text, first_line=7)
+
+def test_labels_and_blank_lines():
+    text = "ACGT\n\n  \nS2: ttgg \nlabel ACGTAC x\nACGT ACGT\nbad\n"
+    assert bulk_parse_sequences(text) == (['ACGT', 'TTGG', 'ACGTAC', 'ACGT'], [(7, 'bad')])
+
+def test_unicode_whitespace_lines_are_blank():
+    assert bulk_parse_sequences("ACGT\n \n 　\nTTTT") == (['ACGT', 'TTTT'], [])
+
+def test_parse_text_strips_the_input():
+    assert parse_text("\n\n  acgt\nTTTT\n\n") == (['ACGT', 'TTTT'], [])
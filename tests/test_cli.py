@@ -0,0 +1,103 @@
+import gzip
+import io
+import json
+
+import numpy as np
+import pytest
+
+from barcode_cli import main
+from barcode_core import find_collisions
+from conftest import brute_force_hamming, brute_force_pairs
+
+@pytest.fixture
+def barcode_file(tmp_path, barcodes):
+    path = tmp_path / 'barcodes.txt'
+    path.write_text('\n'.join(barcodes) + '\n')
+    return path
+
+def read_tsv(text):
+    header, *rows = text.strip('\n').split('\n')
+    return header.split('\t'), [row.split('\t') for row in rows]
+
+def test_tsv_collisions_match_brute_force(barcode_file, barcodes, capsys):
+    assert main([str(barcode_file), '--threshold', '2']) == 0
+    out, err = capsys.readouterr()
+    header, rows = read_tsv(out)
+    assert header == ['sequence_1', 'sequence_1_dna', 'sequence_2', 'sequence_2_dna', 'distance']
+    expected_rows, expected_cols, expected_distances = brute_force_pairs(brute_force_hamming(barcodes, barcodes), 2)
+    assert [(row[0], row[2], int(row[4])) for row in rows] == \
+        [(f'Seq_{i+1}', f'Seq_{j+1}', d) for i, j, d in zip(expected_rows, expected_cols, expected_distances)]
+    assert all(row[1] == barcodes[int(row[0][4:]) - 1] for row in rows)
+    assert f"{len(rows)} collision pairs among {len(barcodes)} sequences (threshold 2)" in err
+
+def test_json_output_file(tmp_path, barcode_file, barcodes):
+    output = tmp_path / 'collisions.json'
+    assert main([str(barcode_file), '-t', '1', '-f', 'json', '-o', str(output)]) == 0
+    report = json.loads(output.read_text())
+    assert report['sequences'] == len(barcodes) and report['threshold'] == 1 and report['metric'] == 'hamming'
+    assert len(report['collisions']) == len(find_collisions(barcodes, 1)[0])
+
+def test_gzipped_fasta_and_stdin(tmp_path, monkeypatch, capsys):
+    path = tmp_path / 'set.fa.gz'
+    path.write_bytes(gzip.compress(b">a\nACGTACGT\n>b\nACGTACGA\n"))
+    monkeypatch.setattr('sys.stdin', io.StringIO("TTTTTTTT\nACGTACGG\n"))
+    assert main([str(path), '-', '-t', '1']) == 0
+    _, rows = read_tsv(capsys.readouterr().out)
+    assert [(row[0], row[2]) for row in rows] == [('Seq_1', 'Seq_2'), ('Seq_1', 'Seq_4'), ('Seq_2', 'Seq_4')]
+
+def test_invalid_lines_and_mixed_lengths(tmp_path, capsys):
+    path = tmp_path / 'bad.txt'
+    path.write_text("ACGT\nnot dna\nACGTA\n")
+    assert main([str(path)]) == 1
+    err = capsys.readouterr().err
+    assert f"{path}:2: invalid DNA sequence: not dna" in err
+    assert "same length" in err
+    path.write_text("")
+    assert main([str(path)]) == 1
+
+def test_edit_metric_accepts_mixed_lengths(tmp_path, capsys):
+    path = tmp_path / 'mixed.txt'
+    path.write_text("ACGTACGT\nACGTACG\nTTTTGGGG\n")
+    assert main([str(path), '-m', 'edit', '-t', '1']) == 0
+    _, rows = read_tsv(capsys.readouterr().out)
+    assert rows == [['Seq_1', 'ACGTACGT', 'Seq_2', 'ACGTACG', '1']]
+
+def test_dual_index_writes_per_index_distances(tmp_path, capsys):
+    path = tmp_path / 'pairs.csv'
+    path.write_text("S1,ACGT,TTTT\nS2,ACGA,TTTT\nS3,GGGG,CCCC\n")
+    assert main([str(path), '--dual-index', '-t', '1']) == 0
+    header, rows = read_tsv(capsys.readouterr().out)
+    assert header[-3:] == ['i7_distance', 'i5_distance', 'distance']
+    assert rows == [['Seq_1', 'ACGT+TTTT', 'Seq_2', 'ACGA+TTTT', '1', '0', '1']]
+
+def test_nearest_neighbours(barcode_file, barcodes, capsys):
+    assert main([str(barcode_file), '--nearest', '2']) == 0
+    header, rows = read_tsv(capsys.readouterr().out)
+    assert header[:6] == ['sequence', 'sequence_dna', 'risk', 'neighbor_1', 'neighbor_1_dna', 'distance_1']
+    full = brute_force_hamming(barcodes, barcodes)
+    np.fill_diagonal(full, len(barcodes[0]) + 1)
+    assert [int(row[5]) for row in rows] == full.min(axis=1).tolist()
+
+@pytest.mark.parametrize("threshold", [0, 1, 3])
+def test_nearest_risk_follows_the_threshold(barcode_file, barcodes, capsys, threshold):
+    assert main([str(barcode_file), '--nearest', '1', '-t', str(threshold), '-f', 'json']) == 0
+    out, err = capsys.readouterr()
+    report = json.loads(out)
+    assert report['threshold'] == threshold
+    full = brute_force_hamming(barcodes, barcodes)
+    np.fill_diagonal(full, len(barcodes[0]) + 1)
+    nearest = full.min(axis=1)
+    expected = np.where(nearest < threshold, 'red', np.where(nearest <= threshold + 1, 'orange', 'blue'))
+    assert [row['risk'] for row in report['nearest']] == expected.tolist()
+    # Counted like the collision report: every barcode in a pair within the threshold
+    involved = len(set(np.concatenate(brute_force_pairs(full, threshold)[:2]).tolist()))
+    assert f"{involved} of {len(barcodes)} sequences have a neighbour at distance <= {threshold} (threshold {threshold})" in err
+
+def test_generate(tmp_path, barcode_file, barcodes, capsys):
+    assert main([str(barcode_file), '--generate', '10', '--min-distance', '3', '--seed', '1']) == 0
+    out, err = capsys.readouterr()
+    generated = [line.split(': ')[1] for line in out.splitlines()]
+    assert len(generated) == 10
+    assert brute_force_hamming(generated, barcodes).min() >= 3
+    assert "Generated 10 of 10 barcodes at distance >= 3" in err
+    assert main(['--generate', '5']) == 1
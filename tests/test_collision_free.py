@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from barcode_core import select_collision_free
+from conftest import brute_force_hamming, brute_force_pairs
+
+@pytest.mark.parametrize("time_budget", [0.0, 0.05])
+def test_keeps_a_maximal_collision_free_subset(barcodes, time_budget):
+    full = brute_force_hamming(barcodes, barcodes)
+    rows, cols, _ = brute_force_pairs(full, 3)
+    kept, dropped = select_collision_free(len(barcodes), rows, cols, time_budget)
+    assert np.array_equal(np.sort(np.concatenate((kept, dropped))), np.arange(len(barcodes)))
+    # No two kept barcodes conflict, and every dropped one conflicts with a kept one
+    kept_full = full[np.ix_(kept, kept)]
+    np.fill_diagonal(kept_full, 4)
+    assert (kept_full > 3).all()
+    assert all((full[i, kept] <= 3).any() for i in dropped)
+
+def test_local_search_never_keeps_fewer(barcodes):
+    full = brute_force_hamming(barcodes, barcodes)
+    rows, cols, _ = brute_force_pairs(full, 4)
+    greedy, _ = select_collision_free(len(barcodes), rows, cols)
+    improved, _ = select_collision_free(len(barcodes), rows, cols, 0.05)
+    assert len(improved) >= len(greedy)
+
+def test_keeps_everything_without_conflicts():
+    empty = np.zeros(0, dtype=np.int64)
+    kept, dropped = select_collision_free(5, empty, empty)
+    assert np.array_equal(kept, np.arange(5)) and len(dropped) == 0
+
+def test_star_keeps_the_leaves():
+    # Dropping the centre keeps four barcodes instead of one
+    kept, dropped = select_collision_free(5, np.zeros(4, dtype=np.int64), np.arange(1, 5))
+    assert np.array_equal(kept, [1, 2, 3, 4]) and np.array_equal(dropped, [0])
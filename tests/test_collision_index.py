@@ -0,0 +1,69 @@
+import io
+
+import numpy as np
+import pytest
+
+from barcode_core import CollisionIndex, compute_distance_summary, find_nearest_neighbors
+from conftest import assert_pairs_equal, brute_force_hamming, brute_force_pairs, random_barcodes
+
+def test_append_matches_a_full_build(barcodes):
+    threshold = 2
+    index = CollisionIndex.build(barcodes[:60], threshold)
+    index.append(barcodes[60:61])
+    index.append(barcodes[61:])
+    full = brute_force_hamming(barcodes, barcodes)
+    assert index.sequences == barcodes
+    assert_pairs_equal((index.rows, index.cols, index.distances), brute_force_pairs(full, threshold))
+    
+    summary = compute_distance_summary(barcodes, tile_size=1)
+    distances, indices = find_nearest_neighbors(barcodes)
+    assert np.array_equal(index.histogram, summary.histogram)
+    assert np.array_equal(index.nearest_distances, distances[:, 0])
+    assert np.array_equal(index.nearest_indices, indices[:, 0])
+    assert np.array_equal(index.tile_minima, summary.tile_minima)
+    assert np.array_equal(index.distance_matrix().condensed, full[np.triu_indices(len(barcodes), k=1)])
+
+def test_append_returns_the_new_pairs(barcodes):
+    index = CollisionIndex.build(barcodes[:100], 1)
+    before = len(index.distances)
+    assert index.append(barcodes[100:]) == len(index.distances) - before
+    assert index.append([]) == 0
+
+def test_tiles_grow_with_the_library(monkeypatch):
+    monkeypatch.setattr('barcode_core.LIBRARY_MAX_TILES', 16)
+    sequences = random_barcodes(300, 6, seed=5, duplicates=6)
+    index = CollisionIndex.build(sequences[:100], 1)
+    index.append(sequences[100:])
+    assert index.tile_size == 32
+    tile_size = index.heatmap_tile_size(40)
+    assert tile_size == 64
+    assert np.array_equal(index.summary(tile_size).tile_minima,
+                          compute_distance_summary(sequences, tile_size=tile_size).tile_minima)
+    with pytest.raises(ValueError):
+        index.summary(40)
+    with pytest.raises(ValueError):
+        index.distance_matrix()
+
+def test_append_rejects_other_lengths(barcodes):
+    index = CollisionIndex.build(barcodes, 2)
+    with pytest.raises(ValueError):
+        index.append(['ACGT'])
+
+def test_save_and_load(barcodes):
+    index = CollisionIndex.build(barcodes[:100], 2)
+    index.append(barcodes[100:])
+    buffer = io.BytesIO()
+    index.save(buffer)
+    buffer.seek(0)
+    loaded = CollisionIndex.load(buffer)
+    assert loaded.sequences == index.sequences and loaded.threshold == index.threshold
+    assert loaded.tile_size == index.tile_size
+    for name in ('rows', 'cols', 'distances', 'histogram', 'nearest_distances', 'nearest_indices', 'tile_minima'):
+        assert np.array_equal(getattr(loaded, name), getattr(index, name)), name
+    
+    # Appending to a loaded index carries on where the saved one stopped
+    extra = random_barcodes(20, 8, seed=9)
+    loaded.append(extra)
+    full = brute_force_hamming(barcodes + extra, barcodes + extra)
+    assert_pairs_equal((loaded.rows, loaded.cols, loaded.distances), brute_force_pairs(full, 2))
+    assert np.array_equal(loaded.histogram, compute_distance_summary(barcodes + extra).histogram)
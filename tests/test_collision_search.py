@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from barcode_core import find_collisions, segment_bounds
+from conftest import assert_pairs_equal, brute_force_hamming, brute_force_pairs, random_barcodes
+
+@pytest.mark.parametrize("length", [6, 8, 40])
+@pytest.mark.parametrize("threshold", [0, 1, 2, 3])
+def test_find_collisions_matches_brute_force(length, threshold):
+    sequences = random_barcodes(200, length, seed=length, duplicates=4)
+    full = brute_force_hamming(sequences, sequences)
+    assert_pairs_equal(find_collisions(sequences, threshold), brute_force_pairs(full, threshold))
+
+def test_threshold_at_or_above_the_length_reports_every_pair():
+    sequences = random_barcodes(30, 4, seed=2)
+    rows, cols, _ = find_collisions(sequences, 4)
+    assert len(rows) == 30 * 29 // 2
+
+def test_segments_cover_the_barcode():
+    for length, threshold in [(8, 0), (8, 2), (10, 3), (40, 5)]:
+        bounds = segment_bounds(length, threshold)
+        assert bounds[0] == 0 and bounds[-1] == length
+        assert len(bounds) - 1 == threshold + 1
+        assert all(b > a for a, b in zip(bounds, bounds[1:]))
+
+def test_tiny_inputs():
+    for sequences in ([], ['ACGT']):
+        assert all(len(values) == 0 for values in find_collisions(sequences, 2))
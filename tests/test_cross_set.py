@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from barcode_core import compute_cross_distance_summary, find_cross_collisions
+from conftest import assert_pairs_equal, brute_force_hamming, brute_force_pairs, brute_force_tile_minima, random_barcodes
+
+@pytest.mark.parametrize("length", [6, 40])
+@pytest.mark.parametrize("threshold", [0, 2])
+def test_find_cross_collisions_matches_brute_force(length, threshold):
+    sequences1 = random_barcodes(120, length, seed=1)
+    sequences2 = random_barcodes(90, length, seed=2) + sequences1[:3]
+    full = brute_force_hamming(sequences1, sequences2)
+    assert_pairs_equal(find_cross_collisions(sequences1, sequences2, threshold),
+                       brute_force_pairs(full, threshold, upper=False))
+
+def test_find_cross_collisions_with_an_empty_set():
+    assert all(len(values) == 0 for values in find_cross_collisions(random_barcodes(5, 8), [], 2))
+
+@pytest.mark.parametrize("length", [8, 40])
+def test_cross_distance_summary_matches_brute_force(length):
+    sequences1 = random_barcodes(70, length, seed=1)
+    sequences2 = random_barcodes(45, length, seed=2) + sequences1[:2]
+    full = brute_force_hamming(sequences1, sequences2)
+    summary = compute_cross_distance_summary(sequences1, sequences2, tile_size=8, block_size=5)
+    
+    assert np.array_equal(summary.histogram, np.bincount(full.ravel(), minlength=length + 1))
+    assert np.array_equal(summary.nearest_distances, np.concatenate((full.min(axis=1), full.min(axis=0))))
+    assert np.array_equal(summary.nearest_indices, np.concatenate((full.argmin(axis=1), full.argmin(axis=0))))
+    assert np.array_equal(summary.tile_minima, brute_force_tile_minima(full, 8))
+
+def test_cross_distance_summary_rejects_other_lengths():
+    with pytest.raises(ValueError):
+        compute_cross_distance_summary(random_barcodes(3, 8), random_barcodes(3, 6))
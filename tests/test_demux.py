@@ -0,0 +1,71 @@
+import gzip
+import io
+
+import numpy as np
+import pytest
+
+from barcode_core import (AMBIGUOUS, UNASSIGNED, DemuxCounts, DemuxTable, encode_sequences, iter_fastq_index_reads,
+                          iter_synthetic_index_reads)
+from conftest import brute_force_hamming, random_barcodes
+
+def brute_force_assign(barcodes, reads, max_mismatches):
+    full = brute_force_hamming(reads, barcodes)
+    best = full.min(axis=1)
+    ties = (full == best[:, np.newaxis]).sum(axis=1)
+    owners = np.where(best <= max_mismatches, np.where(ties == 1, full.argmin(axis=1), AMBIGUOUS), UNASSIGNED)
+    return owners, np.where(best <= max_mismatches, best, 0)
+
+def random_reads(barcodes, num_reads, seed):
+    """Reads from the barcodes with 0-2 substitutions, some holding an N."""
+    rng = np.random.default_rng(seed)
+    reads = encode_sequences(barcodes)[rng.integers(0, len(barcodes), size=num_reads)]
+    for _ in range(2):
+        rows = np.flatnonzero(rng.random(num_reads) < 0.5)
+        bases = rng.choice(np.frombuffer(b'ACGT', dtype=np.uint8), size=len(rows))
+        reads[rows, rng.integers(0, reads.shape[1], size=len(rows))] = bases
+    rows = np.flatnonzero(rng.random(num_reads) < 0.1)
+    reads[rows, rng.integers(0, reads.shape[1], size=len(rows))] = ord('N')
+    return reads
+
+# Length 6 uses the direct-address table, length 14 the sorted keys
+@pytest.mark.parametrize("length", [6, 14])
+@pytest.mark.parametrize("max_mismatches", [0, 1])
+def test_assign_matches_brute_force(length, max_mismatches):
+    barcodes = random_barcodes(40, length, seed=length)
+    # A near pair makes some one-mismatch variants ambiguous
+    barcodes.append(barcodes[0][:-1] + ('A' if barcodes[0][-1] != 'A' else 'C'))
+    table = DemuxTable.build(barcodes, max_mismatches)
+    reads = random_reads(barcodes, 2_000, seed=length + max_mismatches)
+    owners, mismatches = table.assign(reads)
+    expected_owners, expected_mismatches = brute_force_assign(barcodes, [row.tobytes().decode() for row in reads],
+                                                              max_mismatches)
+    assert np.array_equal(owners, expected_owners)
+    assert np.array_equal(mismatches, expected_mismatches)
+
+def test_build_rejects_other_tolerances():
+    with pytest.raises(ValueError):
+        DemuxTable.build(random_barcodes(4, 8), 2)
+
+def test_counts_add_up_over_batches():
+    barcodes = random_barcodes(30, 8, seed=7)
+    table = DemuxTable.build(barcodes, 1)
+    counts = DemuxCounts.empty(len(barcodes), with_origins=True)
+    for reads, origins in iter_synthetic_index_reads(barcodes, 5_000, 0.05, seed=1, batch_size=1_000):
+        owners, mismatches = table.assign(reads)
+        counts.add(owners, mismatches, origins)
+    assert counts.reads == 5_000 == int(counts.origin_reads.sum())
+    assert int(counts.assigned.sum()) + counts.ambiguous + counts.unassigned == counts.reads
+    assert int((counts.correct + counts.misassigned + counts.origin_ambiguous + counts.origin_lost).sum()) == counts.reads
+    assert (counts.exact <= counts.assigned).all()
+
+@pytest.mark.parametrize("name", ["reads.fastq", "reads.fastq.gz"])
+def test_iter_fastq_index_reads(name):
+    records = [('ACGTACGTTT', 'IIIIIIIIII'), ('ACG', 'III'), ('TTTTGGGGCC', 'IIIIIIIIII')]
+    text = ''.join(f"@r{i}\n{seq}\n+\n{quality}\n" for i, (seq, quality) in enumerate(records)).encode()
+    file = io.BytesIO(gzip.compress(text) if name.endswith('.gz') else text)
+    file.name = name
+    batches = list(iter_fastq_index_reads(file, 8, batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 1]
+    # Short reads are padded with N; the caller's file stays open
+    assert [row.tobytes() for batch in batches for row in batch] == [b'ACGTACGT', b'ACGNNNNN', b'TTTTGGGG']
+    assert not file.closed
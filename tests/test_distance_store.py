@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pytest
+
+import barcode_core
+from barcode_core import compute_distance_matrix, distance_store_path, sequence_set_key, store_distance_matrix
+from conftest import assert_pairs_equal, brute_force_hamming, brute_force_pairs, random_barcodes
+
+def test_store_matches_brute_force(tmp_path, barcodes):
+    matrix = store_distance_matrix(barcodes, str(tmp_path))
+    assert isinstance(matrix.condensed, np.memmap)
+    assert not matrix.condensed.flags.writeable
+    full = brute_force_hamming(barcodes, barcodes)
+    assert np.array_equal(np.asarray(matrix.condensed), full[np.triu_indices(len(barcodes), k=1)])
+    assert np.array_equal(matrix.to_square(), full)
+    assert os.listdir(tmp_path) == [os.path.basename(distance_store_path(str(tmp_path), sequence_set_key(barcodes)))]
+
+def test_store_is_reused_for_the_same_set(tmp_path, barcodes, monkeypatch):
+    first = store_distance_matrix(barcodes, str(tmp_path))
+    path = first.condensed.filename
+    modified = os.stat(path).st_mtime_ns
+    # A second call opens the existing file instead of recomputing it
+    monkeypatch.setattr(barcode_core, 'fill_condensed_rows', lambda *args: pytest.fail("recomputed"))
+    second = store_distance_matrix(barcodes, str(tmp_path))
+    assert second.condensed.filename == path and os.stat(path).st_mtime_ns == modified
+    assert np.array_equal(np.asarray(second.condensed), np.asarray(first.condensed))
+
+def test_mismatched_file_is_rewritten(tmp_path):
+    sequences = random_barcodes(40, 8, seed=2)
+    path = distance_store_path(str(tmp_path), 'set')
+    np.save(path, np.zeros(3, dtype=np.uint8))
+    matrix = store_distance_matrix(sequences, str(tmp_path), key='set')
+    assert np.array_equal(np.asarray(matrix.condensed), compute_distance_matrix(sequences).condensed)
+
+def test_failed_write_leaves_no_partial_file(tmp_path, monkeypatch):
+    def fail(*args):
+        raise MemoryError
+    monkeypatch.setattr(barcode_core, 'fill_condensed_rows', fail)
+    with pytest.raises(MemoryError):
+        store_distance_matrix(random_barcodes(30, 8), str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+def test_memmap_pairs_and_rows(tmp_path, barcodes, monkeypatch):
+    # Scan the memory-mapped array in many small chunks
+    monkeypatch.setattr(barcode_core, 'MAX_BLOCK_BYTES', 64)
+    matrix = store_distance_matrix(barcodes, str(tmp_path))
+    full = brute_force_hamming(barcodes, barcodes)
+    assert_pairs_equal(matrix.pairs_within(2), brute_force_pairs(full, 2))
+    rows = list(matrix.iter_rows())
+    assert [i for i, _ in rows] == list(range(len(barcodes) - 1))
+    assert all(np.array_equal(row, full[i, i + 1:]) for i, row in rows)
+    assert np.array_equal(matrix.tile_minima(16), compute_distance_matrix(barcodes).tile_minima(16))
+
+@pytest.mark.parametrize("sequences", [[], ['ACGT']])
+def test_fewer_than_two_sequences(tmp_path, sequences):
+    matrix = store_distance_matrix(sequences, str(tmp_path))
+    assert matrix.n == len(sequences) and len(matrix.condensed) == 0
+    assert not os.path.exists(tmp_path) or os.listdir(tmp_path) == []
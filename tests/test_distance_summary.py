@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from barcode_core import compute_distance_summary, compute_tile_minima, find_collisions, upper_block_pairs
+from conftest import assert_pairs_equal, brute_force_hamming, brute_force_tile_minima, random_barcodes
+
+@pytest.mark.parametrize("length", [8, 40])
+@pytest.mark.parametrize("tile_size", [1, 7, 32])
+def test_distance_summary_matches_brute_force(length, tile_size):
+    sequences = random_barcodes(100, length, seed=length, duplicates=3)
+    n = len(sequences)
+    full = brute_force_hamming(sequences, sequences)
+    summary = compute_distance_summary(sequences, tile_size=tile_size, block_size=13)
+    
+    upper = full[np.triu_indices(n, k=1)]
+    assert np.array_equal(summary.histogram, np.bincount(upper, minlength=length + 1))
+    # Each sequence's closest other sequence, the lowest index on ties
+    np.fill_diagonal(full, np.iinfo(np.int64).max)
+    assert np.array_equal(summary.nearest_distances, full.min(axis=1))
+    assert np.array_equal(summary.nearest_indices, full.argmin(axis=1))
+    expected_tiles = brute_force_tile_minima(full, tile_size)
+    expected_tiles[expected_tiles == np.iinfo(np.int64).max] = np.iinfo(summary.tile_minima.dtype).max
+    assert np.array_equal(summary.tile_minima, expected_tiles)
+    assert np.array_equal(compute_tile_minima(sequences, tile_size), expected_tiles)
+    
+    for threshold in range(-1, length + 1):
+        assert summary.pairs_within(threshold) == (upper <= threshold).sum()
+        assert summary.sequences_within(threshold) == (full.min(axis=1) <= threshold).sum()
+    for max_pairs in (0, 5, 100, len(upper)):
+        threshold = summary.max_threshold(max_pairs)
+        assert (upper <= threshold).sum() <= max_pairs
+        assert threshold == length or (upper <= threshold + 1).sum() > max_pairs
+
+def test_distance_summary_of_tiny_inputs():
+    for sequences in ([], ['ACGT']):
+        summary = compute_distance_summary(sequences, tile_size=4)
+        assert summary.pairs_within(10) == 0 and summary.sequences_within(10) == 0
+
+def test_blocks_collect_the_collision_pairs(barcodes):
+    # The per-block callback sees every pair once, as the background job relies on
+    found = []
+    compute_distance_summary(barcodes, block_size=11,
+                             on_block=lambda start, stop, block: found.append(upper_block_pairs(start, block, 2)))
+    pairs = tuple(np.concatenate(values) for values in zip(*found))
+    assert_pairs_equal(pairs, find_collisions(barcodes, 2))
@@ -0,0 +1,34 @@
+import pytest
+
+from barcode_core import find_dual_index_collisions, parse_index_pairs_text, split_index_pairs
+from conftest import assert_pairs_equal, brute_force_hamming, brute_force_pairs, random_barcodes
+
+@pytest.mark.parametrize("threshold", [0, 1, 3])
+def test_find_dual_index_collisions_matches_brute_force(threshold):
+    # Few distinct i7s, as in combinatorial designs, so i7-only matches are common
+    i7 = [random_barcodes(6, 8, seed=3)[i % 6] for i in range(150)]
+    i5 = random_barcodes(150, 8, seed=4)
+    i5[10] = i5[4]
+    i7_full, i5_full = brute_force_hamming(i7, i7), brute_force_hamming(i5, i5)
+    rows, cols, combined = brute_force_pairs(i7_full + i5_full, threshold)
+    assert_pairs_equal(find_dual_index_collisions(i7, i5, threshold),
+                       (rows, cols, combined, i7_full[rows, cols], i5_full[rows, cols]))
+
+def test_indexes_of_different_lengths():
+    i7 = random_barcodes(80, 8, seed=5)
+    i5 = random_barcodes(80, 6, seed=6)
+    i7_full, i5_full = brute_force_hamming(i7, i7), brute_force_hamming(i5, i5)
+    rows, cols, combined = brute_force_pairs(i7_full + i5_full, 4)
+    assert_pairs_equal(find_dual_index_collisions(i7, i5, 4),
+                       (rows, cols, combined, i7_full[rows, cols], i5_full[rows, cols]))
+
+def test_without_samples():
+    assert all(len(values) == 0 for values in find_dual_index_collisions([], [], 2))
+    with pytest.raises(ValueError):
+        find_dual_index_collisions(['ACGT'], [], 2)
+
+def test_parse_index_pairs():
+    pairs, invalid = parse_index_pairs_text("S1: acgt+ttgg\nS2,AAAA,CCCC\nGGGG\tTTTT\nnot a pair\n\nACGT ACGN")
+    assert pairs == ['ACGT+TTGG', 'AAAA+CCCC', 'GGGG+TTTT']
+    assert [line for line, _ in invalid] == [4, 6]
+    assert split_index_pairs(pairs) == (['ACGT', 'AAAA', 'GGGG'], ['TTGG', 'CCCC', 'TTTT'])
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from barcode_core import (MAX_EDIT_LENGTH, calculate_edit_distance, compute_edit_distance_matrix,
+                          find_edit_collisions)
+from conftest import assert_pairs_equal, brute_force_edit, brute_force_pairs
+
+def random_variable_barcodes(n, min_length, max_length, seed=0):
+    """Barcodes of mixed lengths, with a few one-edit variants of earlier ones."""
+    rng = np.random.default_rng(seed)
+    sequences = [''.join(rng.choice(list('ACGT'), size=rng.integers(min_length, max_length + 1)))
+                 for _ in range(n)]
+    for i in range(0, n, 10):
+        seq = sequences[i]
+        position = int(rng.integers(0, len(seq)))
+        sequences.append(seq[:position] + seq[position + 1:])      # deletion
+        sequences.append(seq[:position] + 'A' + seq[position:])    # insertion
+    return sequences
+
+def brute_force_edit_matrix(sequences):
+    return np.array([[brute_force_edit(s, t) for t in sequences] for s in sequences], dtype=np.int64)
+
+def test_calculate_edit_distance_matches_brute_force():
+    sequences = random_variable_barcodes(40, 0, 12, seed=1) + ['', 'A' * 70, 'C' * 65]
+    for s in sequences:
+        for t in sequences[:15]:
+            assert calculate_edit_distance(s, t) == brute_force_edit(s, t), (s, t)
+
+def test_compute_edit_distance_matrix_matches_brute_force():
+    sequences = random_variable_barcodes(60, 5, 12, seed=2)
+    full = brute_force_edit_matrix(sequences)
+    matrix = compute_edit_distance_matrix(sequences)
+    assert np.array_equal(matrix.condensed, full[np.triu_indices(len(sequences), k=1)])
+
+@pytest.mark.parametrize("lengths", [(6, 6), (5, 9), (30, MAX_EDIT_LENGTH)])
+@pytest.mark.parametrize("threshold", [0, 1, 2, 3])
+def test_find_edit_collisions_matches_brute_force(lengths, threshold):
+    # The dynamic programme is slow in pure Python, so long barcodes get a smaller set
+    sequences = random_variable_barcodes(80 if lengths[1] <= 12 else 25, *lengths, seed=sum(lengths) + threshold)
+    full = brute_force_edit_matrix(sequences)
+    assert_pairs_equal(find_edit_collisions(sequences, threshold), brute_force_pairs(full, threshold))
+
+def test_edit_distance_rejects_long_sequences():
+    with pytest.raises(ValueError):
+        compute_edit_distance_matrix(['A' * (MAX_EDIT_LENGTH + 1), 'A'])
@@ -0,0 +1,106 @@
+import io
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from barcode_core import compute_distance_matrix, find_collisions, find_nearest_neighbors
+from barcode_export import (iter_condensed_chunks, write_collision_report, write_distance_matrix_report,
+                            write_neighbor_report)
+from conftest import brute_force_hamming
+
+def read_report(data, output_format):
+    """Read an exported report back as a list of dicts, one per row."""
+    if output_format == 'csv':
+        header, *lines = data.decode('ascii').strip('\n').split('\n')
+        names = header.split(',')
+        return [dict(zip(names, line.split(','))) for line in lines]
+    if output_format == 'parquet':
+        table = pq.read_table(io.BytesIO(data))
+    else:
+        table = pa.ipc.open_file(io.BytesIO(data)).read_all()
+    return [{name: str(value) for name, value in row.items()} for row in table.to_pylist()]
+
+@pytest.mark.parametrize('output_format', ['csv', 'parquet', 'arrow'])
+def test_collision_report_rows_and_order(barcodes, output_format):
+    rows, cols, distances = find_collisions(barcodes, 2)
+    order = np.argsort(distances, kind='stable')
+    out = io.BytesIO()
+    count = write_collision_report(out, output_format, barcodes, rows, cols, distances, order=order, chunk_rows=7)
+    report = read_report(out.getvalue(), output_format)
+    assert count == len(report) == len(rows)
+    assert [(row['sequence_1'], row['sequence_2'], int(row['distance'])) for row in report] == \
+        [(f'Seq_{rows[i]+1}', f'Seq_{cols[i]+1}', int(distances[i])) for i in order]
+    assert all(row['sequence_1_dna'] == barcodes[int(row['sequence_1'][4:]) - 1] for row in report)
+    assert all(row['sequence_2_dna'] == barcodes[int(row['sequence_2'][4:]) - 1] for row in report)
+
+def test_component_distance_columns():
+    sequences = ['ACGTACGT', 'ACGTACGA', 'TTTTGGGG']
+    rows, cols, distances = np.array([0]), np.array([1]), np.array([1])
+    out = io.BytesIO()
+    write_collision_report(out, 'csv', sequences, rows, cols, distances,
+                           component_distances={'i7_distance': np.array([1]), 'i5_distance': np.array([0])})
+    assert out.getvalue().decode('ascii') == (
+        'sequence_1,sequence_1_dna,sequence_2,sequence_2_dna,i7_distance,i5_distance,distance\n'
+        'Seq_1,ACGTACGT,Seq_2,ACGTACGA,1,0,1\n')
+
+@pytest.mark.parametrize('output_format', ['parquet', 'arrow'])
+def test_dictionary_encoding_with_duplicate_sequences(output_format):
+    sequences = ['ACGTACGT', 'TTTTGGGG', 'ACGTACGT', 'ACGTACGA']
+    rows, cols, distances = find_collisions(sequences, 1)
+    out = io.BytesIO()
+    write_collision_report(out, output_format, sequences, rows, cols, distances)
+    data = out.getvalue()
+    table = pq.read_table(io.BytesIO(data)) if output_format == 'parquet' else pa.ipc.open_file(io.BytesIO(data)).read_all()
+    assert pa.types.is_dictionary(table.schema.field('sequence_1_dna').type)
+    # Duplicate barcodes keep their own labels but share one sequence dictionary entry
+    dictionary = table.column('sequence_1_dna').chunk(0).dictionary.to_pylist()
+    assert sorted(dictionary) == sorted(set(sequences))
+    assert [(row['sequence_1'], row['sequence_2'], row['sequence_1_dna'], row['distance'])
+            for row in table.to_pylist()] == [
+        ('Seq_1', 'Seq_3', 'ACGTACGT', 0), ('Seq_1', 'Seq_4', 'ACGTACGT', 1), ('Seq_3', 'Seq_4', 'ACGTACGT', 1)]
+
+@pytest.mark.parametrize('output_format', ['csv', 'parquet', 'arrow'])
+def test_neighbor_report(barcodes, output_format):
+    distances, indices = find_nearest_neighbors(barcodes, 2)
+    out = io.BytesIO()
+    assert write_neighbor_report(out, output_format, barcodes, distances, indices, chunk_rows=40) == len(barcodes)
+    report = read_report(out.getvalue(), output_format)
+    assert [row['sequence'] for row in report] == [f'Seq_{i+1}' for i in range(len(barcodes))]
+    for i, row in enumerate(report):
+        for rank in (1, 2):
+            assert row[f'neighbor_{rank}'] == f'Seq_{indices[i, rank - 1] + 1}'
+            assert row[f'neighbor_{rank}_dna'] == barcodes[indices[i, rank - 1]]
+            assert int(row[f'distance_{rank}']) == distances[i, rank - 1]
+
+@pytest.mark.parametrize('output_format', ['csv', 'parquet', 'arrow'])
+def test_distance_matrix_report_matches_brute_force(output_format):
+    sequences = ['ACGTACGT', 'ACGTACGA', 'TTTTGGGG', 'ACGAACGA', 'GGGGCCCC', 'ACGTACGT']
+    full = brute_force_hamming(sequences, sequences)
+    out = io.BytesIO()
+    count = write_distance_matrix_report(out, output_format, sequences, compute_distance_matrix(sequences), chunk_rows=4)
+    report = read_report(out.getvalue(), output_format)
+    expected = [(f'Seq_{i+1}', f'Seq_{j+1}', int(full[i, j]))
+                for i in range(len(sequences)) for j in range(i + 1, len(sequences))]
+    assert count == len(expected)
+    assert [(row['sequence_1'], row['sequence_2'], int(row['distance'])) for row in report] == expected
+
+@pytest.mark.parametrize('chunk_rows', [1, 3, 10, 1000])
+def test_condensed_chunks_cover_whole_rows(barcodes, chunk_rows):
+    matrix = compute_distance_matrix(barcodes[:20])
+    chunks = list(iter_condensed_chunks(matrix, chunk_rows))
+    rows = np.concatenate([chunk[0] for chunk in chunks])
+    cols = np.concatenate([chunk[1] for chunk in chunks])
+    assert np.array_equal(np.concatenate([chunk[2] for chunk in chunks]), matrix.condensed)
+    assert np.array_equal(matrix.pair_indices(np.arange(matrix.num_pairs))[0], rows)
+    assert np.array_equal(matrix.pair_indices(np.arange(matrix.num_pairs))[1], cols)
+    # Chunks never split a matrix row
+    assert all(chunk[0][-1] < next_chunk[0][0] for chunk, next_chunk in zip(chunks, chunks[1:]))
+
+def test_empty_report_and_unknown_format():
+    out = io.BytesIO()
+    assert write_collision_report(out, 'csv', ['ACGT'], np.array([], int), np.array([], int), np.array([], int)) == 0
+    assert out.getvalue() == b'sequence_1,sequence_1_dna,sequence_2,sequence_2_dna,distance\n'
+    with pytest.raises(ValueError, match="Unknown export format"):
+        write_collision_report(io.BytesIO(), 'xlsx', ['ACGT'], np.array([0]), np.array([0]), np.array([0]))
@@ -0,0 +1,41 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from barcode_core import generate_distant_barcodes
+from conftest import brute_force_hamming, random_barcodes
+
+def longest_run(sequence):
+    return max(len(list(run)) for _, run in itertools.groupby(sequence))
+
+@pytest.mark.parametrize("length", [10, 40])
+def test_generated_barcodes_keep_their_distance(length):
+    existing = random_barcodes(30, length, seed=length)
+    generated = list(generate_distant_barcodes(length, 50, 4, existing, seed=1))
+    assert len(generated) == 50
+    assert all(len(seq) == length and set(seq) <= set('ACGT') for seq in generated)
+    within = brute_force_hamming(generated, generated)
+    np.fill_diagonal(within, length)
+    assert within.min() >= 4
+    assert brute_force_hamming(generated, existing).min() >= 4
+
+def test_composition_filters():
+    generated = list(generate_distant_barcodes(12, 40, 3, gc_range=(0.5, 0.5), max_homopolymer=2, seed=2))
+    assert len(generated) == 40
+    assert all(sum(base in 'GC' for base in seq) == 6 for seq in generated)
+    assert all(longest_run(seq) <= 2 for seq in generated)
+
+def test_same_seed_same_barcodes():
+    assert list(generate_distant_barcodes(8, 20, 3, seed=5)) == list(generate_distant_barcodes(8, 20, 3, seed=5))
+
+def test_stops_when_the_space_runs_out():
+    # 4**2 two-base barcodes hold at most 4 at distance 2 from each other
+    generated = list(generate_distant_barcodes(2, 10, 2, seed=0, max_candidates=5_000))
+    assert len(generated) <= 4
+
+def test_rejects_invalid_arguments():
+    with pytest.raises(ValueError):
+        list(generate_distant_barcodes(0, 5, 2))
+    with pytest.raises(ValueError):
+        list(generate_distant_barcodes(8, 5, 2, existing=['ACGT']))
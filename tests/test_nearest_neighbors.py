@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from barcode_core import find_nearest_neighbors, kernel_dtype, neighbor_key_dtype, prepare_kernel_input
+from conftest import brute_force_hamming, random_barcodes
+
+def expected_neighbors(sequences, k):
+    full = brute_force_hamming(sequences, sequences)
+    np.fill_diagonal(full, np.iinfo(np.int64).max)
+    order = np.lexsort((np.broadcast_to(np.arange(len(sequences)), full.shape), full), axis=1)[:, :k]
+    return np.take_along_axis(full, order, axis=1), order
+
+@pytest.mark.parametrize("length", [8, 40])
+@pytest.mark.parametrize("k", [1, 3])
+def test_nearest_neighbors_match_brute_force(length, k):
+    sequences = random_barcodes(120, length, seed=length + k, duplicates=2)
+    distances, indices = find_nearest_neighbors(sequences, k, block_size=17)
+    expected_distances, expected_indices = expected_neighbors(sequences, k)
+    assert (distances == expected_distances).all()
+    assert (indices == expected_indices).all()
+    assert (indices != np.arange(len(sequences))[:, np.newaxis]).all()
+
+def test_neighbor_keys_fit_the_masked_diagonal():
+    # The unpacked kernel (L > 32) masks the diagonal with 65535, whatever distance_dtype says
+    unpacked = kernel_dtype(prepare_kernel_input(random_barcodes(2, 40)))
+    assert unpacked == np.uint16
+    assert neighbor_key_dtype(unpacked, 65_600) == np.int64
+    assert neighbor_key_dtype(unpacked, 1_000) == np.uint32
+    packed = kernel_dtype(prepare_kernel_input(random_barcodes(2, 8)))
+    assert neighbor_key_dtype(packed, 65_535) == np.uint32
+    n = 65_600
+    key_dtype = neighbor_key_dtype(unpacked, n)
+    assert int(np.iinfo(unpacked).max) * n + n - 1 <= np.iinfo(key_dtype).max
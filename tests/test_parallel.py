@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from barcode_core import compute_distance_matrix, env_int, store_distance_matrix, tile_row_bounds
+from conftest import brute_force_hamming, random_barcodes
+
+@pytest.fixture
+def parallel_everywhere(monkeypatch):
+    monkeypatch.setattr('barcode_core.PARALLEL_MIN_PAIRS', 0)
+
+@pytest.mark.parametrize("length", [8, 40])
+def test_parallel_matrix_equals_serial(parallel_everywhere, length):
+    sequences = random_barcodes(300, length, seed=length, duplicates=2)
+    serial = compute_distance_matrix(sequences, workers=1)
+    parallel = compute_distance_matrix(sequences, workers=3)
+    assert parallel.condensed.dtype == serial.condensed.dtype
+    assert np.array_equal(parallel.condensed, serial.condensed)
+    full = brute_force_hamming(sequences, sequences)
+    assert np.array_equal(serial.condensed, full[np.triu_indices(len(sequences), k=1)])
+
+def test_parallel_store_equals_serial(parallel_everywhere, tmp_path):
+    sequences = random_barcodes(250, 12, seed=3)
+    serial = store_distance_matrix(sequences, str(tmp_path / 'serial'), workers=1)
+    parallel = store_distance_matrix(sequences, str(tmp_path / 'parallel'), workers=2)
+    assert np.array_equal(np.asarray(parallel.condensed), np.asarray(serial.condensed))
+
+def test_tiles_cover_every_row_once():
+    for n, tiles in [(10, 3), (1000, 16), (5, 20)]:
+        bounds = tile_row_bounds(n, tiles)
+        assert bounds[0] == 0 and bounds[-1] == n
+        assert all(b > a for a, b in zip(bounds, bounds[1:]))
+        assert len(bounds) - 1 <= tiles
+
+@pytest.mark.parametrize("value, expected", [(None, 1), ("4", 4), ("0", 1), ("-3", 1), ("four", 1), ("", 1)])
+def test_worker_setting_is_parsed_defensively(monkeypatch, value, expected):
+    if value is None:
+        monkeypatch.delenv('BC_CALC_WORKERS', raising=False)
+    else:
+        monkeypatch.setenv('BC_CALC_WORKERS', value)
+    assert env_int('BC_CALC_WORKERS', 1) == expected
@@ -0,0 +1,55 @@
+import gzip
+import io
+
+import pytest
+
+from barcode_core import detect_file_format, iter_sequence_records, parse_file
+
+def upload(name, text, compress=False):
+    """Binary file object like a Streamlit upload."""
+    data = text.encode('utf-8')
+    file = io.BytesIO(gzip.compress(data) if compress else data)
+    file.name = name + ('.gz' if compress else '')
+    return file
+
+def test_detect_file_format():
+    assert detect_file_format('a.FASTA.gz') == 'fasta'
+    assert detect_file_format('a.fq') == 'fastq'
+    assert detect_file_format('a.txt.gz') == detect_file_format('a.csv') == 'text'
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_fasta_joins_multi_line_records(compress):
+    file = upload('set.fa', ">s1 first\nACGT\nacgt\n\n>s2\nTTTT\n>bad\nACGN\n", compress)
+    assert parse_file(file) == (['ACGTACGT', 'TTTT'], [])
+    file.seek(0)
+    assert [(r.label, r.sequence, r.line) for r in iter_sequence_records(file)] == \
+        [('s1 first', 'ACGTacgt', 1), ('s2', 'TTTT', 5), ('bad', 'ACGN', 7)]
+    assert not file.closed
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_fastq_takes_the_sequence_line(compress):
+    file = upload('reads.fastq', "@r1\nACGT\n+\n@III\n@r2\nggcc\n+\nIIII\n", compress)
+    assert parse_file(file) == (['ACGT', 'GGCC'], [])
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_text_reports_invalid_lines_by_number(compress):
+    file = upload('set.txt', "ACGT\nS2: ttgg\n\nnot dna\nACGTX\n", compress)
+    assert parse_file(file) == (['ACGT', 'TTGG'], [(4, 'not dna'), (5, 'ACGTX')])
+
+def test_windows_line_endings():
+    file = upload('set.txt', "ACGT\r\nbad\r\nTTTT\r\n")
+    assert parse_file(file) == (['ACGT', 'TTTT'], [(2, 'bad')])
+    fasta = upload('set.fasta', ">a\r\nAC\r\nGT\r\n>b\r\nTT\r\n")
+    assert parse_file(fasta) == (['ACGT', 'TT'], [])
+
+def test_lone_carriage_returns_do_not_split_lines():
+    # Only '\n' ends a line, as in the original parser, so the line numbers stay the same
+    file = upload('set.txt', "ACGT\rTTTT\nbad\n")
+    assert parse_file(file) == ([], [(1, 'ACGT\rTTTT'), (2, 'bad')])
+
+def test_chunks_keep_counting_lines(monkeypatch):
+    monkeypatch.setattr('barcode_core.READ_CHUNK_SIZE', 16)
+    lines = [f"{'ACGT' if i % 7 else 'ACGN'}" for i in range(1, 200)]
+    sequences, invalid = parse_file(upload('set.txt', '\n'.join(lines)))
+    assert len(sequences) == 199 - len(invalid)
+    assert [line for line, _ in invalid] == [i for i in range(1, 200) if i % 7 == 0]
@@ -0,0 +1,63 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from barcode_core import PerformanceLog
+
+MB = 1024 * 1024
+
+def allocate(size):
+    """Allocate and touch size bytes, freed when the result is dropped."""
+    return np.ones(size, dtype=np.uint8)
+
+def test_stages_record_time_and_pairs():
+    log = PerformanceLog()
+    with log.stage("search", pairs=10) as record:
+        record.pairs += 5
+    assert [(r.name, r.pairs, r.peak_bytes) for r in log.records] == [("search", 15, None)]
+    assert log.to_dict()['total_seconds'] == log.records[0].seconds >= 0
+
+def test_nested_stages_keep_the_enclosing_peak():
+    log = PerformanceLog(track_memory=True)
+    with log.stage("outer"):
+        block = allocate(8 * MB)
+        del block
+        with log.stage("inner"):
+            block = allocate(1 * MB)
+            del block
+    inner, outer = log.records
+    assert 1 * MB <= inner.peak_bytes < 2 * MB
+    assert outer.peak_bytes >= 8 * MB
+    assert not tracemalloc.is_tracing()
+
+def test_inner_peak_counts_for_the_enclosing_stage():
+    log = PerformanceLog(track_memory=True)
+    with log.stage("outer"):
+        with log.stage("inner"):
+            block = allocate(6 * MB)
+            del block
+        block = allocate(1 * MB)
+    inner, outer = log.records
+    assert inner.peak_bytes >= 6 * MB and outer.peak_bytes >= 6 * MB
+
+def test_an_outside_trace_is_left_alone():
+    tracemalloc.start()
+    try:
+        block = allocate(8 * MB)
+        del block
+        outside_peak = tracemalloc.get_traced_memory()[1]
+        log = PerformanceLog(track_memory=True)
+        with log.stage("small"):
+            block = allocate(1 * MB)
+            del block
+        assert tracemalloc.is_tracing()
+        assert tracemalloc.get_traced_memory()[1] >= outside_peak
+        with log.stage("large"):
+            block = allocate(16 * MB)
+            del block
+        small, large = log.records
+        assert 0 <= small.peak_bytes < 2 * MB
+        assert large.peak_bytes >= 16 * MB
+    finally:
+        tracemalloc.stop()